@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+"""
+Content-addressed storage and HTTP serving of generated GLB files.
+
+Every asset is stored as ``<sha256>.glb`` next to pre-compressed ``.gz``
+(and ``.br`` if brotli is installed) variants. Since a URL never changes
+content, responses carry strong ETags and immutable cache headers, and
+browsers only download an asset once.
+
+Example Usage:
+python asset_server.py --dir assets --port 8090
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from glb_index import GLBIndex
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ASSET_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})\.glb$")
+CONTENT_TYPE = "model/gltf-binary"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Encoding -> file suffix of the pre-compressed variant
+VARIANTS = {"br": ".br", "gzip": ".gz"}
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end); None if unsatisfiable."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    if match.group(1) == "":
+        # Suffix range: the last N bytes
+        length = int(match.group(2))
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def accepted_encodings(header: str) -> set:
+    """Encodings from an Accept-Encoding header, ignoring ones with q=0."""
+    encodings = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name and not re.search(r"q=0(\.0*)?\s*$", params):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class AssetStore:
+    """GLB files stored under their content hash, with a bounded in-memory cache.
+
+    Many clients requesting the same new asset cost one disk read: the first
+    request loads the bytes and concurrent requests wait on the same load.
+    """
+
+    def __init__(self, root: str, max_memory_bytes: int = 256 * 1024 * 1024, compress_level: int = 9):
+        self.root = root
+        self.max_memory_bytes = max_memory_bytes
+        self.compress_level = compress_level
+        os.makedirs(root, exist_ok=True)
+        self._memory: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._loading: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = 0
+        self.disk_reads = 0
+        # Bounds, triangle counts and texture sizes, recorded once per asset
+        self.index = GLBIndex(os.path.join(root, "index.db"))
+
+    def path_for(self, name: str, encoding: str = "identity") -> str:
+        return os.path.join(self.root, name + VARIANTS.get(encoding, ""))
+
+    def put_file(self, path: str, move: bool = True) -> str:
+        """Add a GLB to the store and return its content-hash name.
+
+        Storing the same content twice is a no-op, so files never overwrite
+        each other. New assets are inspected into the index.
+        """
+        name = f"{file_digest(path)}.glb"
+        target = self.path_for(name)
+        if os.path.exists(target):
+            if move:
+                os.remove(path)
+            self.index.inspect(name, target)
+            return name
+
+        with open(path, "rb") as f:
+            data = f.read()
+        self._write(self.path_for(name, "gzip"), gzip.compress(data, compresslevel=self.compress_level))
+        if brotli is not None:
+            self._write(self.path_for(name, "br"), brotli.compress(data))
+        # The GLB itself goes last: its presence marks the asset as complete
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        if move:
+            shutil.move(path, tmp_path)
+        else:
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+        self.index.inspect(name, target)
+        logger.info(f"Stored asset {name} ({len(data)} bytes)")
+        return name
+
+    def put_family(self, paths: List[str]) -> List[dict]:
+        """Store the LOD levels of one model (finest first) and describe them.
+
+        Each level carries its index entry as ``info`` (None if it couldn't be inspected).
+        """
+        levels = []
+        for level, path in enumerate(paths):
+            size = os.path.getsize(path)
+            name = self.put_file(path)
+            levels.append({"level": level, "name": name, "bytes": size, "info": self.info(name)})
+        return levels
+
+    def info(self, name: str) -> Optional[dict]:
+        """Indexed metadata of a stored asset; see ``glb_index.inspect_glb``."""
+        if not self.exists(name):
+            return None
+        return self.index.inspect(name, self.path_for(name))
+
+    def _write(self, path: str, data: bytes):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path_for(name))
+
+    def has_variant(self, name: str, encoding: str) -> bool:
+        return os.path.exists(self.path_for(name, encoding))
+
+    async def read(self, name: str, encoding: str = "identity") -> bytes:
+        key = (name, encoding)
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return data
+
+        loading = self._loading.get(key)
+        if loading is not None:
+            self.hits += 1
+            return await asyncio.shield(loading)
+
+        loading = asyncio.get_running_loop().create_future()
+        self._loading[key] = loading
+        try:
+            data = await asyncio.to_thread(self._read_file, self.path_for(name, encoding))
+            self.disk_reads += 1
+            self._remember(key, data)
+            loading.set_result(data)
+            return data
+        except Exception as e:
+            loading.set_exception(e)
+            # Nobody else may be waiting; don't leave an unretrieved exception behind
+            loading.exception()
+            raise
+        finally:
+            del self._loading[key]
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _remember(self, key: Tuple[str, str], data: bytes):
+        if len(data) > self.max_memory_bytes:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "hits": self.hits,
+            "disk_reads": self.disk_reads,
+        }
+
+
+def make_app(store: AssetStore) -> web.Application:
+    async def serve_asset(request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        match = ASSET_NAME_PATTERN.match(name)
+        if not match or not store.exists(name):
+            raise web.HTTPNotFound()
+        digest = match.group(1)
+
+        # Ranges are only served from the uncompressed file
+        encoding = "identity"
+        if "Range" not in request.headers:
+            accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+            for candidate in VARIANTS:
+                if candidate in accepted and store.has_variant(name, candidate):
+                    encoding = candidate
+                    break
+
+        # Each representation needs its own strong ETag
+        etag = f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": CACHE_CONTROL,
+            "Content-Type": CONTENT_TYPE,
+            "Accept-Ranges": "bytes",
+            "Vary": "Accept-Encoding",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Expose-Headers": "ETag, Content-Range, Content-Length",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            return web.Response(status=304, headers=headers)
+
+        data = await store.read(name, encoding)
+
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and (if_range is None or if_range.strip() == etag):
+            byte_range = parse_range(range_header, len(data))
+            if byte_range is None:
+                headers["Content-Range"] = f"bytes */{len(data)}"
+                return web.Response(status=416, headers=headers)
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            body = data[start:end + 1]
+            return web.Response(status=206, body=None if request.method == "HEAD" else body, headers={**headers, "Content-Length": str(len(body))})
+
+        if request.method == "HEAD":
+            return web.Response(headers={**headers, "Content-Length": str(len(data))})
+        return web.Response(body=data, headers=headers)
+
+    async def asset_stats(request: web.Request) -> web.Response:
+        return web.json_response(store.stats())
+
+    app = web.Application()
+    app.router.add_get("/assets/{name}", serve_asset)  # Also answers HEAD
+    app.router.add_get("/assets", asset_stats)
+    return app
+
+
+async def start_asset_server(store: AssetStore, host: str = "localhost", port: int = 8090) -> web.AppRunner:
+    """Serve the store in the running event loop; call ``cleanup()`` on the result to stop."""
+    runner = web.AppRunner(make_app(store))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Asset server started at http://{host}:{port}/assets")
+    return runner
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Serve content-addressed GLB assets")
+    parser.add_argument("--dir", default="assets", help="Asset directory")
+    parser.add_argument("--host", default="localhost", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=8090, help="Port to listen on")
+    parser.add_argument("--memory-mb", type=int, default=256, help="In-memory cache size in MB")
+    args = parser.parse_args()
+
+    runner = await start_asset_server(AssetStore(args.dir, args.memory_mb * 1024 * 1024), args.host, args.port)
+    try:
+        await asyncio.Future()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""Low-priority background rendering of optional generation artifacts."""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, List, Optional, Tuple
+
+
+class RenderTask:
+    """Artifacts to render for one request, as ``(name, fn)`` steps."""
+
+    def __init__(self, request_id: str, steps: List[Tuple[str, Callable[[], None]]]):
+        self.request_id = request_id
+        self.steps = steps
+        self.status = "pending"
+        self.completed = []
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "status": self.status,
+            "artifacts": [name for name, _ in self.steps],
+            "completed": list(self.completed),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BackgroundRenderer:
+    """Runs render tasks one step at a time on a single background thread.
+
+    Before every step the renderer checks ``is_busy()`` and waits while it
+    returns True, so interactive generation always goes first. Each step
+    holds the renderer's resources (e.g. pipeline outputs on the GPU) until
+    the task finishes, so at most ``max_pending`` tasks are kept; older
+    pending tasks are dropped when the bound is exceeded.
+    """
+
+    def __init__(
+        self,
+        is_busy: Callable[[], bool] = lambda: False,
+        poll_interval: float = 0.5,
+        max_pending: int = 16,
+        max_history: int = 1000,
+    ):
+        self.is_busy = is_busy
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._pending = deque()
+        self._tasks = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name="background-renderer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, request_id: str, steps: List[Tuple[str, Callable[[], None]]]) -> RenderTask:
+        """Schedule the render steps for a request."""
+        task = RenderTask(request_id, steps)
+        with self._cond:
+            self._tasks[request_id] = task
+            self._pending.append(task)
+            while len(self._pending) > self.max_pending:
+                dropped = self._pending.popleft()
+                dropped.status = "dropped"
+                dropped.steps = [(name, None) for name, _ in dropped.steps]
+                dropped.finished_at = time.time()
+            self._prune()
+            self._cond.notify()
+        return task
+
+    def get(self, request_id: str) -> Optional[RenderTask]:
+        with self._cond:
+            return self._tasks.get(request_id)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"pending": len(self._pending), "tracked": len(self._tasks)}
+
+    def _wait_until_idle(self) -> bool:
+        # Yield to interactive work; returns False if we are shutting down
+        while self.is_busy():
+            with self._cond:
+                if self._stopping:
+                    return False
+                self._cond.wait(self.poll_interval)
+        return not self._stopping
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                task = self._pending.popleft()
+                task.status = "rendering"
+
+            for name, step in task.steps:
+                if not self._wait_until_idle():
+                    return
+                try:
+                    step()
+                except Exception as e:
+                    task.status = "failed"
+                    task.error = f"{name}: {e}"
+                    break
+                task.completed.append(name)
+            else:
+                task.status = "done"
+            task.finished_at = time.time()
+            # Release references to the render inputs
+            task.steps = [(name, None) for name, _ in task.steps]
+
+    def _prune(self):
+        finished = [request_id for request_id, task in self._tasks.items() if task.finished_at is not None]
+        for request_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._tasks[request_id]
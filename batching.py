@@ -0,0 +1,221 @@
+"""Dynamic micro-batching of concurrent pipeline requests."""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Hashable, List, Optional
+
+
+def split_outputs(outputs: dict, count: int) -> List[dict]:
+    """Split batched pipeline outputs into one single-sample output dict per input."""
+    return [{name: [values[i]] for name, values in outputs.items()} for i in range(count)]
+
+
+def run_text_batch(pipeline, prompts: List[str], seed: int, steps: Optional[int] = None) -> List[dict]:
+    """Run several prompts through a Trellis text pipeline in one pass.
+
+    Mirrors ``TrellisTextTo3DPipeline.run`` but conditions on all prompts at
+    once and draws one sample per prompt. Each sample's noise comes from its
+    own generator seeded with ``seed``, in the order ``run`` draws it, so a
+    prompt gets the same model whatever else is in its batch. Pipelines that
+    provide their own ``run_batch`` (such as the CPU stub) are used as-is.
+    ``steps`` overrides the number of sampler steps of both stages (None
+    keeps the defaults).
+    """
+    sampler_params = {"steps": steps} if steps else {}
+    if len(prompts) == 1:
+        return [pipeline.run(
+            prompts[0],
+            seed=seed,
+            sparse_structure_sampler_params=sampler_params,
+            slat_sampler_params=sampler_params,
+        )]
+    if hasattr(pipeline, "run_batch"):
+        outputs = pipeline.run_batch(
+            prompts,
+            seed=seed,
+            sparse_structure_sampler_params=sampler_params,
+            slat_sampler_params=sampler_params,
+        )
+    else:
+        import torch
+
+        with torch.no_grad():
+            cond = pipeline.get_cond(prompts)
+            # The null condition is a single sample; classifier-free guidance needs one per prompt
+            neg_cond = cond["neg_cond"]
+            cond["neg_cond"] = neg_cond.expand(len(prompts), *neg_cond.shape[1:])
+            generators = [torch.Generator().manual_seed(seed) for _ in prompts]
+            coords = _sample_sparse_structure(pipeline, cond, generators, sampler_params)
+            slat = _sample_slat(pipeline, cond, coords, generators, sampler_params)
+            outputs = pipeline.decode_slat(slat, ["mesh", "gaussian", "radiance_field"])
+    return split_outputs(outputs, len(prompts))
+
+
+def _sample_sparse_structure(pipeline, cond: dict, generators: list, sampler_params: dict):
+    """``sample_sparse_structure`` with the noise of sample i drawn from ``generators[i]``."""
+    import torch
+
+    flow_model = pipeline.models["sparse_structure_flow_model"]
+    reso = flow_model.resolution
+    noise = torch.cat([
+        torch.randn(1, flow_model.in_channels, reso, reso, reso, generator=generator)
+        for generator in generators
+    ]).to(pipeline.device)
+    sampler_params = {**pipeline.sparse_structure_sampler_params, **sampler_params}
+    z_s = pipeline.sparse_structure_sampler.sample(flow_model, noise, **cond, **sampler_params, verbose=True).samples
+    decoder = pipeline.models["sparse_structure_decoder"]
+    return torch.argwhere(decoder(z_s) > 0)[:, [0, 2, 3, 4]].int()
+
+
+def _sample_slat(pipeline, cond: dict, coords, generators: list, sampler_params: dict):
+    """``sample_slat`` with the noise of sample i drawn from ``generators[i]``."""
+    import torch
+    from third_party.TRELLIS.trellis.modules import sparse as sp
+
+    flow_model = pipeline.models["slat_flow_model"]
+    # argwhere sorts the coordinates by sample, so each sample's voxels are contiguous
+    counts = torch.bincount(coords[:, 0].long(), minlength=len(generators)).tolist()
+    feats = torch.cat([
+        torch.randn(count, flow_model.in_channels, generator=generator)
+        for count, generator in zip(counts, generators)
+    ]).to(pipeline.device)
+    noise = sp.SparseTensor(feats=feats, coords=coords)
+    sampler_params = {**pipeline.slat_sampler_params, **sampler_params}
+    slat = pipeline.slat_sampler.sample(flow_model, noise, **cond, **sampler_params, verbose=True).samples
+    std = torch.tensor(pipeline.slat_normalization["std"])[None].to(slat.device)
+    mean = torch.tensor(pipeline.slat_normalization["mean"])[None].to(slat.device)
+    return slat * std + mean
+
+
+class _Pending:
+    def __init__(self, item, key):
+        self.item = item
+        self.key = key
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+
+
+class MicroBatcher:
+    """Collects concurrent submissions and runs them through ``batch_fn`` together.
+
+    A batch is closed ``window`` seconds after its first item arrives or as
+    soon as it holds ``max_batch_size`` items. Only items with the same
+    ``key_fn`` value share a batch (e.g. the sampling seed). ``batch_fn``
+    receives the list of items and must return one result per item. It may
+    instead return a ``Future`` of that list after handing the batch on
+    (e.g. to a worker process); the batcher then starts collecting the next
+    batch right away.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list], list],
+        max_batch_size: int = 4,
+        window: float = 0.05,
+        key_fn: Optional[Callable[[object], Hashable]] = None,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.key_fn = key_fn or (lambda item: None)
+        self.batches_run = 0
+        self.items_run = 0
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, item) -> Future:
+        """Queue an item and return a future for its result."""
+        pending = _Pending(item, self.key_fn(item))
+        with self._cond:
+            self._pending.append(pending)
+            self._cond.notify_all()
+        return pending.future
+
+    def run(self, item):
+        """Submit an item and block until its result is ready."""
+        return self.submit(item).result()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "batches": self.batches_run,
+                "items": self.items_run,
+                "mean_batch_size": self.items_run / self.batches_run if self.batches_run else 0.0,
+                "pending": len(self._pending),
+                "max_batch_size": self.max_batch_size,
+                "window": self.window,
+            }
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return []
+            # The oldest item decides the batch key and the deadline
+            first = self._pending[0]
+            deadline = first.submitted_at + self.window
+            while not self._stopping:
+                matching = [p for p in self._pending if p.key == first.key]
+                remaining = deadline - time.monotonic()
+                if len(matching) >= self.max_batch_size or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [p for p in self._pending if p.key == first.key][:self.max_batch_size]
+            for pending in batch:
+                self._pending.remove(pending)
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                results = self.batch_fn([p.item for p in batch])
+            except Exception as e:
+                self._finish(batch, error=e)
+                continue
+            if isinstance(results, Future):
+                results.add_done_callback(lambda future, batch=batch: self._finish_from_future(batch, future))
+            else:
+                self._finish(batch, results=results)
+
+    def _finish_from_future(self, batch: List[_Pending], future: Future):
+        error = future.exception()
+        if error is not None:
+            self._finish(batch, error=error)
+        else:
+            self._finish(batch, results=future.result())
+
+    def _finish(self, batch: List[_Pending], results: Optional[list] = None, error: Optional[Exception] = None):
+        if error is None and len(results) != len(batch):
+            error = RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} items")
+        if error is not None:
+            for pending in batch:
+                pending.future.set_exception(error)
+            return
+        with self._cond:
+            self.batches_run += 1
+            self.items_run += len(batch)
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
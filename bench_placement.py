@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Benchmark the placement engine as the world fills up.
+
+Example Usage:
+python bench_placement.py --objects 100000
+"""
+
+import argparse
+import random
+import time
+
+from placement import PlacementEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark object placement")
+    parser.add_argument("--objects", type=int, default=100000, help="Number of objects to place")
+    parser.add_argument("--report-every", type=int, default=10000, help="Print timings every N objects")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = PlacementEngine(seed=args.seed)
+    overlaps = 0
+    timings = []
+
+    for i in range(1, args.objects + 1):
+        radius = rng.uniform(0.5, 3.0)
+        start = time.perf_counter()
+        x, z = engine.place(radius, obj_id=f"obj_{i}")
+        timings.append(time.perf_counter() - start)
+
+        # Verify the placement against the neighbours (not timed)
+        if engine.grid.clearance(x, z, radius, engine.min_gap, exclude=f"obj_{i}") < engine.min_gap:
+            overlaps += 1
+
+        if i % args.report_every == 0:
+            timings.sort()
+            mean = sum(timings) / len(timings)
+            p50 = timings[len(timings) // 2]
+            p99 = timings[int(len(timings) * 0.99)]
+            print(
+                f"{i:>7} objects  place mean {mean * 1e3:.3f} ms  p50 {p50 * 1e3:.3f} ms  "
+                f"p99 {p99 * 1e3:.3f} ms  extent ±{engine.extent:.1f}  overlaps {overlaps}"
+            )
+            timings = []
+
+    # Incremental moves of existing objects
+    ids = [f"obj_{rng.randint(1, args.objects)}" for _ in range(10000)]
+    start = time.perf_counter()
+    for obj_id in ids:
+        x, z, _ = engine.grid.objects[obj_id]
+        engine.move(obj_id, x + rng.uniform(-1, 1), z + rng.uniform(-1, 1))
+    print(f"mean move {(time.perf_counter() - start) / len(ids) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Fan-out of messages to WebSocket clients through per-client bounded queues."""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import websockets
+
+from world_sync import encode_message
+
+logger = logging.getLogger(__name__)
+
+SLOW_CLIENT_POLICIES = ("drop", "coalesce", "disconnect")
+
+
+class ClientChannel:
+    """Outbound queue and writer task for one connection."""
+
+    def __init__(self, websocket, max_queue: int, encoding: str = "json"):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.encoding = encoding
+        # (data, coalesce_key, enqueued_at)
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def enqueue(self, data, coalesce_key: Optional[str] = None):
+        self.pending.append((data, coalesce_key, time.monotonic()))
+        self.max_depth = max(self.max_depth, len(self.pending))
+        self.wakeup.set()
+
+    @property
+    def full(self) -> bool:
+        return len(self.pending) >= self.max_queue
+
+    def metrics(self) -> dict:
+        return {
+            "encoding": self.encoding,
+            "queue_depth": len(self.pending),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "mean_send_latency": self.total_latency / self.sent if self.sent else 0.0,
+            "max_send_latency": self.max_latency,
+        }
+
+
+class Broadcaster:
+    """Serializes each message once per encoding and queues it for every client.
+
+    Every connection has its own writer task, so a stalled socket only backs
+    up its own queue. When a queue is full, ``policy`` decides what happens:
+
+    - ``drop``: the new message is discarded for that client.
+    - ``coalesce``: queued messages with the same coalesce key are replaced by
+      one message from ``coalescers[key]()`` (e.g. a world snapshot replacing
+      a backlog of deltas); other messages are dropped as with ``drop``.
+    - ``disconnect``: the client is closed and can reconnect to start fresh.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 256,
+        policy: str = "coalesce",
+        coalescers: Optional[Dict[str, Callable[[], dict]]] = None,
+        on_closed: Optional[Callable] = None,
+    ):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy: {policy}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.coalescers = coalescers or {}
+        self.on_closed = on_closed
+        self.channels: Dict[object, ClientChannel] = {}
+
+    def __len__(self):
+        return len(self.channels)
+
+    def add(self, websocket, encoding: str = "json") -> ClientChannel:
+        channel = ClientChannel(websocket, self.max_queue, encoding)
+        channel.task = asyncio.create_task(self._writer(channel))
+        self.channels[websocket] = channel
+        return channel
+
+    def remove(self, websocket):
+        channel = self.channels.pop(websocket, None)
+        if channel is not None:
+            channel.closed = True
+            channel.wakeup.set()
+
+    def set_encoding(self, websocket, encoding: str):
+        channel = self.channels.get(websocket)
+        if channel is not None:
+            channel.encoding = encoding
+
+    def send(self, websocket, message: dict, coalesce_key: Optional[str] = None):
+        """Queue a message for a single client."""
+        channel = self.channels.get(websocket)
+        if channel is not None:
+            self._enqueue(channel, encode_message(message, channel.encoding), coalesce_key)
+
+    def broadcast(self, message: dict, coalesce_key: Optional[str] = None):
+        """Queue a message for every client without waiting on any socket."""
+        encoded = {}
+        for channel in list(self.channels.values()):
+            if channel.encoding not in encoded:
+                encoded[channel.encoding] = encode_message(message, channel.encoding)
+            self._enqueue(channel, encoded[channel.encoding], coalesce_key)
+
+    def _enqueue(self, channel: ClientChannel, data, coalesce_key: Optional[str]):
+        if not channel.full:
+            channel.enqueue(data, coalesce_key)
+            return
+        if self.policy == "disconnect":
+            logger.warning(f"Disconnecting slow client ({len(channel.pending)} messages queued)")
+            self.remove(channel.websocket)
+            asyncio.create_task(channel.websocket.close(code=1013, reason="Client too slow"))
+            return
+        if self.policy == "coalesce" and coalesce_key in self.coalescers:
+            kept = deque(item for item in channel.pending if item[1] != coalesce_key)
+            channel.coalesced += len(channel.pending) - len(kept)
+            channel.pending = kept
+            replacement = encode_message(self.coalescers[coalesce_key](), channel.encoding)
+            if not channel.full:
+                channel.enqueue(replacement, coalesce_key)
+                return
+        channel.dropped += 1
+
+    async def _writer(self, channel: ClientChannel):
+        try:
+            while not channel.closed:
+                if not channel.pending:
+                    channel.wakeup.clear()
+                    await channel.wakeup.wait()
+                    continue
+                data, _, enqueued_at = channel.pending.popleft()
+                await channel.websocket.send(data)
+                latency = time.monotonic() - enqueued_at
+                channel.sent += 1
+                channel.total_latency += latency
+                channel.max_latency = max(channel.max_latency, latency)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if self.channels.get(channel.websocket) is channel:
+                self.remove(channel.websocket)
+                if self.on_closed is not None:
+                    self.on_closed(channel.websocket)
+
+    def metrics(self) -> dict:
+        """Per-client queue depth and send latency, plus totals."""
+        clients = {str(id(websocket)): channel.metrics() for websocket, channel in self.channels.items()}
+        return {
+            "clients": len(clients),
+            "queued": sum(m["queue_depth"] for m in clients.values()),
+            "dropped": sum(m["dropped"] for m in clients.values()),
+            "coalesced": sum(m["coalesced"] for m in clients.values()),
+            "per_client": clients,
+        }
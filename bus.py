@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+Pub/sub message bus for events between server processes.
+
+"memory" delivers within one process; "unix:<path>" connects to a broker
+listening on a Unix socket, which can be run on its own:
+
+Example Usage:
+python bus.py /tmp/vibeworld-bus.sock
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], None]
+
+
+class InMemoryBus:
+    """Delivers messages to subscribers in the same process, on the next loop iteration."""
+
+    def __init__(self):
+        self.handlers: Dict[str, Set[Handler]] = defaultdict(set)
+
+    async def start(self):
+        pass
+
+    def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel].add(handler)
+
+    def unsubscribe(self, channel: str, handler: Handler):
+        self.handlers[channel].discard(handler)
+
+    async def publish(self, channel: str, message: dict):
+        loop = asyncio.get_running_loop()
+        for handler in list(self.handlers.get(channel, ())):
+            loop.call_soon(handler, message)
+
+    async def close(self):
+        self.handlers.clear()
+
+
+class UnixSocketBus(InMemoryBus):
+    """Client of a ``BusBroker``; messages are newline-delimited JSON.
+
+    Subscriptions are tracked locally and replayed when the connection to the
+    broker is re-established. Publishers receive their own messages like any
+    other subscriber, so a process behaves the same with either bus.
+    """
+
+    def __init__(self, path: str, reconnect_delay: float = 1.0):
+        super().__init__()
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._writer = None
+        self._connected = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        await self._connected.wait()
+
+    async def _run(self):
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                for channel in list(self.handlers):
+                    self._send({"op": "subscribe", "channel": channel})
+                self._connected.set()
+                logger.info(f"Connected to message bus at {self.path}")
+                while line := await reader.readline():
+                    envelope = json.loads(line)
+                    for handler in list(self.handlers.get(envelope["channel"], ())):
+                        try:
+                            handler(envelope["message"])
+                        except Exception:
+                            logger.exception(f"Bus handler for {envelope['channel']} failed")
+            except (OSError, ValueError) as e:
+                logger.error(f"Message bus connection failed: {e}")
+            self._connected.clear()
+            self._writer = None
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _send(self, envelope: dict):
+        if self._writer is not None:
+            self._writer.write(json.dumps(envelope).encode() + b"\n")
+
+    def subscribe(self, channel: str, handler: Handler):
+        if not self.handlers.get(channel):
+            self._send({"op": "subscribe", "channel": channel})
+        super().subscribe(channel, handler)
+
+    def unsubscribe(self, channel: str, handler: Handler):
+        super().unsubscribe(channel, handler)
+        if not self.handlers.get(channel):
+            self._send({"op": "unsubscribe", "channel": channel})
+
+    async def publish(self, channel: str, message: dict):
+        await self._connected.wait()
+        self._send({"op": "publish", "channel": channel, "message": message})
+        await self._writer.drain()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+        await super().close()
+
+
+class BusBroker:
+    """Forwards published messages to every connection subscribed to the channel."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self.clients: Set[asyncio.StreamWriter] = set()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"Message bus broker listening on {self.path}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients.add(writer)
+        try:
+            while line := await reader.readline():
+                envelope = json.loads(line)
+                channel = envelope.get("channel")
+                if envelope.get("op") == "subscribe":
+                    self.subscribers[channel].add(writer)
+                elif envelope.get("op") == "unsubscribe":
+                    self.subscribers[channel].discard(writer)
+                elif envelope.get("op") == "publish":
+                    data = json.dumps({"channel": channel, "message": envelope.get("message")}).encode() + b"\n"
+                    for subscriber in list(self.subscribers.get(channel, ())):
+                        subscriber.write(data)
+        except (OSError, ValueError) as e:
+            logger.error(f"Bus client failed: {e}")
+        finally:
+            for writers in self.subscribers.values():
+                writers.discard(writer)
+            self.clients.discard(writer)
+            writer.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+
+
+def make_bus(url: str = "memory"):
+    """Create a bus from a URL: "memory" or "unix:<socket path>"."""
+    if url == "memory":
+        return InMemoryBus()
+    if url.startswith("unix:"):
+        return UnixSocketBus(url[len("unix:"):])
+    raise ValueError(f"Unknown message bus: {url}")
+
+
+async def run_broker(path: str):
+    broker = BusBroker(path)
+    await broker.start()
+    try:
+        await asyncio.Future()
+    finally:
+        await broker.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the message bus broker")
+    parser.add_argument("path", help="Unix socket path to listen on")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(run_broker(args.path))
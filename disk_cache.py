@@ -0,0 +1,128 @@
+"""Size-bounded LRU cache of files on disk, shared by the GLB and TTS caches."""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+
+def _writer_alive(tmp_path: Path) -> bool:
+    """Whether the process that is writing ``<key>.<pid>-<thread>.tmp`` still runs."""
+    try:
+        pid = int(tmp_path.suffixes[-2][1:].split("-")[0])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class DiskLRUCache:
+    """LRU cache of files stored as ``<cache_dir>/<key><suffix>``.
+
+    The in-memory index maps key -> file size in LRU order. It is rebuilt from
+    file modification times on startup, and hits touch the file so the order
+    survives restarts. Once the files add up to more than ``max_bytes``, the
+    least recently used ones are deleted.
+    """
+
+    suffix = ""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.suffix}"
+
+    def _load_index(self):
+        entries = []
+        for path in self.cache_dir.glob(f"*{self.suffix}"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        # Clean up partial writes left behind by a crash. Other processes may
+        # share the directory, so files of writers still running are kept.
+        for path in self.cache_dir.glob("*.tmp"):
+            if not _writer_alive(path):
+                path.unlink(missing_ok=True)
+
+    def __contains__(self, key: str) -> bool:
+        """Whether ``key`` is cached, without counting a hit or miss."""
+        with self._lock:
+            return key in self._index
+
+    def _lookup(self, key: str) -> Optional[Path]:
+        """Return the file cached under ``key`` and mark it recently used, or None on a miss."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            if not path.exists():
+                # File was removed behind our back
+                self._total_bytes -= self._index.pop(key)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        os.utime(path)
+        return path
+
+    def _forget(self, key: str):
+        """Drop ``key`` from the index after its file turned out to be gone."""
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+
+    def _store(self, key: str, write: Callable[[Path], None]) -> Path:
+        """Store the file ``write(tmp_path)`` creates under ``key`` and evict old entries."""
+        path = self._path(key)
+        tmp_path = self.cache_dir / f"{key}.{os.getpid()}-{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = size
+            self._total_bytes += size
+            self._evict()
+        return path
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the bound
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self._path(key).unlink(missing_ok=True)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
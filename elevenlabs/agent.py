@@ -6,6 +6,10 @@ import anthropic  # ADD IMPORT for Claude
 from dotenv import load_dotenv
 import os
 
+# Shared with the websocket server; run from the repository root with it on
+# the path: PYTHONPATH=. python elevenlabs/agent.py
+from tts import ElevenLabsBackend, SpeechSynthesizer, TTSCache
+
 class AI_Assistant:
     def __init__(self):
         load_dotenv()
@@ -14,6 +18,11 @@ class AI_Assistant:
         self.elevenlabs_client = ElevenLabs(
             api_key=os.getenv("ELEVENLABS_API_KEY"),
         )
+        self.speech = SpeechSynthesizer(
+            ElevenLabsBackend(self.elevenlabs_client),
+            play=stream,
+            cache=TTSCache(os.getenv("TTS_CACHE_DIR", "tts_cache")),
+        )
         self.transcriber = None
         self.full_transcript = [
             {"role": "user", "content": "The user is walking around in a blank 3d virtual world. You are a helpful assistant that can create 3D objects in the world by synthesizing a text prompt and calling an API for the user. Your goal is to respond to the user's ideas and help them add objects to the world. Listen to the user's thoughts. Then, create a prompt for the API describing the new object to add to the world. When it's time to give the API prompt, say, 'Let's create a <insert description of an object>.' Note that the object description should be brief but descriptive, and it should describe a standalone object that can be dropped into a 3d world (i.e. don't describe the background or surroundings of the object). If the user's idea was relatively short, add a few new fun details to the object's description. Don't say anything before 'let's create' since we want the object description to come out fast. Only if they didn't describe an object yet (say, they described a general place but not an object), ask a short follow up question."},
@@ -76,15 +85,10 @@ class AI_Assistant:
     def generate_audio(self, text: str):
         self.full_transcript.append({"role": "assistant", "content": text})
         print(f"\nAI: {text}", end="\n")
-        audio_stream = self.elevenlabs_client.text_to_speech.convert(
-            text=text,
-            voice_id="JBFqnCBsd6RMkjVDRZzb",
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_44100_128",
-        )
-        stream(audio_stream)
+        self.speech.speak(text)
 
 greeting = "Hello! What do you want to explore today?"
 ai_assistant = AI_Assistant()
+ai_assistant.speech.prewarm([greeting])
 ai_assistant.generate_audio(greeting)
 ai_assistant.start_transcription()
@@ -0,0 +1,74 @@
+"""Content-addressed on-disk cache for generated GLB files."""
+
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from disk_cache import DiskLRUCache
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a text prompt so trivially different spellings share a cache entry."""
+    return " ".join(prompt.strip().lower().split())
+
+
+def text_cache_key(
+    prompt: str,
+    seed: int,
+    simplify: float,
+    texture_size: int,
+    compression: str = "none",
+    steps: Optional[int] = None,
+) -> str:
+    """Build the cache key for a text-to-3D request."""
+    payload = {
+        "kind": "text",
+        "prompt": normalize_prompt(prompt),
+        "seed": seed,
+        "simplify": simplify,
+        "texture_size": texture_size,
+    }
+    # Only part of the key when used, so existing entries stay valid
+    if compression != "none":
+        payload["compression"] = compression
+    if steps is not None:
+        payload["steps"] = steps
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def image_cache_key(image_bytes: bytes, seed: int, simplify: float, texture_size: int, compression: str = "none") -> str:
+    """Build the cache key for an image-to-3D request from the raw image bytes."""
+    payload = {
+        "kind": "image",
+        "image": hashlib.sha256(image_bytes).hexdigest(),
+        "seed": seed,
+        "simplify": simplify,
+        "texture_size": texture_size,
+    }
+    if compression != "none":
+        payload["compression"] = compression
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def lod_cache_key(cache_key: str, level: int) -> str:
+    """Cache key of a coarser LOD level of the GLB stored under ``cache_key``."""
+    return f"{cache_key}-lod{level}"
+
+
+class GLBCache(DiskLRUCache):
+    """LRU cache of GLB files stored as ``<cache_dir>/<key>.glb``."""
+
+    suffix = ".glb"
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 2 * 1024 ** 3):
+        super().__init__(cache_dir, max_bytes)
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached GLB path for ``key``, or None on a miss."""
+        return self._lookup(key)
+
+    def put(self, key: str, src_path: Path) -> Path:
+        """Copy ``src_path`` into the cache under ``key`` and evict old entries."""
+        return self._store(key, lambda tmp_path: shutil.copyfile(src_path, tmp_path))
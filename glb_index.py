@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+"""
+Inspection of binary glTF files and a persistent index of the results.
+
+A GLB is inspected once, when it is stored: its bounds come from the
+accessor min/max values (which glTF requires for positions, even when the
+mesh is Draco or meshopt compressed), so no geometry is decoded. The index
+maps asset names to their bounds, triangle and vertex counts, texture sizes
+and byte size.
+
+Example Usage:
+python glb_index.py model.glb
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GLB_MAGIC = b"glTF"
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+# Primitive modes: points, lines, line loop, line strip, triangles, strip, fan
+TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN = 4, 5, 6
+
+KTX2_IDENTIFIER = b"\xabKTX 20\xbb\r\n\x1a\n"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS glb (
+    name TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    inspected_at REAL NOT NULL
+);
+"""
+
+
+class GLBError(ValueError):
+    """The file is not a valid binary glTF."""
+
+
+def read_glb(data: bytes) -> Tuple[dict, bytes]:
+    """Split a GLB into its JSON document and binary chunk."""
+    if len(data) < 20:
+        raise GLBError("File too short")
+    magic, version, length = struct.unpack_from("<4sII", data, 0)
+    if magic != GLB_MAGIC:
+        raise GLBError("Missing glTF magic")
+    if version != 2:
+        raise GLBError(f"Unsupported glTF version {version}")
+    gltf, binary = None, b""
+    offset = 12
+    end = min(length, len(data))
+    while offset + 8 <= end:
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN:
+            binary = chunk
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise GLBError("Missing JSON chunk")
+    return gltf, binary
+
+
+def _multiply(a: List[float], b: List[float]) -> List[float]:
+    # Column-major 4x4 matrices, as glTF stores them
+    return [
+        sum(a[k * 4 + row] * b[col * 4 + k] for k in range(4))
+        for col in range(4)
+        for row in range(4)
+    ]
+
+
+IDENTITY = [1.0, 0, 0, 0, 0, 1.0, 0, 0, 0, 0, 1.0, 0, 0, 0, 0, 1.0]
+
+
+def node_matrix(node: dict) -> List[float]:
+    """Local transform of a node from its ``matrix`` or translation/rotation/scale."""
+    if "matrix" in node:
+        return [float(value) for value in node["matrix"]]
+    tx, ty, tz = node.get("translation", (0, 0, 0))
+    qx, qy, qz, qw = node.get("rotation", (0, 0, 0, 1))
+    sx, sy, sz = node.get("scale", (1, 1, 1))
+    return [
+        (1 - 2 * (qy * qy + qz * qz)) * sx, (2 * (qx * qy + qz * qw)) * sx, (2 * (qx * qz - qy * qw)) * sx, 0,
+        (2 * (qx * qy - qz * qw)) * sy, (1 - 2 * (qx * qx + qz * qz)) * sy, (2 * (qy * qz + qx * qw)) * sy, 0,
+        (2 * (qx * qz + qy * qw)) * sz, (2 * (qy * qz - qx * qw)) * sz, (1 - 2 * (qx * qx + qy * qy)) * sz, 0,
+        tx, ty, tz, 1,
+    ]
+
+
+def _transform_point(matrix: List[float], point) -> Tuple[float, float, float]:
+    x, y, z = point
+    return tuple(matrix[row] * x + matrix[4 + row] * y + matrix[8 + row] * z + matrix[12 + row] for row in range(3))
+
+
+def _mesh_instances(gltf: dict):
+    """Yield ``(mesh, world matrix)`` for every mesh instance in the default scene."""
+    nodes = gltf.get("nodes", [])
+    scenes = gltf.get("scenes", [])
+    if scenes:
+        roots = scenes[gltf.get("scene", 0)].get("nodes", [])
+    else:
+        # No scene: treat every node that isn't a child as a root
+        children = {child for node in nodes for child in node.get("children", [])}
+        roots = [index for index in range(len(nodes)) if index not in children]
+    stack = [(index, IDENTITY) for index in roots]
+    while stack:
+        index, parent = stack.pop()
+        node = nodes[index]
+        matrix = _multiply(parent, node_matrix(node))
+        if "mesh" in node:
+            yield gltf["meshes"][node["mesh"]], matrix
+        stack.extend((child, matrix) for child in node.get("children", []))
+
+
+def _primitive_triangles(gltf: dict, primitive: dict) -> int:
+    accessors = gltf.get("accessors", [])
+    if "indices" in primitive:
+        count = accessors[primitive["indices"]]["count"]
+    elif "POSITION" in primitive.get("attributes", {}):
+        count = accessors[primitive["attributes"]["POSITION"]]["count"]
+    else:
+        return 0
+    mode = primitive.get("mode", TRIANGLES)
+    if mode == TRIANGLES:
+        return count // 3
+    if mode in (TRIANGLE_STRIP, TRIANGLE_FAN):
+        return max(count - 2, 0)
+    return 0
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """Width and height from a PNG, JPEG, WebP or KTX2 header, without decoding it."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack_from(">II", data, 16)
+    if data[:12] == KTX2_IDENTIFIER and len(data) >= 28:
+        return struct.unpack_from("<II", data, 20)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack_from("<HH", data, 26)
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+        return None
+    if data[:2] == b"\xff\xd8":
+        offset = 2
+        while offset + 9 <= len(data):
+            if data[offset] != 0xFF:
+                return None
+            marker = data[offset + 1]
+            if marker == 0xFF:
+                offset += 1
+                continue
+            # Start-of-frame markers carry the size; C4, C8 and CC are other tables
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack_from(">HH", data, offset + 5)
+                return width, height
+            segment_length = struct.unpack_from(">H", data, offset + 2)[0]
+            offset += 2 + segment_length
+    return None
+
+
+def _image_bytes(gltf: dict, binary: bytes, image: dict) -> Optional[bytes]:
+    if "bufferView" not in image:
+        # External and data URI images aren't produced by the exporter
+        return None
+    view = gltf["bufferViews"][image["bufferView"]]
+    if view.get("buffer", 0) != 0:
+        return None
+    start = view.get("byteOffset", 0)
+    return binary[start:start + view["byteLength"]]
+
+
+def inspect_glb(data: bytes) -> dict:
+    """Bounds, triangle and vertex counts, texture sizes and byte size of a GLB.
+
+    ``bounds`` is the axis-aligned box of all mesh instances in the default
+    scene, in model space with node transforms applied, or None if the file
+    has no positions with min/max.
+    """
+    gltf, binary = read_glb(data)
+    accessors = gltf.get("accessors", [])
+    low = [math.inf] * 3
+    high = [-math.inf] * 3
+    triangles = 0
+    vertices = 0
+    for mesh, matrix in _mesh_instances(gltf):
+        for primitive in mesh.get("primitives", []):
+            triangles += _primitive_triangles(gltf, primitive)
+            position = primitive.get("attributes", {}).get("POSITION")
+            if position is None:
+                continue
+            accessor = accessors[position]
+            vertices += accessor["count"]
+            if "min" not in accessor or "max" not in accessor:
+                continue
+            corners = [
+                (x, y, z)
+                for x in (accessor["min"][0], accessor["max"][0])
+                for y in (accessor["min"][1], accessor["max"][1])
+                for z in (accessor["min"][2], accessor["max"][2])
+            ]
+            for corner in corners:
+                point = _transform_point(matrix, corner)
+                for axis in range(3):
+                    low[axis] = min(low[axis], point[axis])
+                    high[axis] = max(high[axis], point[axis])
+
+    bounds = None
+    if low[0] <= high[0]:
+        bounds = {
+            "min": dict(zip("xyz", low)),
+            "max": dict(zip("xyz", high)),
+        }
+
+    textures = []
+    for image in gltf.get("images", []):
+        image_data = _image_bytes(gltf, binary, image)
+        size = image_size(image_data) if image_data else None
+        textures.append({
+            "mimeType": image.get("mimeType"),
+            "width": size[0] if size else None,
+            "height": size[1] if size else None,
+        })
+
+    return {
+        "bytes": len(data),
+        "bounds": bounds,
+        "triangles": triangles,
+        "vertices": vertices,
+        "textures": textures,
+        "extensions": gltf.get("extensionsUsed", []),
+    }
+
+
+def inspect_glb_file(path: str) -> dict:
+    with open(path, "rb") as f:
+        return inspect_glb(f.read())
+
+
+class GLBIndex:
+    """Inspection results keyed by asset name, persisted in SQLite.
+
+    Assets are content-addressed, so an entry never goes stale and each file
+    is inspected at most once. Safe to use from several threads.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.inspected = 0
+
+    def get(self, name: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT info FROM glb WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, name: str, info: dict):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO glb (name, info, inspected_at) VALUES (?, ?, ?)",
+                (name, json.dumps(info), time.time()),
+            )
+
+    def inspect(self, name: str, path: str) -> Optional[dict]:
+        """The indexed info for ``name``, inspecting the file at ``path`` if it isn't indexed yet.
+
+        Returns None if the file isn't a valid GLB.
+        """
+        info = self.get(name)
+        if info is not None:
+            return info
+        try:
+            info = inspect_glb_file(path)
+        except (OSError, GLBError, ValueError, KeyError, IndexError, struct.error) as e:
+            logger.warning(f"Could not inspect {name}: {e}")
+            return None
+        self.put(name, info)
+        self.inspected += 1
+        return info
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print what the GLB index records for a file")
+    parser.add_argument("path", help="GLB file to inspect")
+    args = parser.parse_args()
+    print(json.dumps(inspect_glb_file(args.path), indent=2))
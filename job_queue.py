@@ -0,0 +1,343 @@
+"""Job queue with priority classes and per-session fairness that runs generation work on worker threads."""
+
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Iterator, Optional
+
+# Priority classes, highest first
+PRIORITIES = ("interactive", "background")
+
+
+class QueueFull(Exception):
+    """The job's priority class or session has as many queued jobs as allowed."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    """The job was cancelled before it finished."""
+
+
+class Job:
+    """A unit of generation work and its outcome."""
+
+    def __init__(self, kind: str, params: dict, session: Optional[str] = None, priority: str = "interactive"):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}")
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.params = params
+        self.session = session
+        self.priority = priority
+        self.cancel_requested = False
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.timings = {}
+        self.future = Future()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def check_cancelled(self):
+        """Raise ``JobCancelled`` if the job was cancelled while running; called between stages."""
+        if self.cancel_requested:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "session": self.session,
+            "priority": self.priority,
+            "status": self.status,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "timings": self.timings,
+        }
+
+
+class JobQueue:
+    """Runs submitted jobs on ``num_workers`` background threads.
+
+    Interactive jobs always start before background ones. Within a priority
+    class, sessions take turns (round-robin), and each session's jobs run in
+    the order they were submitted, so one client queueing many jobs doesn't
+    hold up the others. Each class queues at most ``max_queued`` jobs and
+    each session at most ``max_queued_per_session`` of them (None means no
+    bound); ``submit`` raises ``QueueFull`` beyond that, with an estimate of
+    when to retry.
+
+    ``handler(job)`` does the actual work and returns the job result; any
+    exception it raises marks the job as failed. A handler may instead return
+    a ``Future`` after handing the job on (e.g. to a ``StagedExecutor``); the
+    worker then moves to the next job and the job finishes with the future.
+    ``cancel`` drops a queued job at once; a running one is flagged and
+    stops where the handler next calls ``job.check_cancelled()``. Finished
+    jobs are kept for lookup until ``max_history`` newer jobs have finished.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Job], object],
+        num_workers: int = 1,
+        max_history: int = 1000,
+        max_queued: Optional[int] = None,
+        max_queued_per_session: Optional[int] = None,
+    ):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_history = max_history
+        self.max_queued = max_queued
+        self.max_queued_per_session = max_queued_per_session
+        # Priority -> session -> jobs; sessions are served in the order of the dict
+        self._pending = {priority: OrderedDict() for priority in PRIORITIES}
+        self._jobs = OrderedDict()
+        self._running = 0
+        self._cond = threading.Condition()
+        self._workers = []
+        self._stopping = False
+        self.rejected = 0
+        self.cancelled = 0
+        # Smoothed seconds between job completions, for Retry-After estimates
+        self._completion_interval = None
+        self._last_completion = None
+
+    def start(self):
+        """Start the worker threads."""
+        with self._cond:
+            if self._workers:
+                return
+            self._stopping = False
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the workers once the jobs they are running finish.
+
+        Jobs that haven't started are cancelled, so nobody waits on them forever.
+        """
+        with self._cond:
+            self._stopping = True
+            pending = list(self._dispatch_order())
+            for sessions in self._pending.values():
+                sessions.clear()
+            self._cond.notify_all()
+        for job in pending:
+            self._finish(job, error=JobCancelled(f"Job {job.id} was cancelled: the queue is stopping"))
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def submit(self, kind: str, params: dict, session: Optional[str] = None, priority: str = "interactive") -> Job:
+        """Queue a new job and return it immediately, or raise ``QueueFull``."""
+        job = Job(kind, params, session, priority)
+        with self._cond:
+            queued = self._queued(priority)
+            session_queue = self._pending[priority].get(session, ())
+            if self.max_queued is not None and queued >= self.max_queued:
+                self.rejected += 1
+                raise QueueFull(
+                    f"Too many {priority} jobs queued ({queued})",
+                    self._retry_after(queued - self.max_queued + 1 + self._queued_ahead_of(priority)),
+                )
+            if self.max_queued_per_session is not None and len(session_queue) >= self.max_queued_per_session:
+                self.rejected += 1
+                # Sessions take turns, so each of the session's jobs waits about one round
+                sessions = len(self._pending[priority])
+                raise QueueFull(
+                    f"Too many jobs queued for session {session!r} ({len(session_queue)})",
+                    self._retry_after(sessions + self._queued_ahead_of(priority)),
+                )
+            self._jobs[job.id] = job
+            self._pending[priority].setdefault(session, deque()).append(job)
+            self._cond.notify()
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job: a queued one is dropped, a running one stops at its next check.
+
+        Returns the job, or None if it is unknown. Finished jobs are left as they are.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return job
+            if job.status == "queued":
+                self._remove_pending(job)
+            else:
+                job.cancel_requested = True
+                return job
+        self._finish(job, error=JobCancelled(f"Job {job.id} was cancelled"))
+        return job
+
+    def cancel_session(self, session: str) -> int:
+        """Cancel every unfinished job of a session and return how many there were."""
+        with self._cond:
+            job_ids = [job.id for job in self._jobs.values() if job.session == session and not job.done]
+        for job_id in job_ids:
+            self.cancel(job_id)
+        return len(job_ids)
+
+    def add_completed(self, kind: str, params: dict, result, session: Optional[str] = None, priority: str = "interactive") -> Job:
+        """Record a job whose result is already known, e.g. from a cache hit."""
+        job = Job(kind, params, session, priority)
+        job.started_at = job.finished_at = job.created_at
+        self._finish(job, result=result)
+        with self._cond:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Return the 0-based position of a queued job, or None if it is not queued."""
+        with self._cond:
+            for i, job in enumerate(self._dispatch_order()):
+                if job.id == job_id:
+                    return i
+        return None
+
+    def depth(self) -> int:
+        """Number of jobs waiting to start."""
+        with self._cond:
+            return sum(self._queued(priority) for priority in PRIORITIES)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": sum(self._queued(priority) for priority in PRIORITIES),
+                "queued_by_priority": {priority: self._queued(priority) for priority in PRIORITIES},
+                "sessions": len({session for sessions in self._pending.values() for session in sessions}),
+                "running": self._running,
+                "workers": self.num_workers,
+                "tracked_jobs": len(self._jobs),
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "max_queued": self.max_queued,
+                "max_queued_per_session": self.max_queued_per_session,
+            }
+
+    def _queued(self, priority: str) -> int:
+        return sum(len(jobs) for jobs in self._pending[priority].values())
+
+    def _queued_ahead_of(self, priority: str) -> int:
+        return sum(self._queued(other) for other in PRIORITIES[:PRIORITIES.index(priority)])
+
+    def _retry_after(self, completions: int) -> int:
+        """Whole seconds until about ``completions`` more jobs have finished."""
+        interval = self._completion_interval if self._completion_interval is not None else 1.0
+        return max(1, math.ceil(interval * completions))
+
+    def _dispatch_order(self) -> Iterator[Job]:
+        # The order jobs would start in if no more arrived
+        for priority in PRIORITIES:
+            queues = [list(jobs) for jobs in self._pending[priority].values()]
+            for turn in range(max(map(len, queues), default=0)):
+                for jobs in queues:
+                    if turn < len(jobs):
+                        yield jobs[turn]
+
+    def _next_job(self) -> Optional[Job]:
+        for sessions in self._pending.values():
+            if not sessions:
+                continue
+            # The session at the front takes one job and goes to the back
+            session, jobs = next(iter(sessions.items()))
+            job = jobs.popleft()
+            del sessions[session]
+            if jobs:
+                sessions[session] = jobs
+            return job
+        return None
+
+    def _remove_pending(self, job: Job):
+        sessions = self._pending[job.priority]
+        jobs = sessions[job.session]
+        jobs.remove(job)
+        if not jobs:
+            del sessions[job.session]
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not any(self._pending.values()):
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                job = self._next_job()
+                job.status = "running"
+                job.started_at = time.time()
+                self._running += 1
+            try:
+                result = self.handler(job)
+            except Exception as e:
+                self._finish(job, error=e)
+                self._release()
+                continue
+            if isinstance(result, Future):
+                result.add_done_callback(lambda future, job=job: self._finish_from_future(job, future))
+            else:
+                self._finish(job, result=result)
+                self._release()
+
+    def _finish_from_future(self, job: Job, future: Future):
+        error = future.exception()
+        if error is not None:
+            self._finish(job, error=error)
+        else:
+            self._finish(job, result=future.result())
+        self._release()
+
+    def _release(self):
+        with self._cond:
+            self._running -= 1
+            now = time.monotonic()
+            if self._last_completion is not None:
+                interval = now - self._last_completion
+                self._completion_interval = (
+                    interval if self._completion_interval is None else 0.8 * self._completion_interval + 0.2 * interval
+                )
+            self._last_completion = now
+            self._prune()
+
+    def _finish(self, job: Job, result=None, error: Optional[Exception] = None):
+        job.finished_at = time.time()
+        if isinstance(error, JobCancelled):
+            with self._cond:
+                self.cancelled += 1
+            job.status = "cancelled"
+            job.error = str(error)
+            job.future.set_exception(error)
+        elif error is not None:
+            job.status = "failed"
+            job.error = str(error)
+            job.future.set_exception(error)
+        else:
+            job.status = "done"
+            job.result = result
+            job.future.set_result(result)
+
+    def _prune(self):
+        # Drop the oldest finished jobs once history exceeds its bound
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
@@ -0,0 +1,275 @@
+"""Spatial index and non-overlapping placement of objects on the ground plane."""
+
+import math
+import random
+from collections import defaultdict
+from typing import Dict, Iterator, Optional, Tuple
+
+# Footprint radius used when an object's bounds are unknown (a unit model at scale 4)
+DEFAULT_FOOTPRINT_RADIUS = 2.0
+
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+def footprint_radius(
+    bounding_box: Optional[dict] = None,
+    scale: Optional[dict] = None,
+    position: Optional[dict] = None,
+) -> float:
+    """Radius of the circle covering an object's x/z footprint.
+
+    ``bounding_box`` is the world-space box reported by the browser (already
+    scaled); otherwise ``scale`` is applied to a unit-sized model. With the
+    object's ``position`` the circle is centred there, so it reaches the
+    box's farthest corner even if the model isn't centred on its origin.
+    """
+    if bounding_box and position and "min" in bounding_box and "max" in bounding_box:
+        return max(
+            math.hypot(bounding_box[x_end]["x"] - position.get("x", 0), bounding_box[z_end]["z"] - position.get("z", 0))
+            for x_end in ("min", "max")
+            for z_end in ("min", "max")
+        )
+    if bounding_box and "size" in bounding_box:
+        size = bounding_box["size"]
+        return 0.5 * math.hypot(size.get("x", 0), size.get("z", 0))
+    if scale:
+        return 0.5 * math.hypot(scale.get("x", 1), scale.get("z", 1))
+    return DEFAULT_FOOTPRINT_RADIUS
+
+
+def group_offset(slot: int, spacing: float) -> Tuple[float, float]:
+    """Offset of a group's ``slot``-th member from the group's centre.
+
+    Slots follow a sunflower (Vogel) spiral scaled so that any two of them
+    are at least ``spacing`` apart; slot 0 is the centre itself.
+    """
+    distance = spacing * math.sqrt(slot)
+    angle = slot * GOLDEN_ANGLE
+    return distance * math.cos(angle), distance * math.sin(angle)
+
+
+def normalized_scale(bounds: dict, size: float) -> float:
+    """Uniform scale that makes a model's largest dimension ``size``.
+
+    ``bounds`` is the model-space ``{"min", "max"}`` box from the GLB index.
+    """
+    largest = max(bounds["max"][axis] - bounds["min"][axis] for axis in "xyz")
+    return size / largest if largest > 0 else 1.0
+
+
+def model_footprint_radius(bounds: dict, scale: float) -> float:
+    """Radius around a model's origin covering its x/z footprint at any Y rotation.
+
+    ``bounds`` is the model-space ``{"min", "max"}`` box from the GLB index.
+    """
+    return scale * max(
+        math.hypot(bounds[x_end]["x"], bounds[z_end]["z"])
+        for x_end in ("min", "max")
+        for z_end in ("min", "max")
+    )
+
+
+def placed_bounds(bounds: dict, scale: dict, position: dict, rotation: Optional[dict] = None) -> Tuple[dict, float]:
+    """World-space bounding box of a model standing on the ground at ``position``.
+
+    The model is turned by ``rotation["y"]`` about its origin, as the
+    browser does, so the box covers its rotated x/z corners. Returns the
+    box (in the same shape browsers report) and the height to raise the
+    model's origin by so its lowest point touches the ground.
+    """
+    ground_offset = -bounds["min"]["y"] * scale["y"]
+    angle = (rotation or {}).get("y", 0)
+    cos, sin = math.cos(angle), math.sin(angle)
+    corners = [
+        (bounds[x_end]["x"] * scale["x"], bounds[z_end]["z"] * scale["z"])
+        for x_end in ("min", "max")
+        for z_end in ("min", "max")
+    ]
+    xs = [position["x"] + x * cos + z * sin for x, z in corners]
+    zs = [position["z"] - x * sin + z * cos for x, z in corners]
+    y = position["y"] + ground_offset
+    low = {"x": min(xs), "y": y + bounds["min"]["y"] * scale["y"], "z": min(zs)}
+    high = {"x": max(xs), "y": y + bounds["max"]["y"] * scale["y"], "z": max(zs)}
+    box = {
+        "min": low,
+        "max": high,
+        "size": {axis: high[axis] - low[axis] for axis in "xyz"},
+    }
+    return box, ground_offset
+
+
+class SpatialHashGrid:
+    """Uniform hash grid over x/z footprints.
+
+    Each object is stored in every cell its footprint circle overlaps, so a
+    query only needs to look at the cells around the query circle,
+    regardless of how large other objects are.
+    """
+
+    def __init__(self, cell_size: float = 4.0):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.objects: Dict[str, Tuple[float, float, float]] = {}
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __contains__(self, obj_id):
+        return obj_id in self.objects
+
+    def _cell_range(self, x: float, z: float, radius: float):
+        size = self.cell_size
+        return (
+            range(math.floor((x - radius) / size), math.floor((x + radius) / size) + 1),
+            range(math.floor((z - radius) / size), math.floor((z + radius) / size) + 1),
+        )
+
+    def insert(self, obj_id: str, x: float, z: float, radius: float = 0.0):
+        if obj_id in self.objects:
+            self.remove(obj_id)
+        self.objects[obj_id] = (x, z, radius)
+        xs, zs = self._cell_range(x, z, radius)
+        for cx in xs:
+            for cz in zs:
+                self.cells[(cx, cz)].add(obj_id)
+
+    def remove(self, obj_id: str):
+        entry = self.objects.pop(obj_id, None)
+        if entry is None:
+            return
+        xs, zs = self._cell_range(*entry)
+        for cx in xs:
+            for cz in zs:
+                cell = self.cells.get((cx, cz))
+                if cell is not None:
+                    cell.discard(obj_id)
+                    if not cell:
+                        del self.cells[(cx, cz)]
+
+    def move(self, obj_id: str, x: float, z: float, radius: Optional[float] = None):
+        if radius is None:
+            radius = self.objects.get(obj_id, (0, 0, 0.0))[2]
+        self.insert(obj_id, x, z, radius)
+
+    def nearby(self, x: float, z: float, distance: float) -> Iterator[Tuple[str, float, float, float]]:
+        """Yield ``(id, x, z, radius)`` for objects stored in cells within ``distance``."""
+        seen = set()
+        xs, zs = self._cell_range(x, z, distance)
+        for cx in xs:
+            for cz in zs:
+                for obj_id in self.cells.get((cx, cz), ()):
+                    if obj_id not in seen:
+                        seen.add(obj_id)
+                        yield (obj_id,) + self.objects[obj_id]
+
+    def clearance(self, x: float, z: float, radius: float, limit: float, exclude: Optional[str] = None) -> float:
+        """Gap between a circle at (x, z) and its closest neighbour, capped at ``limit``."""
+        best = limit
+        for obj_id, ox, oz, oradius in self.nearby(x, z, radius + limit):
+            if obj_id == exclude:
+                continue
+            gap = math.hypot(x - ox, z - oz) - radius - oradius
+            if gap < best:
+                best = gap
+        return best
+
+
+class PlacementEngine:
+    """Chooses non-overlapping ground positions using best-candidate sampling.
+
+    Each placement draws ``candidates`` random points in the current world
+    square and keeps the one furthest from its neighbours; a point is only
+    accepted if its footprint keeps at least ``min_gap`` from every other
+    footprint, which gives a Poisson-disk-like distribution. The square grows
+    with the total footprint area; when a round of candidates finds no free
+    spot, the next round samples a larger square.
+    """
+
+    def __init__(
+        self,
+        min_gap: float = 1.0,
+        initial_extent: float = 10.0,
+        candidates: int = 10,
+        max_fill: float = 0.3,
+        growth: float = 1.25,
+        max_rounds: int = 8,
+        cell_size: float = 4.0,
+        seed: Optional[int] = None,
+    ):
+        self.min_gap = min_gap
+        self.extent = initial_extent
+        self.candidates = candidates
+        self.max_fill = max_fill
+        self.growth = growth
+        self.max_rounds = max_rounds
+        self.grid = SpatialHashGrid(cell_size)
+        self.random = random.Random(seed)
+        self._area = 0.0
+
+    def __len__(self):
+        return len(self.grid)
+
+    def _footprint_area(self, radius: float) -> float:
+        return math.pi * (radius + self.min_gap / 2) ** 2
+
+    def add(self, obj_id: str, x: float, z: float, radius: float = DEFAULT_FOOTPRINT_RADIUS):
+        """Add or replace an object in the index."""
+        self.remove(obj_id)
+        self.grid.insert(obj_id, x, z, radius)
+        self._area += self._footprint_area(radius)
+
+    def move(self, obj_id: str, x: float, z: float, radius: Optional[float] = None):
+        """Update an object's position (and optionally its footprint)."""
+        if obj_id not in self.grid:
+            self.add(obj_id, x, z, DEFAULT_FOOTPRINT_RADIUS if radius is None else radius)
+            return
+        old_radius = self.grid.objects[obj_id][2]
+        new_radius = old_radius if radius is None else radius
+        if (x, z, new_radius) == self.grid.objects[obj_id]:
+            return
+        self._area += self._footprint_area(new_radius) - self._footprint_area(old_radius)
+        self.grid.move(obj_id, x, z, new_radius)
+
+    def remove(self, obj_id: str):
+        entry = self.grid.objects.get(obj_id)
+        if entry is not None:
+            self._area -= self._footprint_area(entry[2])
+            self.grid.remove(obj_id)
+
+    def sync(self, objects: dict):
+        """Apply positions reported by a client, touching only objects that changed."""
+        for obj_id, obj_data in objects.items():
+            position = obj_data.get("position")
+            if not position:
+                continue
+            radius = footprint_radius(obj_data.get("boundingBox"), obj_data.get("scale"), position)
+            self.move(obj_id, position.get("x", 0), position.get("z", 0), radius)
+
+    def is_free(self, x: float, z: float, radius: float, exclude: Optional[str] = None) -> bool:
+        """Whether a footprint of ``radius`` at (x, z) keeps ``min_gap`` from every other one."""
+        return self.grid.clearance(x, z, radius, self.min_gap, exclude) >= self.min_gap
+
+    def place(self, radius: float = DEFAULT_FOOTPRINT_RADIUS, obj_id: Optional[str] = None) -> Tuple[float, float]:
+        """Pick a free (x, z) for a footprint of ``radius``, reserving it if ``obj_id`` is given."""
+        # Keep the world large enough for the objects already in it
+        needed = math.sqrt((self._area + self._footprint_area(radius)) / self.max_fill) / 2
+        self.extent = max(self.extent, needed)
+
+        limit = self.min_gap * 2
+        extent = self.extent
+        best, best_clearance = None, -math.inf
+        for _ in range(self.max_rounds):
+            for _ in range(self.candidates):
+                x = self.random.uniform(-extent, extent)
+                z = self.random.uniform(-extent, extent)
+                clearance = self.grid.clearance(x, z, radius, limit)
+                if clearance > best_clearance:
+                    best, best_clearance = (x, z), clearance
+            if best_clearance >= self.min_gap:
+                break
+            # Crowded: look further out next round
+            extent *= self.growth
+
+        if obj_id is not None:
+            self.add(obj_id, best[0], best[1], radius)
+        return best
@@ -0,0 +1,146 @@
+"""GLB post-processing that can run outside the GPU sampling thread."""
+
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+from worker_pool import spawn_context
+
+logger = logging.getLogger(__name__)
+
+MESH_COMPRESSIONS = ("none", "meshopt", "draco")
+TEXTURE_COMPRESSIONS = ("none", "webp")
+
+# Coarser LOD levels never bake textures smaller than this
+MIN_LOD_TEXTURE_SIZE = 128
+
+
+def lod_levels(simplify: float, texture_size: int, count: int) -> List[Tuple[float, int]]:
+    """(simplify, texture_size) for each LOD level, finest first.
+
+    Level 0 uses the requested settings; each further level keeps half as
+    many triangles and bakes a texture half the size.
+    """
+    levels = []
+    for level in range(max(count, 1)):
+        keep = (1 - simplify) / 2 ** level
+        levels.append((round(1 - keep, 6), max(texture_size >> level, MIN_LOD_TEXTURE_SIZE)))
+    return levels
+
+
+def lod_ratio(levels: List[Tuple[float, int]], level: int) -> float:
+    """Share of level 0's triangles that ``level`` keeps."""
+    return (1 - levels[level][0]) / (1 - levels[0][0])
+
+
+def lod_paths(output_path: Path, count: int) -> List[Path]:
+    """Where the LOD levels of a model are exported, finest first."""
+    return [output_path / ("model.glb" if level == 0 else f"model.lod{level}.glb") for level in range(count)]
+
+
+def gltf_transform_command() -> List[str]:
+    """Command for the gltf-transform CLI, or an empty list if it isn't installed."""
+    executable = os.environ.get("GLTF_TRANSFORM") or shutil.which("gltf-transform")
+    return [executable] if executable else []
+
+
+def compress_glb(glb_path, mesh_compression: str = "none", texture_compression: str = "none") -> bool:
+    """Compress a GLB in place with gltf-transform; returns False if it was left as is.
+
+    ``meshopt`` and ``draco`` compress geometry (clients need the matching
+    decoder), ``webp`` re-encodes textures.
+    """
+    if mesh_compression == "none" and texture_compression == "none":
+        return False
+    command = gltf_transform_command()
+    if not command:
+        logger.warning("gltf-transform is not installed, skipping GLB compression")
+        return False
+    tmp_path = f"{glb_path}.compressed.glb"
+    try:
+        source = str(glb_path)
+        if mesh_compression != "none":
+            subprocess.run(command + [mesh_compression, source, tmp_path], check=True, capture_output=True)
+            source = tmp_path
+        if texture_compression != "none":
+            subprocess.run(command + [texture_compression, source, tmp_path], check=True, capture_output=True)
+        os.replace(tmp_path, glb_path)
+        return True
+    except subprocess.CalledProcessError as e:
+        logger.error(f"GLB compression failed: {e.stderr.decode(errors='replace')}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def derive_lod(glb_path, lod_path, ratio: float, texture_size: int, mesh_compression="none", texture_compression="none") -> bool:
+    """Write a coarser LOD level of an exported GLB with gltf-transform; returns False if it couldn't.
+
+    The mesh is simplified to ``ratio`` of its triangles and textures are
+    shrunk to fit ``texture_size``, which is much cheaper than exporting
+    the level from the generation outputs (that re-bakes the texture).
+    """
+    command = gltf_transform_command()
+    if not command:
+        return False
+    tmp_path = f"{lod_path}.derived.glb"
+    try:
+        subprocess.run(
+            command + ["simplify", str(glb_path), tmp_path, "--ratio", f"{ratio:.6f}", "--error", "0.01"],
+            check=True,
+            capture_output=True,
+        )
+        subprocess.run(
+            command + ["resize", tmp_path, tmp_path, "--width", str(texture_size), "--height", str(texture_size)],
+            check=True,
+            capture_output=True,
+        )
+        os.replace(tmp_path, lod_path)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Deriving LOD level failed: {e.stderr.decode(errors='replace')}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    compress_glb(lod_path, mesh_compression, texture_compression)
+    return True
+
+
+def export_glb(gaussian, mesh, glb_path, simplify, texture_size, mesh_compression="none", texture_compression="none"):
+    """Simplify the mesh, bake its texture and write the (optionally compressed) GLB file."""
+    # Imported here so worker processes only pay for it when they export
+    from third_party.TRELLIS.trellis.utils import postprocessing_utils
+
+    glb = postprocessing_utils.to_glb(
+        gaussian,
+        mesh,
+        simplify=simplify,
+        texture_size=texture_size,
+    )
+    glb.export(glb_path)
+    compress_glb(glb_path, mesh_compression, texture_compression)
+    return glb_path
+
+
+def make_postprocess_pool(kind: str = "thread", workers: int = 2) -> Executor:
+    """Create the executor that runs ``export_glb``.
+
+    ``"thread"`` keeps everything in-process. ``"process"`` uses spawned
+    worker processes so mesh simplification does not hold the server's GIL,
+    at the cost of a CUDA context per process when the models are on a GPU.
+    """
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="postprocess")
+    if kind != "process":
+        raise ValueError(f"Unknown post-processing executor: {kind}")
+    # Registers reducers that share CUDA tensors with the workers instead of copying them
+    # (absent when running on the CPU stubs, which have no tensors to share)
+    try:
+        import torch.multiprocessing  # noqa: F401
+    except ImportError:
+        pass
+
+    return ProcessPoolExecutor(max_workers=workers, mp_context=spawn_context())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""
+Near-duplicate lookup of past prompts and the models generated for them.
+
+Prompts are embedded as sparse hashed n-gram vectors: the prompt's words,
+ignoring order and filler words, plus the character trigrams of each word
+so that inflections ("leaf"/"leaves") still overlap. An inverted index
+from feature to prompts makes a lookup touch only prompts sharing at least
+one feature with the query, which keeps it fast on the CPU for tens of
+thousands of prompts.
+
+Example Usage:
+python prompt_index.py assets/prompts.db "a green tall tree with leaves"
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words that don't change what object a prompt describes
+STOP_WORDS = frozenset(
+    "a an the of with and in on at to for its it is that this some very made from".split()
+)
+
+# Words that change what a model looks like however similar the rest of the
+# prompt is; prompts that differ in any of these never match
+ATTRIBUTE_WORDS = {
+    "colour": frozenset(
+        "red orange yellow green blue purple violet pink brown black white gray grey silver gold golden "
+        "beige cyan magenta teal turquoise maroon navy crimson".split()
+    ),
+    "number": frozenset(
+        "one two three four five six seven eight nine ten eleven twelve dozen single double twin triple pair".split()
+    ),
+    "size": frozenset(
+        "tiny small little mini miniature big large huge giant enormous massive tall short long wide narrow".split()
+    ),
+}
+
+# Relative weight of whole words and of character trigrams
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.5
+
+# Features are hashed into this many buckets
+FEATURE_BUCKETS = 1 << 22
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    prompt TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", prompt.lower()))
+
+
+def _feature(kind: str, text: str) -> int:
+    return zlib.crc32(f"{kind}:{text}".encode()) % FEATURE_BUCKETS
+
+
+def embed(prompt: str) -> Dict[int, float]:
+    """Unit-length sparse vector (feature bucket -> weight) of a prompt."""
+    vector = defaultdict(float)
+    for word in normalize_prompt(prompt).split():
+        if word in STOP_WORDS:
+            continue
+        vector[_feature("w", word)] += WORD_WEIGHT
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            vector[_feature("t", padded[i:i + 3])] += TRIGRAM_WEIGHT
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {feature: weight / norm for feature, weight in vector.items()} if norm else {}
+
+
+def similarity(a: str, b: str) -> float:
+    """Cosine similarity of two prompts' vectors."""
+    vector = embed(b)
+    return sum(weight * vector.get(feature, 0.0) for feature, weight in embed(a).items())
+
+
+def attributes(prompt: str) -> Dict[str, frozenset]:
+    """Colour, number and size words of a prompt, by kind; digits count as numbers."""
+    words = set(normalize_prompt(prompt).split())
+    found = {kind: frozenset(words & vocabulary) for kind, vocabulary in ATTRIBUTE_WORDS.items()}
+    found["number"] |= {word for word in words if word.isdigit()}
+    return found
+
+
+def conflicting_attributes(a: str, b: str) -> List[str]:
+    """Kinds of attribute words (see ``ATTRIBUTE_WORDS``) that two prompts don't share."""
+    attributes_b = attributes(b)
+    return [kind for kind, words in attributes(a).items() if words != attributes_b[kind]]
+
+
+class PromptMatch(NamedTuple):
+    prompt: str
+    similarity: float
+    model: dict
+
+
+class PromptIndex:
+    """Past prompts and their models, with cosine-similarity nearest-neighbour lookup.
+
+    ``model`` is whatever the caller needs to place the model again (paths,
+    LOD levels, bounds). Entries are persisted in SQLite and held in memory
+    as an inverted index of their vectors; adding a prompt that is already
+    indexed replaces its model. A similar prompt only matches if it has the
+    same colour, number and size words, so "a red house" never stands in
+    for "a blue house".
+    """
+
+    def __init__(self, path: str, threshold: float = 0.8):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.threshold = threshold
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.prompts: List[str] = []
+        self.models: List[dict] = []
+        # Feature -> [(entry, weight)] of the prompts containing it
+        self.postings: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+        self._ids: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        for prompt, model in self.conn.execute("SELECT prompt, model FROM prompts ORDER BY added_at"):
+            self._insert(prompt, json.loads(model))
+        logger.info(f"Loaded {len(self.prompts)} prompts into the similarity index")
+
+    def __len__(self):
+        return len(self.prompts)
+
+    def _insert(self, prompt: str, model: dict):
+        entry = self._ids.get(prompt)
+        if entry is not None:
+            self.models[entry] = model
+            return
+        vector = embed(prompt)
+        entry = len(self.prompts)
+        self._ids[prompt] = entry
+        self.prompts.append(prompt)
+        self.models.append(model)
+        for feature, weight in vector.items():
+            self.postings[feature].append((entry, weight))
+
+    def add(self, prompt: str, model: dict):
+        prompt = normalize_prompt(prompt)
+        if not prompt:
+            return
+        with self._lock:
+            self._insert(prompt, model)
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO prompts (prompt, model, added_at) VALUES (?, ?, ?)",
+                    (prompt, json.dumps(model), time.time()),
+                )
+
+    def nearest(self, prompt: str, count: int = 5) -> List[PromptMatch]:
+        """The ``count`` most similar indexed prompts, most similar first."""
+        query = embed(prompt)
+        scores = defaultdict(float)
+        with self._lock:
+            for feature, weight in query.items():
+                for entry, entry_weight in self.postings.get(feature, ()):
+                    scores[entry] += weight * entry_weight
+            best = heapq.nlargest(count, scores.items(), key=lambda item: item[1])
+            return [PromptMatch(self.prompts[entry], score, self.models[entry]) for entry, score in best]
+
+    def lookup(self, prompt: str, threshold: Optional[float] = None, candidates: int = 5) -> Optional[PromptMatch]:
+        """The most similar of the ``candidates`` nearest indexed prompts that is at
+        least ``threshold`` similar and has no conflicting attributes."""
+        threshold = self.threshold if threshold is None else threshold
+        for match in self.nearest(prompt, count=candidates):
+            if match.similarity < threshold:
+                break
+            if not conflicting_attributes(prompt, match.prompt):
+                self.hits += 1
+                return match
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        return {"prompts": len(self.prompts), "features": len(self.postings), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the indexed prompts most similar to a prompt")
+    parser.add_argument("path", help="Prompt index database")
+    parser.add_argument("prompt", help="Prompt to look up")
+    parser.add_argument("--count", type=int, default=5, help="Number of matches to show")
+    args = parser.parse_args()
+    index = PromptIndex(args.path)
+    for match in index.nearest(args.prompt, args.count):
+        print(f"{match.similarity:.3f}  {match.prompt}")
@@ -0,0 +1,310 @@
+"""Rooms: independent worlds, each with its own state, clients and placement index."""
+
+import logging
+import math
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from broadcast import Broadcaster
+from placement import (
+    DEFAULT_FOOTPRINT_RADIUS,
+    PlacementEngine,
+    footprint_radius,
+    group_offset,
+    model_footprint_radius,
+    normalized_scale,
+    placed_bounds,
+)
+from world_store import WorldStore
+from world_sync import WorldModel
+
+logger = logging.getLogger(__name__)
+
+# Scale of models whose bounds are unknown
+DEFAULT_SCALE = 4
+
+# A group's centre is chosen with room for this many members around it
+GROUP_SIZE_HINT = 4
+# Slots tried past a group's last member before placing a new one on its own
+GROUP_SEARCH_SLOTS = 16
+# Layouts of the most recent groups that are kept for new members
+MAX_GROUPS = 16
+
+
+def new_object_id(prompt: str) -> str:
+    """Unique object id named after the prompt; asset paths are just content hashes."""
+    object_type = re.sub(r"[^a-z0-9]+", "_", prompt.lower()).strip("_")[:40] or "object"
+    return f"{object_type}_{int(time.time())}_{random.randint(1000, 9999)}"
+
+
+class Room:
+    """One world and the clients connected to it."""
+
+    def __init__(
+        self,
+        room_id: str,
+        store_path: str,
+        snapshot_every: int = 1000,
+        max_queue: int = 256,
+        policy: str = "coalesce",
+        object_size: float = 4.0,
+        resync_every: int = 100,
+        resync_interval: float = 60.0,
+    ):
+        self.id = room_id
+        # Largest dimension new models are scaled to
+        self.object_size = object_size
+        self.connections = set()
+        # Authoritative world model; clients stay in sync through sequenced deltas
+        self.world = WorldModel()
+        self.store = WorldStore(store_path, snapshot_every=snapshot_every)
+        # Outbound queues, one per client; a full queue has its backlog of
+        # world updates replaced by a snapshot (or dropped / disconnected)
+        self.broadcaster = Broadcaster(
+            max_queue=max_queue,
+            policy=policy,
+            coalescers={"world": self.world_snapshot},
+            on_closed=self.connections.discard,
+        )
+        # Spatial index of object footprints, updated as objects are placed or move
+        self.placement = PlacementEngine()
+        # Positions held for objects that are still being generated
+        self.reserved: Dict[str, dict] = {}
+        # Group id -> {"center": (x, z), "next": next slot}
+        self.groups = OrderedDict()
+        # Clients also get a full snapshot every resync_every sequence numbers
+        # and every resync_interval seconds, so one that diverged without
+        # noticing a gap in the sequence converges again
+        self.resync_every = resync_every
+        self.resync_interval = resync_interval
+        self.resynced_seq = 0
+        self.resynced_at = time.monotonic()
+
+    def world_snapshot(self) -> dict:
+        return self.world.snapshot()
+
+    def restore(self):
+        """Load the persisted world and rebuild the placement index from it."""
+        self.store.load(self.world)
+        for object_id in self.world.objects:
+            self.index_object(object_id)
+
+    def add(self, websocket):
+        self.connections.add(websocket)
+        self.broadcaster.add(websocket)
+
+    def remove(self, websocket):
+        self.connections.discard(websocket)
+        self.broadcaster.remove(websocket)
+
+    def send(self, websocket, message: dict, coalesce_key: Optional[str] = None):
+        self.broadcaster.send(websocket, message, coalesce_key)
+
+    def broadcast(self, message: dict, coalesce_key: Optional[str] = None):
+        self.broadcaster.broadcast(message, coalesce_key)
+        if coalesce_key == "world" and self.world.seq - self.resynced_seq >= self.resync_every:
+            self.broadcast_snapshot()
+
+    def broadcast_snapshot(self):
+        """Send every client the whole world."""
+        self.resynced_seq = self.world.seq
+        self.resynced_at = time.monotonic()
+        self.broadcaster.broadcast(self.world.snapshot(), coalesce_key="world")
+
+    def resync_if_due(self):
+        """Broadcast a snapshot if none was sent for ``resync_interval`` seconds."""
+        if self.connections and time.monotonic() - self.resynced_at >= self.resync_interval:
+            self.broadcast_snapshot()
+
+    def apply_events(self, events) -> Optional[dict]:
+        """Apply delta events to the world, the log on disk and the placement index.
+
+        Returns the sequenced delta to broadcast, or None if nothing changed.
+        """
+        delta = self.world.apply(events)
+        if delta is None:
+            return None
+        self.store.append(delta, self.world)
+        for event in delta["events"]:
+            if event["op"] == "remove":
+                self.placement.remove(event["id"])
+            else:
+                self.index_object(event["id"])
+        return delta
+
+    def index_object(self, object_id: str):
+        obj = self.world.objects[object_id]
+        position = obj.get("position")
+        if position:
+            radius = footprint_radius(obj.get("boundingBox"), obj.get("scale"), position)
+            self.placement.move(object_id, position.get("x", 0), position.get("z", 0), radius)
+
+    def generate_position(self, object_id: Optional[str] = None, radius: float = DEFAULT_FOOTPRINT_RADIUS) -> dict:
+        """Pick a free position for a new object and reserve it in the placement index."""
+        x, z = self.placement.place(radius, obj_id=object_id)
+        return {"x": x, "y": 0, "z": z}
+
+    def take_position(self, object_id: str, radius: float) -> dict:
+        # The reserved position, shrunk to the model's real footprint, or a new one
+        position = self.reserved.pop(object_id, None)
+        if position is None:
+            return self.generate_position(object_id, radius)
+        self.placement.move(object_id, position["x"], position["z"], radius)
+        return position
+
+    def reserve_position(self, object_id: str, group: Optional[str] = None) -> dict:
+        """Hold a position for an object whose model is still being generated.
+
+        Objects of the same ``group`` (e.g. those asked for in one voice turn)
+        are laid out together around a common centre, in the order their
+        positions are reserved. The reservation assumes the largest
+        footprint a model scaled to ``object_size`` can have, so the model
+        fits wherever it ends up being. ``place_object`` uses the position;
+        ``release_position`` gives it up if generation fails.
+        """
+        # A model's largest dimension is object_size, so its footprint fits this circle
+        radius = self.object_size / math.sqrt(2)
+        position = None
+        if group is not None:
+            spacing = 2 * radius + self.placement.min_gap
+            layout = self.groups.get(group)
+            if layout is None:
+                extent = max(math.hypot(*group_offset(slot, spacing)) for slot in range(GROUP_SIZE_HINT)) + radius
+                layout = self.groups[group] = {"center": self.placement.place(extent), "next": 0}
+                while len(self.groups) > MAX_GROUPS:
+                    self.groups.popitem(last=False)
+            for slot in range(layout["next"], layout["next"] + GROUP_SEARCH_SLOTS):
+                dx, dz = group_offset(slot, spacing)
+                x, z = layout["center"][0] + dx, layout["center"][1] + dz
+                if self.placement.is_free(x, z, radius):
+                    layout["next"] = slot + 1
+                    position = {"x": x, "y": 0, "z": z}
+                    self.placement.add(object_id, x, z, radius)
+                    break
+        if position is None:
+            position = self.generate_position(object_id, radius)
+        self.reserved[object_id] = position
+        return position
+
+    def release_position(self, object_id: str):
+        """Give up the position reserved for an object that won't be placed."""
+        if self.reserved.pop(object_id, None) is not None and object_id not in self.world.objects:
+            self.placement.remove(object_id)
+
+    def place_object(
+        self,
+        path: str,
+        prompt: str,
+        lods: Optional[List[dict]] = None,
+        object_id: Optional[str] = None,
+        bounds: Optional[dict] = None,
+    ) -> dict:
+        """Add a generated model to the world and send it to every client.
+
+        ``lods`` lists the model's LOD levels (``{"level", "path", "bytes"}``,
+        finest first) so clients can load the coarsest one first. With the
+        model-space ``bounds`` from the GLB index, the model is scaled to
+        ``object_size``, placed by its real footprint and sent with its
+        bounding box and ground offset, so clients needn't measure it. An
+        object with a reserved position (see ``reserve_position``) is placed
+        there.
+        """
+        object_id = object_id or new_object_id(prompt)
+
+        scale = DEFAULT_SCALE
+        radius = DEFAULT_FOOTPRINT_RADIUS
+        if bounds:
+            scale = normalized_scale(bounds, self.object_size)
+            radius = model_footprint_radius(bounds, scale)
+
+        add_event = {
+            "op": "add",
+            "id": object_id,
+            "path": path,
+            "prompt": prompt,
+            "position": self.take_position(object_id, radius),
+            "rotation": {
+                "x": 0,
+                "y": random.uniform(0, 6.28),  # Random rotation around Y axis (0 to 2π)
+                "z": 0
+            },
+            "scale": {
+                "x": scale,
+                "y": scale,
+                "z": scale
+            }
+        }
+        if bounds:
+            add_event["boundingBox"], add_event["groundOffset"] = placed_bounds(
+                bounds, add_event["scale"], add_event["position"], add_event["rotation"]
+            )
+        if lods:
+            add_event["lods"] = lods
+        delta = self.apply_events([add_event])
+
+        # The load-object message doubles as the sequenced delta for this change
+        object_message = {key: value for key, value in add_event.items() if key != "op"}
+        object_message.update(type="load-object", prevSeq=delta["prevSeq"], seq=delta["seq"])
+        self.broadcast(object_message, coalesce_key="world")
+        logger.info(f"Room {self.id}: sent {object_id} at position: {object_message['position']}")
+        return object_message
+
+    def refine_object(
+        self,
+        object_id: str,
+        path: str,
+        lods: Optional[List[dict]] = None,
+        bounds: Optional[dict] = None,
+    ) -> Optional[dict]:
+        """Replace the model of a placed object (e.g. its preview) in place.
+
+        Clients keep the object where it is, at its current scale, and swap in
+        the new model. Returns None if the object has been removed in the
+        meantime.
+        """
+        obj = self.world.objects.get(object_id)
+        if obj is None:
+            return None
+        event = {"op": "move", "id": object_id, "path": path, "lods": lods}
+        if bounds and obj.get("position") and obj.get("scale"):
+            event["boundingBox"], event["groundOffset"] = placed_bounds(bounds, obj["scale"], obj["position"], obj.get("rotation"))
+        delta = self.apply_events([event])
+        if delta is not None:
+            self.broadcast(delta, coalesce_key="world")
+            logger.info(f"Room {self.id}: refined {object_id}")
+        return delta
+
+    def close(self):
+        self.store.close(self.world)
+
+
+class RoomManager:
+    """Rooms hosted by this process, opened on first use and restored from disk."""
+
+    def __init__(self, store_dir: str = "world", **room_options):
+        self.store_dir = store_dir
+        self.room_options = room_options
+        self.rooms: Dict[str, Room] = {}
+
+    def __iter__(self):
+        return iter(self.rooms.values())
+
+    def __contains__(self, room_id):
+        return room_id in self.rooms
+
+    def get(self, room_id: str) -> Room:
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = Room(room_id, os.path.join(self.store_dir, f"{room_id}.db"), **self.room_options)
+            room.restore()
+            self.rooms[room_id] = room
+        return room
+
+    def close(self):
+        for room in self.rooms.values():
+            room.close()
+        self.rooms.clear()
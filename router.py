@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Routes each room to one of several server processes (shards).
+
+Clients connect to the router with ``?room=<id>`` and are told which shard
+owns the room; the router can also host the message bus broker.
+
+Example Usage:
+python router.py --shards ws://localhost:8081,ws://localhost:8082 --bus /tmp/vibeworld-bus.sock
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from typing import List
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+from bus import BusBroker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOM = "default"
+ROOM_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def room_from_path(path: str) -> str:
+    """Room id from a request path like ``/?room=garden``; raises ValueError if invalid."""
+    room_id = parse_qs(urlsplit(path).query).get("room", [DEFAULT_ROOM])[0]
+    if not ROOM_ID_PATTERN.match(room_id):
+        raise ValueError(f"Invalid room id: {room_id!r}")
+    return room_id
+
+
+def request_path(websocket) -> str:
+    """Request path of a connection for both the new and legacy websockets APIs."""
+    request = getattr(websocket, "request", None)
+    if request is not None:
+        return request.path
+    return getattr(websocket, "path", "/")
+
+
+class RoomRouter:
+    """Assigns rooms to shards with rendezvous hashing.
+
+    Every process computes the same owner from the shard list alone, and
+    adding or removing a shard only moves the rooms that hashed to it.
+    """
+
+    def __init__(self, shards: List[str]):
+        self.shards = shards
+
+    def shard_for(self, room_id: str) -> str:
+        return max(self.shards, key=lambda shard: hashlib.sha1(f"{shard}|{room_id}".encode()).digest())
+
+    def url_for(self, room_id: str) -> str:
+        return f"{self.shard_for(room_id)}/?room={room_id}"
+
+
+async def redirect(websocket, router: RoomRouter, room_id: str):
+    """Tell a client which shard owns its room and close the connection"""
+    await websocket.send(json.dumps({"type": "redirect", "room": room_id, "url": router.url_for(room_id)}))
+    await websocket.close(code=1000, reason="Redirected")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Route rooms to server shards")
+    parser.add_argument("--shards", required=True, help="Comma-separated shard URLs, e.g. ws://localhost:8081")
+    parser.add_argument("--host", default="localhost", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--bus", help="Also run the message bus broker on this Unix socket path")
+    args = parser.parse_args()
+
+    router = RoomRouter(args.shards.split(","))
+
+    async def handle_client(websocket):
+        try:
+            room_id = room_from_path(request_path(websocket))
+        except ValueError as e:
+            await websocket.close(code=1008, reason=str(e))
+            return
+        await redirect(websocket, router, room_id)
+        logger.info(f"Routed room {room_id} to {router.shard_for(room_id)}")
+
+    broker = None
+    if args.bus:
+        broker = BusBroker(args.bus)
+        await broker.start()
+
+    await websockets.serve(handle_client, args.host, args.port)
+    logger.info(f"Router started at ws://{args.host}:{args.port} for {len(router.shards)} shards")
+    try:
+        await asyncio.Future()
+    finally:
+        if broker is not None:
+            await broker.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+"""Pipelined multi-stage executor with bounded queues between stages."""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+
+class Stage:
+    """One step of the pipeline.
+
+    ``fn(item)`` returns the item handed to the next stage. ``workers``
+    threads run the stage, and at most ``queue_size`` items wait in front of
+    it. A full queue blocks the previous stage, which bounds memory when a
+    later stage falls behind.
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: int = 4):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+        self.max_run = 0.0
+        self.busy = 0
+
+    def stats(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            "queued": self.queue.qsize(),
+            "busy": self.busy,
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "mean_wait": self.total_wait / done if done else 0.0,
+            "mean_run": self.total_run / done if done else 0.0,
+            "max_run": self.max_run,
+        }
+
+
+class _Item:
+    def __init__(self, value, timings: dict, check: Optional[Callable[[], None]] = None):
+        self.value = value
+        self.timings = timings
+        self.check = check
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+_STOP = object()
+
+
+class StagedExecutor:
+    """Runs each submitted item through ``stages`` in order.
+
+    Different items occupy different stages at the same time, so e.g. the GPU
+    sampling stage can start on the next request while the previous one is
+    still being post-processed.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._threads:
+            return
+        for index, stage in enumerate(self.stages):
+            for i in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop, args=(index,), name=f"stage-{stage.name}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append((index, thread))
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the workers after the items already queued have drained.
+
+        Stages are stopped in order, each once the one before it has exited,
+        so items still in flight reach the end of the pipeline. ``timeout``
+        bounds the whole shutdown.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for index, stage in enumerate(self.stages):
+            threads = [thread for stage_index, thread in self._threads if stage_index == index]
+            for _ in threads:
+                try:
+                    stage.queue.put(_STOP, timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+                except queue.Full:
+                    break
+            for thread in threads:
+                thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        self._threads = []
+
+    def submit(self, value, timings: Optional[dict] = None, check: Optional[Callable[[], None]] = None) -> Future:
+        """Queue an item for the first stage, blocking while that stage is full.
+
+        ``timings`` is filled with ``{stage: {"wait": s, "run": s}}`` as the
+        item moves through the pipeline. ``check()`` is called before each
+        stage; if it raises (e.g. because the item was cancelled), the item
+        fails with that exception without running the remaining stages.
+        """
+        item = _Item(value, timings if timings is not None else {}, check)
+        self.stages[0].queue.put(item)
+        return item.future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {stage.name: stage.stats() for stage in self.stages}
+
+    def _worker_loop(self, index: int):
+        stage = self.stages[index]
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                return
+            if item.check is not None:
+                try:
+                    item.check()
+                except Exception as e:
+                    item.future.set_exception(e)
+                    continue
+            started = time.monotonic()
+            wait = started - item.enqueued_at
+            with self._lock:
+                stage.busy += 1
+            try:
+                item.value = stage.fn(item.value)
+                error = None
+            except Exception as e:
+                error = e
+            run = time.monotonic() - started
+            item.timings[stage.name] = {"wait": wait, "run": run}
+            with self._lock:
+                stage.busy -= 1
+                stage.total_wait += wait
+                stage.total_run += run
+                stage.max_run = max(stage.max_run, run)
+                if error is None:
+                    stage.completed += 1
+                else:
+                    stage.failed += 1
+
+            if error is not None:
+                item.future.set_exception(error)
+            elif index + 1 < len(self.stages):
+                item.enqueued_at = time.monotonic()
+                self.stages[index + 1].queue.put(item)
+            else:
+                item.future.set_result(item.value)
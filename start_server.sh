@@ -7,7 +7,7 @@ mkdir -p models
 ./download_tree_model.sh
 
 # Install required Python packages
-pip install websockets
+pip install websockets aiohttp
 
 # Run the WebSocket server
 python websocket_server.py 
\ No newline at end of file
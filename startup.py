@@ -0,0 +1,86 @@
+"""Concurrent startup work (model loading, warm-up) with per-phase timings for readiness checks."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+
+class StartupTask:
+    """Phases that run one after another, e.g. ``[("load", ...), ("warmup", ...)]``."""
+
+    def __init__(self, name: str, phases: List[Tuple[str, Callable[[], None]]]):
+        self.name = name
+        self.phases = phases
+        self.status = "pending"
+        self.phase = None
+        self.timings = {}
+        self.error = None
+
+    def run(self):
+        self.status = "running"
+        for phase, fn in self.phases:
+            self.phase = phase
+            started = time.monotonic()
+            try:
+                fn()
+            except Exception as e:
+                self.status = "failed"
+                self.error = f"{phase}: {e}"
+                return
+            finally:
+                self.timings[phase] = time.monotonic() - started
+        self.phase = None
+        self.status = "ready"
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "phase": self.phase,
+            "timings": dict(self.timings),
+            "error": self.error,
+        }
+
+
+class Startup:
+    """Runs startup tasks concurrently, one thread each, and reports readiness.
+
+    The server is ready once every task has finished successfully; with no
+    tasks it is ready right away.
+    """
+
+    def __init__(self):
+        self.tasks = OrderedDict()
+        self.started_at = time.time()
+        self._threads = []
+
+    def add(self, name: str, phases: List[Tuple[str, Callable[[], None]]]) -> StartupTask:
+        task = StartupTask(name, phases)
+        self.tasks[name] = task
+        return task
+
+    def start(self):
+        for task in self.tasks.values():
+            if task.status != "pending":
+                continue
+            thread = threading.Thread(target=task.run, name=f"startup-{task.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until all tasks have finished; returns whether the server is ready."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        return self.ready
+
+    @property
+    def ready(self) -> bool:
+        return all(task.status == "ready" for task in self.tasks.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "uptime": time.time() - self.started_at,
+            "tasks": {name: task.to_dict() for name, task in self.tasks.items()},
+        }
@@ -4,12 +4,15 @@ Simple client for testing the Trellis API.
 
 Example Usage:
 python test_model_generation_client.py text "a cute house with flowers" -o models/cute_house_with_flowers.glb
+python test_model_generation_client.py jobs "a red barn" "a stone well" -d models
 """
 
 import argparse
 import requests
 import os
 import sys
+import time
+from collections import deque
 from pathlib import Path
 
 
@@ -42,6 +45,65 @@ def generate_from_text(prompt, seed=1, host="localhost", port=8000, output="mode
         return False
 
 
+def submit_text_job(prompt, seed=1, host="localhost", port=8000):
+    """Queue a text-to-3D job and return its id, waiting while the server's queue is full."""
+    url = f"http://{host}:{port}/jobs/text"
+    while True:
+        response = requests.post(url, json={"prompt": prompt, "seed": seed})
+        if response.status_code != 429:
+            break
+        retry_after = int(response.headers.get("Retry-After", 1))
+        print(f"Queue full, retrying '{prompt}' in {retry_after}s")
+        time.sleep(retry_after)
+    response.raise_for_status()
+    status = response.json()
+    print(f"Queued '{prompt}' as job {status['job_id']} (position {status['position']})")
+    return status["job_id"]
+
+
+def wait_for_job(job_id, host="localhost", port=8000, output="model.glb", poll_interval=1.0):
+    """Poll a job until it finishes and save its GLB."""
+    url = f"http://{host}:{port}/jobs/{job_id}"
+    while True:
+        response = requests.get(url)
+        if response.status_code == 404:
+            print(f"Job {job_id} is unknown to the server")
+            return False
+        response.raise_for_status()
+        status = response.json()
+        if status["status"] == "done":
+            break
+        if status["status"] == "failed":
+            print(f"Job {job_id} failed: {status['error']}")
+            return False
+        if status["status"] == "cancelled":
+            print(f"Job {job_id} was cancelled")
+            return False
+        time.sleep(poll_interval)
+    
+    response = requests.get(f"{url}/result")
+    response.raise_for_status()
+    with open(output, "wb") as f:
+        f.write(response.content)
+    print(f"Model saved to {output}")
+    return True
+
+
+def generate_many(prompts, seed=1, host="localhost", port=8000, output_dir=".", max_queued=8):
+    """Queue prompts ahead, at most ``max_queued`` at a time, and collect the models in order."""
+    def collect(job_id, prompt):
+        name = "_".join(prompt.lower().split())
+        wait_for_job(job_id, host, port, os.path.join(output_dir, f"{name}.glb"))
+
+    queued = deque()
+    for prompt in prompts:
+        if len(queued) >= max_queued:
+            collect(*queued.popleft())
+        queued.append((submit_text_job(prompt, seed, host, port), prompt))
+    while queued:
+        collect(*queued.popleft())
+
+
 def check_health(host="localhost", port=8000):
     """Check if the server is healthy."""
     url = f"http://{host}:{port}/health"
@@ -68,6 +130,12 @@ def main():
     text_parser.add_argument("--seed", type=int, default=1, help="Random seed")
     text_parser.add_argument("--output", "-o", default="model.glb", help="Output path")
     
+    # Job queue command
+    jobs_parser = subparsers.add_parser("jobs", help="Queue several text prompts at once")
+    jobs_parser.add_argument("prompts", nargs="+", help="Text prompts")
+    jobs_parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    jobs_parser.add_argument("--output-dir", "-d", default=".", help="Output directory")
+    
     # Health check command
     health_parser = subparsers.add_parser("health", help="Check server health")
     
@@ -81,6 +149,8 @@ def main():
             args.port, 
             args.output
         )
+    elif args.command == "jobs":
+        generate_many(args.prompts, args.seed, args.host, args.port, args.output_dir)
     elif args.command == "health":
         check_health(args.host, args.port)
     else:
@@ -0,0 +1,178 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from batching import MicroBatcher, run_text_batch
+from trellis_stub import StubTextPipeline
+
+
+def make_batcher(pipeline, **kwargs):
+    def run_items(items):
+        return run_text_batch(pipeline, [item["prompt"] for item in items], items[0]["seed"], items[0]["steps"])
+
+    batcher = MicroBatcher(run_items, key_fn=lambda item: (item["seed"], item["steps"]), **kwargs)
+    batcher.start()
+    return batcher
+
+
+def submit_together(batcher, items):
+    # Submit from several threads at once, like concurrent requests
+    futures = [None] * len(items)
+    barrier = threading.Barrier(len(items))
+
+    def submit(i):
+        barrier.wait()
+        futures[i] = batcher.submit(items[i])
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [future.result(timeout=5) for future in futures]
+
+
+def test_concurrent_prompts_share_one_pipeline_call():
+    pipeline = StubTextPipeline(call_delay=0.05)
+    batcher = make_batcher(pipeline, max_batch_size=4, window=0.5)
+    try:
+        prompts = ["a red barn", "a stone well", "a wooden cart", "an oak tree"]
+        results = submit_together(batcher, [{"prompt": prompt, "seed": 1, "steps": None} for prompt in prompts])
+    finally:
+        batcher.stop(timeout=5)
+    assert pipeline.batch_sizes == [4]
+    assert [result["mesh"][0].prompt for result in results] == prompts
+    assert batcher.stats()["mean_batch_size"] == 4
+
+
+def test_batch_closes_at_max_size():
+    pipeline = StubTextPipeline()
+    batcher = make_batcher(pipeline, max_batch_size=2, window=0.5)
+    try:
+        submit_together(batcher, [{"prompt": f"prompt {i}", "seed": 1, "steps": None} for i in range(4)])
+    finally:
+        batcher.stop(timeout=5)
+    assert pipeline.batch_sizes == [2, 2]
+
+
+def test_different_seeds_and_steps_are_not_batched_together():
+    pipeline = StubTextPipeline()
+    batcher = make_batcher(pipeline, max_batch_size=4, window=0.2)
+    items = [
+        {"prompt": "a", "seed": 1, "steps": None},
+        {"prompt": "b", "seed": 2, "steps": None},
+        {"prompt": "c", "seed": 1, "steps": 8},
+        {"prompt": "d", "seed": 1, "steps": None},
+    ]
+    try:
+        results = submit_together(batcher, items)
+    finally:
+        batcher.stop(timeout=5)
+    assert sorted(pipeline.batch_sizes) == [1, 1, 2]
+    assert [(result["mesh"][0].prompt, result["mesh"][0].seed) for result in results] == [("a", 1), ("b", 2), ("c", 1), ("d", 1)]
+    assert sorted(call["slat_steps"] for call in pipeline.calls) == [8, 25, 25]
+
+
+class FakeSparseTensor:
+    def __init__(self, feats, coords):
+        self.feats = feats
+        self.coords = coords
+
+
+class RecordingSampler:
+    """Records the noise it is given and returns it as the sample."""
+
+    def __init__(self, sparse):
+        self.sparse = sparse
+        self.noise = []
+
+    def sample(self, model, noise, **kwargs):
+        self.noise.append(noise.feats if self.sparse else noise)
+        return types.SimpleNamespace(samples=noise.feats if self.sparse else noise)
+
+
+class FakeTextPipeline:
+    """The parts of ``TrellisTextTo3DPipeline`` that ``run_text_batch`` uses, without ``run_batch``.
+
+    ``run`` draws its noise from the global generator like the real one does.
+    """
+
+    def __init__(self, torch):
+        self.torch = torch
+        self.device = "cpu"
+        self.models = {
+            "sparse_structure_flow_model": types.SimpleNamespace(resolution=4, in_channels=2),
+            "sparse_structure_decoder": lambda z: z[:, :1],
+            "slat_flow_model": types.SimpleNamespace(in_channels=3),
+        }
+        self.sparse_structure_sampler = RecordingSampler(sparse=False)
+        self.slat_sampler = RecordingSampler(sparse=True)
+        self.sparse_structure_sampler_params = {"steps": 25}
+        self.slat_sampler_params = {"steps": 25}
+        self.slat_normalization = {"std": [1.0] * 3, "mean": [0.0] * 3}
+
+    def get_cond(self, prompts):
+        self.batch_size = len(prompts)
+        return {"cond": self.torch.zeros(len(prompts), 4), "neg_cond": self.torch.zeros(1, 4)}
+
+    def decode_slat(self, slat, formats):
+        return {kind: [None] * self.batch_size for kind in formats}
+
+    def run(self, prompt, seed, sparse_structure_sampler_params, slat_sampler_params):
+        torch = self.torch
+        torch.manual_seed(seed)
+        cond = self.get_cond([prompt])
+        flow_model = self.models["sparse_structure_flow_model"]
+        reso = flow_model.resolution
+        noise = torch.randn(1, flow_model.in_channels, reso, reso, reso)
+        z_s = self.sparse_structure_sampler.sample(flow_model, noise, **cond).samples
+        coords = torch.argwhere(self.models["sparse_structure_decoder"](z_s) > 0)[:, [0, 2, 3, 4]].int()
+        feats = torch.randn(coords.shape[0], self.models["slat_flow_model"].in_channels)
+        self.slat_sampler.sample(self.models["slat_flow_model"], FakeSparseTensor(feats, coords), **cond)
+        return {"mesh": [None], "gaussian": [None]}
+
+
+def test_sample_noise_does_not_depend_on_batch_composition(monkeypatch):
+    torch = pytest.importorskip("torch")
+    # run_text_batch builds the sparse noise with TRELLIS's SparseTensor
+    sparse = types.ModuleType("third_party.TRELLIS.trellis.modules.sparse")
+    sparse.SparseTensor = FakeSparseTensor
+    parent = None
+    for name in ("third_party", "third_party.TRELLIS", "third_party.TRELLIS.trellis", "third_party.TRELLIS.trellis.modules"):
+        module = types.ModuleType(name)
+        monkeypatch.setitem(sys.modules, name, module)
+        if parent is not None:
+            setattr(parent, name.rsplit(".", 1)[1], module)
+        parent = module
+    parent.sparse = sparse
+    monkeypatch.setitem(sys.modules, sparse.__name__, sparse)
+
+    solo = FakeTextPipeline(torch)
+    run_text_batch(solo, ["a red barn"], seed=3)
+    batched = FakeTextPipeline(torch)
+    run_text_batch(batched, ["a stone well", "a red barn"], seed=3)
+
+    assert torch.equal(batched.sparse_structure_sampler.noise[0][1], solo.sparse_structure_sampler.noise[0][0])
+    # The second sample's voxels follow the first sample's in the sparse noise
+    solo_feats = solo.slat_sampler.noise[0]
+    batched_feats = batched.slat_sampler.noise[0]
+    assert torch.equal(batched_feats[len(batched_feats) - len(solo_feats):], solo_feats)
+    # Both samples start from the same noise, as in two solo runs with this seed
+    assert torch.equal(batched.sparse_structure_sampler.noise[0][0], batched.sparse_structure_sampler.noise[0][1])
+
+
+def test_failed_batch_fails_every_item():
+    def fail(items):
+        raise RuntimeError("out of memory")
+
+    batcher = MicroBatcher(fail, max_batch_size=2, window=0.2)
+    batcher.start()
+    try:
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="out of memory"):
+                future.result(timeout=5)
+    finally:
+        batcher.stop(timeout=5)
@@ -0,0 +1,111 @@
+import json
+import math
+import struct
+
+import pytest
+
+from glb_index import CHUNK_BIN, CHUNK_JSON, KTX2_IDENTIFIER, GLBError, image_size, inspect_glb, node_matrix
+
+PNG = b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", 640, 480) + b"\x08\x06\x00\x00\x00"
+# SOI, an APP0 segment, then a baseline start-of-frame with height 200 and width 300
+JPEG = b"\xff\xd8" + b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9) + b"\xff\xc0" + struct.pack(">HBHHB", 17, 8, 200, 300, 3) + bytes(9)
+KTX2 = KTX2_IDENTIFIER + struct.pack("<IIII", 0, 1, 1024, 512) + bytes(8)
+
+
+def pad(data: bytes, filler: bytes) -> bytes:
+    return data + filler * (-len(data) % 4)
+
+
+def make_glb(gltf: dict, binary: bytes = b"") -> bytes:
+    chunks = [(CHUNK_JSON, pad(json.dumps(gltf).encode(), b" "))]
+    if binary:
+        chunks.append((CHUNK_BIN, pad(binary, b"\x00")))
+    body = b"".join(struct.pack("<II", len(data), kind) + data for kind, data in chunks)
+    return struct.pack("<4sII", b"glTF", 2, 12 + len(body)) + body
+
+
+def sample_gltf(images=()) -> tuple:
+    """Two mesh instances and ``images`` embedded in the binary chunk.
+
+    Node 0 translates by (10, 0, 0), turns 90 degrees about Y and scales by 2;
+    its child node 1 moves the unit cube up by 1 with a ``matrix``. Node 2
+    holds a non-indexed triangle list and a triangle strip.
+    """
+    half = math.sqrt(0.5)
+    binary = b""
+    views = []
+    for data in images:
+        views.append({"buffer": 0, "byteOffset": len(binary), "byteLength": len(data)})
+        binary = pad(binary + data, b"\x00")
+    gltf = {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0, 2]}],
+        "nodes": [
+            {"translation": [10, 0, 0], "rotation": [0, half, 0, half], "scale": [2, 2, 2], "children": [1]},
+            {"matrix": [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 1, 0, 1], "mesh": 0},
+            {"mesh": 1},
+        ],
+        "meshes": [
+            {"primitives": [{"attributes": {"POSITION": 0}, "indices": 1}]},
+            {"primitives": [{"attributes": {"POSITION": 2}}, {"attributes": {"POSITION": 3}, "mode": 5}]},
+        ],
+        "accessors": [
+            {"count": 8, "min": [0, 0, 0], "max": [1, 1, 1]},
+            {"count": 36},
+            {"count": 9, "min": [-1, -1, -1], "max": [0, 0, 0]},
+            {"count": 5},
+        ],
+        "bufferViews": views,
+        "images": [{"bufferView": index, "mimeType": "image/png"} for index in range(len(views))],
+    }
+    return gltf, binary
+
+
+def assert_close(actual: dict, expected: tuple):
+    assert [actual[axis] for axis in "xyz"] == pytest.approx(expected, abs=1e-9)
+
+
+def test_bounds_apply_the_node_hierarchy():
+    info = inspect_glb(make_glb(*sample_gltf()))
+    # Cube: up by 1, scaled by 2, turned so +z becomes +x and +x becomes -z, then moved by 10 along x
+    assert_close(info["bounds"]["min"], (-1, -1, -2))
+    assert_close(info["bounds"]["max"], (12, 4, 0))
+
+
+def test_roots_without_a_scene_are_the_nodes_nobody_parents():
+    gltf, binary = sample_gltf()
+    del gltf["scene"], gltf["scenes"]
+    assert inspect_glb(make_glb(gltf, binary))["bounds"] == inspect_glb(make_glb(*sample_gltf()))["bounds"]
+
+
+def test_triangle_and_vertex_counts():
+    info = inspect_glb(make_glb(*sample_gltf()))
+    # 36 indices, 9 unindexed vertices and a 5-vertex strip
+    assert info["triangles"] == 12 + 3 + 3
+    assert info["vertices"] == 8 + 9 + 5
+
+
+def test_node_matrix_from_translation_rotation_scale():
+    half = math.sqrt(0.5)
+    matrix = node_matrix({"translation": [1, 2, 3], "rotation": [half, 0, 0, half], "scale": [1, 2, 3]})
+    # 90 degrees about X: the Y axis goes to +z and the Z axis to -y (column-major)
+    assert matrix == pytest.approx([1, 0, 0, 0, 0, 0, 2, 0, 0, -3, 0, 0, 1, 2, 3, 1], abs=1e-9)
+    assert node_matrix({"matrix": list(range(16))}) == [float(value) for value in range(16)]
+
+
+def test_texture_sizes_from_image_headers():
+    info = inspect_glb(make_glb(*sample_gltf(images=(PNG, JPEG, KTX2))))
+    assert [(texture["width"], texture["height"]) for texture in info["textures"]] == [(640, 480), (300, 200), (1024, 512)]
+    assert image_size(b"not an image") is None
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"glTF", "too short"),
+    (struct.pack("<4sII", b"glTX", 2, 20) + bytes(8), "magic"),
+    (struct.pack("<4sII", b"glTF", 1, 20) + bytes(8), "version 1"),
+    (struct.pack("<4sIIII", b"glTF", 2, 24, 4, CHUNK_BIN) + bytes(4), "Missing JSON chunk"),
+])
+def test_invalid_files(data, message):
+    with pytest.raises(GLBError, match=message):
+        inspect_glb(data)
@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+from job_queue import JobCancelled, JobQueue, QueueFull
+
+
+class RecordingHandler:
+    """Records the order jobs run in; a job with ``block`` waits for ``release`` between two stages."""
+
+    def __init__(self):
+        self.ran = []
+        self.stages = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, job):
+        self.ran.append(job.params["name"])
+        if job.params.get("block"):
+            self.started.set()
+            self.release.wait(5)
+            job.check_cancelled()
+        self.stages.append(job.params["name"])
+        return job.params["name"]
+
+
+def run_all(queue, jobs):
+    queue.start()
+    try:
+        return [job.future.result(timeout=5) for job in jobs]
+    finally:
+        queue.stop(timeout=5)
+
+
+def test_interactive_jobs_start_before_background_ones():
+    handler = RecordingHandler()
+    queue = JobQueue(handler)
+    jobs = [queue.submit("text", {"name": "batch"}, priority="background")]
+    jobs.append(queue.submit("text", {"name": "voice"}, priority="interactive"))
+    run_all(queue, jobs)
+    assert handler.ran == ["voice", "batch"]
+
+
+def test_sessions_take_turns():
+    handler = RecordingHandler()
+    queue = JobQueue(handler)
+    jobs = [queue.submit("text", {"name": f"a{i}"}, session="a") for i in range(3)]
+    jobs += [queue.submit("text", {"name": f"b{i}"}, session="b") for i in range(2)]
+    assert queue.position(jobs[3].id) == 1
+    run_all(queue, jobs)
+    assert handler.ran == ["a0", "b0", "a1", "b1", "a2"]
+
+
+def test_full_class_is_rejected():
+    queue = JobQueue(RecordingHandler(), max_queued=2)
+    queue.submit("text", {"name": "a"}, session="a")
+    queue.submit("text", {"name": "b"}, session="b")
+    with pytest.raises(QueueFull) as raised:
+        queue.submit("text", {"name": "c"}, session="c")
+    assert raised.value.retry_after >= 1
+    # The other class has its own bound
+    queue.submit("text", {"name": "d"}, priority="background")
+    assert queue.stats()["rejected"] == 1
+
+
+def test_full_session_is_rejected_without_blocking_others():
+    queue = JobQueue(RecordingHandler(), max_queued_per_session=2)
+    for i in range(2):
+        queue.submit("text", {"name": f"a{i}"}, session="a")
+    with pytest.raises(QueueFull):
+        queue.submit("text", {"name": "a2"}, session="a")
+    queue.submit("text", {"name": "b0"}, session="b")
+    assert queue.depth() == 3
+
+
+def test_cancel_queued_job():
+    handler = RecordingHandler()
+    queue = JobQueue(handler)
+    cancelled = queue.submit("text", {"name": "stale"})
+    kept = queue.submit("text", {"name": "fresh"})
+    assert queue.cancel(cancelled.id) is cancelled
+    assert cancelled.status == "cancelled"
+    assert queue.position(cancelled.id) is None
+    with pytest.raises(JobCancelled):
+        cancelled.future.result(timeout=0)
+    run_all(queue, [kept])
+    assert handler.ran == ["fresh"]
+
+
+def test_cancel_running_job_stops_at_next_check():
+    handler = RecordingHandler()
+    queue = JobQueue(handler)
+    job = queue.submit("text", {"name": "slow", "block": True})
+    queue.start()
+    try:
+        assert handler.started.wait(5)
+        queue.cancel(job.id)
+        assert job.cancel_requested and job.status == "running"
+        handler.release.set()
+        with pytest.raises(JobCancelled):
+            job.future.result(timeout=5)
+    finally:
+        queue.stop(timeout=5)
+    assert job.status == "cancelled"
+    assert handler.stages == []
+    assert queue.stats()["cancelled"] == 1
+
+
+def test_stop_cancels_jobs_that_have_not_started():
+    handler = RecordingHandler()
+    queue = JobQueue(handler)
+    running = queue.submit("text", {"name": "running", "block": True})
+    waiting = [queue.submit("text", {"name": f"waiting {i}"}) for i in range(2)]
+    queue.start()
+    assert handler.started.wait(5)
+    stopper = threading.Thread(target=queue.stop, kwargs={"timeout": 5})
+    stopper.start()
+    for job in waiting:
+        with pytest.raises(JobCancelled):
+            job.future.result(timeout=5)
+    # The running job is left to finish
+    handler.release.set()
+    stopper.join()
+    assert running.future.result(timeout=0) == "running"
+    assert handler.ran == ["running"]
@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+from placement import footprint_radius, model_footprint_radius, placed_bounds
+from world_sync import WorldModel
+
+# A model twice as long in x as in z, with its origin at the -x end
+LONG_MODEL = {"min": {"x": 0, "y": -0.5, "z": -0.5}, "max": {"x": 2, "y": 0.5, "z": 0.5}}
+SCALE = {"x": 2, "y": 2, "z": 2}
+ORIGIN = {"x": 10, "y": 0, "z": 5}
+
+
+def test_placed_bounds_without_rotation():
+    box, ground_offset = placed_bounds(LONG_MODEL, SCALE, ORIGIN)
+    assert ground_offset == 1
+    assert box["min"] == {"x": 10, "y": 0, "z": 4}
+    assert box["max"] == {"x": 14, "y": 2, "z": 6}
+
+
+def test_placed_bounds_follow_the_y_rotation():
+    # A quarter turn about Y sends +x to -z, as in three.js
+    box, _ = placed_bounds(LONG_MODEL, SCALE, ORIGIN, {"x": 0, "y": math.pi / 2, "z": 0})
+    assert [box["min"][axis] for axis in "xyz"] == pytest.approx([9, 0, 1])
+    assert [box["max"][axis] for axis in "xyz"] == pytest.approx([11, 2, 5])
+    assert [box["size"][axis] for axis in "xyz"] == pytest.approx([2, 2, 4])
+
+
+def test_footprint_covers_the_farthest_corner_from_the_origin():
+    radius = model_footprint_radius(LONG_MODEL, 2)
+    assert radius == pytest.approx(math.hypot(4, 1))
+    for angle in (0, math.pi / 2, math.pi):
+        box, _ = placed_bounds(LONG_MODEL, SCALE, ORIGIN, {"y": angle})
+        assert footprint_radius(box, SCALE, ORIGIN) == pytest.approx(radius)
+    # In between, the axis-aligned box is larger than the model
+    box, _ = placed_bounds(LONG_MODEL, SCALE, ORIGIN, {"y": 0.7})
+    assert footprint_radius(box, SCALE, ORIGIN) > radius
+
+
+def test_bounding_box_moves_with_the_object():
+    world = WorldModel()
+    box, _ = placed_bounds(LONG_MODEL, SCALE, ORIGIN)
+    world.apply([{"op": "add", "id": "cart", "position": ORIGIN, "scale": SCALE, "boundingBox": box}])
+    world.apply([{"op": "move", "id": "cart", "position": {"x": 0, "y": 0, "z": 0}}])
+    moved = world.objects["cart"]["boundingBox"]
+    assert moved["min"] == {"x": 0, "y": 0, "z": -1}
+    assert moved["max"] == {"x": 4, "y": 2, "z": 1}
+    assert moved["size"] == box["size"]
@@ -0,0 +1,39 @@
+import pytest
+
+from prompt_index import PromptIndex, conflicting_attributes
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = PromptIndex(str(tmp_path / "prompts.db"))
+    index.add("a tall red brick house with a white chimney", {"path": "house.glb"})
+    index.add("a medieval stone castle with four towers", {"path": "castle.glb"})
+    yield index
+    index.close()
+
+
+def test_rephrased_prompt_matches(index):
+    match = index.lookup("A tall red brick house, with a white chimney!")
+    assert match is not None and match.model == {"path": "house.glb"}
+
+
+@pytest.mark.parametrize("prompt", [
+    "a tall blue brick house with a white chimney",
+    "a medieval stone castle with two towers",
+    "a medieval stone castle with 4 towers",
+    "a small red brick house with a white chimney",
+])
+def test_different_colour_number_or_size_does_not_match(index, prompt):
+    assert index.lookup(prompt, threshold=0.5) is None
+
+
+def test_conflicting_attributes():
+    assert conflicting_attributes("a red apple", "a green apple") == ["colour"]
+    assert conflicting_attributes("three big rocks", "two rocks") == ["number", "size"]
+    assert conflicting_attributes("a wooden chair", "a wooden table") == []
+
+
+def test_index_survives_restart(index, tmp_path):
+    reopened = PromptIndex(str(tmp_path / "prompts.db"))
+    assert reopened.lookup("a medieval stone castle with four towers").model == {"path": "castle.glb"}
+    reopened.close()
@@ -0,0 +1,97 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+SERVER = Path(__file__).resolve().parent.parent / "trellis_server.py"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def stub_server(request, tmp_path):
+    """A Trellis server on the CPU stubs, with sampling costing 20 ms per step and export 0.5 s at 1024 px.
+
+    The fixture's param, if any, holds environment overrides.
+    """
+    port = free_port()
+    env = dict(
+        os.environ,
+        TRELLIS_STUB="1",
+        TRELLIS_STUB_DELAYS="sparse_structure_step=0.02,slat_step=0.02,export=0.5",
+        TRELLIS_POSTPROCESS_EXECUTOR="thread",
+        TRELLIS_LOD_LEVELS="1",
+    )
+    env.update(getattr(request, "param", {}))
+    process = subprocess.Popen(
+        [sys.executable, str(SERVER), "--host", "localhost", "--port", str(port)],
+        cwd=tmp_path,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    client = httpx.Client(base_url=f"http://localhost:{port}", timeout=30)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if client.get("/readyz").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            assert time.monotonic() < deadline, "Trellis server did not start"
+            time.sleep(0.1)
+        yield client
+    finally:
+        client.close()
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_preview_arrives_before_refined_model(stub_server):
+    submitted = stub_server.post("/jobs/text", json={"prompt": "a red barn", "preview": True}).json()
+    refine_job = submitted["refine_job"]
+
+    preview = stub_server.get(f"/jobs/{submitted['job_id']}/result", params={"wait": "true"})
+    assert preview.status_code == 200
+    assert stub_server.get(f"/jobs/{refine_job}").json()["status"] in ("queued", "running")
+
+    refined = stub_server.get(f"/jobs/{refine_job}/result", params={"wait": "true"})
+    assert refined.status_code == 200
+    assert refined.content[:4] == b"glTF"
+    timings = stub_server.get(f"/jobs/{refine_job}").json()["timings"]
+    # 25 steps of each stage at 20 ms, against 8 for the preview
+    assert timings["sample"]["run"] >= 1.0
+
+
+def test_repeated_request_is_served_from_cache(stub_server):
+    first = stub_server.post("/generate/text", json={"prompt": "a stone well", "seed": 2, "texture_size": 256})
+    second = stub_server.post("/generate/text", json={"prompt": "a stone well", "seed": 2, "texture_size": 256})
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert first.content == second.content
+
+
+@pytest.mark.parametrize("stub_server", [{"TRELLIS_LOD_LEVELS": "3"}], indirect=True)
+def test_lod_probes_are_not_counted_as_lookups(stub_server):
+    request = {"prompt": "a wooden cart", "seed": 4, "texture_size": 256}
+    stub_server.post("/generate/text", json=request)
+    second = stub_server.post("/generate/text", json=request)
+    assert second.headers["X-Cache"] == "HIT"
+    stats = stub_server.get("/cache/stats").json()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+@pytest.mark.parametrize("stub_server", [{"TRELLIS_POSTPROCESS_EXECUTOR": "process"}], indirect=True)
+def test_process_postprocess_executor(stub_server):
+    response = stub_server.post("/generate/text", json={"prompt": "an oak tree", "seed": 3, "texture_size": 256})
+    assert response.status_code == 200
+    assert response.content[:4] == b"glTF"
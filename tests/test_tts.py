@@ -0,0 +1,54 @@
+import time
+
+from tts import FakeTTSBackend, SpeechSynthesizer, TTSCache, split_sentences
+
+
+def test_split_sentences():
+    assert split_sentences("Let's create a red barn. Nice!\nWhat next? ") == ["Let's create a red barn.", "Nice!", "What next?"]
+
+
+def make_speech(tmp_path, delay=0.0, **kwargs):
+    played = []
+    backend = FakeTTSBackend(delay=delay)
+    speech = SpeechSynthesizer(backend, play=lambda chunks: played.append(list(chunks)), cache=TTSCache(tmp_path, **kwargs))
+    return speech, backend, played
+
+
+def test_reply_plays_as_one_stream_of_sentences(tmp_path):
+    speech, backend, played = make_speech(tmp_path)
+    speech.speak("Let's create a red barn. It has a weather vane!")
+    assert played == [[b"Let's create a red barn.", b"It has a weather vane!"]]
+    assert backend.calls == ["Let's create a red barn.", "It has a weather vane!"]
+
+
+def test_first_sentence_plays_before_later_ones_are_synthesized(tmp_path):
+    started = []
+    backend = FakeTTSBackend(delay=0.2)
+    speech = SpeechSynthesizer(backend, play=lambda chunks: [started.append(time.monotonic()) for _ in chunks], lookahead=1)
+    begin = time.monotonic()
+    speech.speak("One. Two. Three.")
+    assert started[0] - begin < 0.35
+    assert started[-1] - begin >= 0.55
+
+
+def test_cached_sentences_skip_the_backend(tmp_path):
+    speech, backend, played = make_speech(tmp_path)
+    speech.prewarm(["Hello! What do you want to explore today?"])
+    assert backend.calls == ["Hello!", "What do you want to explore today?"]
+    speech.speak("Hello! Let's create a stone well.")
+    assert backend.calls[2:] == ["Let's create a stone well."]
+    assert played == [[b"Hello!", b"Let's create a stone well."]]
+    assert speech.cache.stats()["hits"] == 1
+
+
+def test_cache_survives_restart_and_evicts_least_recently_used(tmp_path):
+    cache = TTSCache(tmp_path, max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    reopened = TTSCache(tmp_path, max_bytes=10)
+    assert reopened.get("a") == b"aaaa"
+    assert reopened.get("c") == b"cccc"
+    assert reopened.stats()["entries"] == 2
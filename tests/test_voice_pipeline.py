@@ -0,0 +1,28 @@
+import pytest
+
+from voice_pipeline import MAX_OBJECTS_PER_REPLY, expand_count
+
+
+@pytest.mark.parametrize("prompt, expected", [
+    ("three small houses with red roofs", "a small house with red roofs"),
+    ("two berries", "a berry"),
+    ("2 benches", "a bench"),
+    ("three buses", "a bus"),
+    ("two wolves", "a wolf"),
+    ("two caves", "a cave"),
+    ("two cactus", "a cactus"),
+    ("two glasses", "a glass"),
+    ("three potatoes", "a potato"),
+    ("two canoes", "a canoe"),
+    ("three mice", "a mouse"),
+    ("two sheep", "a sheep"),
+    ("two old oak trees", "an old oak tree"),
+])
+def test_counted_descriptions_become_singular(prompt, expected):
+    assert set(expand_count(prompt)) == {expected}
+
+
+def test_count_and_cap():
+    assert len(expand_count("three buses")) == 3
+    assert len(expand_count("20 lanterns")) == MAX_OBJECTS_PER_REPLY
+    assert expand_count("a red barn") == ["a red barn"]
@@ -0,0 +1,83 @@
+import functools
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from trellis_worker import GenerationWorker
+from worker_pool import WorkerCrashed, WorkerPool
+
+
+class CrashingWorker(GenerationWorker):
+    """Exits the worker process on a ``{"crash": True}`` task."""
+
+    def __call__(self, task):
+        if task.get("crash"):
+            os._exit(3)
+        return super().__call__(task)
+
+
+def text_task(output_path: Path, prompt: str = "a red chair") -> dict:
+    item = {"prompt": prompt, "seed": 1, "steps": 2, "simplify": 0.95, "texture_size": 256, "output_path": str(output_path)}
+    return {"kind": "text", "items": [item]}
+
+
+def wait_ready(pool: WorkerPool, count: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while pool.ready_workers() < count:
+        assert time.monotonic() < deadline, pool.stats()
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(factory, devices=("cpu", "cpu")):
+        pool = WorkerPool(
+            list(devices),
+            functools.partial(factory, stub_delays={}, export_workers=1, warmup_steps=0),
+            poll_interval=0.05,
+            restart_delay=0.1,
+        )
+        pool.start()
+        pools.append(pool)
+        wait_ready(pool, len(devices))
+        return pool
+
+    yield make
+    for pool in pools:
+        if pool._threads:
+            pool.drain(timeout=10)
+
+
+def test_dispatches_across_workers(make_pool, tmp_path):
+    pool = make_pool(GenerationWorker)
+    futures = [pool.submit(text_task(tmp_path / str(i), f"prompt {i}")) for i in range(4)]
+    results = [future.result(timeout=30) for future in futures]
+    for result in results:
+        assert Path(result[0]["glb_path"]).exists()
+    workers = pool.stats()["workers"]
+    assert [worker["completed"] for worker in workers] == [2, 2]
+    assert len({worker["pid"] for worker in workers}) == 2
+
+
+def test_crashed_worker_fails_its_tasks_and_restarts(make_pool, tmp_path):
+    pool = make_pool(CrashingWorker, devices=("cpu",))
+    with pytest.raises(WorkerCrashed):
+        pool.submit({"crash": True}).result(timeout=30)
+    wait_ready(pool, 1)
+    assert pool.stats()["workers"][0]["restarts"] == 1
+    result = pool.run(text_task(tmp_path))
+    assert Path(result[0]["glb_path"]).exists()
+
+
+def test_drain_finishes_outstanding_tasks(make_pool, tmp_path):
+    pool = make_pool(GenerationWorker)
+    futures = [pool.submit(text_task(tmp_path / str(i))) for i in range(3)]
+    assert pool.drain(timeout=30)
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert not any(worker["alive"] for worker in pool.stats()["workers"])
+    with pytest.raises(RuntimeError):
+        pool.submit(text_task(tmp_path))
@@ -0,0 +1,284 @@
+"""Long-lived realtime transcription session with mute/resume gating."""
+
+import logging
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FINAL_TRANSCRIPT = "FinalTranscript"
+PARTIAL_TRANSCRIPT = "PartialTranscript"
+
+
+def _assemblyai_transcriber(**kwargs):
+    import assemblyai as aai
+
+    return aai.RealtimeTranscriber(**kwargs)
+
+
+def _assemblyai_microphone(sample_rate: int):
+    import assemblyai as aai
+
+    return aai.extras.MicrophoneStream(sample_rate=sample_rate)
+
+
+class GatedMicrophoneStream:
+    """Wraps a microphone stream and replaces audio with silence while muted.
+
+    The microphone keeps being read while muted, so nothing said during that
+    time (e.g. the assistant's own voice) is delivered late once unmuted, and
+    the transcription session stays open without reconnecting.
+    """
+
+    def __init__(self, source: Iterable[bytes], gate: threading.Event):
+        self.source = source
+        self.gate = gate
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.source:
+            if self.closed:
+                return
+            yield chunk if self.gate.is_set() else bytes(len(chunk))
+
+    def close(self):
+        self.closed = True
+        close = getattr(self.source, "close", None)
+        if close is not None:
+            close()
+
+
+class TurnTiming:
+    """Listening latencies for one user turn."""
+
+    def __init__(self, resumed_at: float):
+        self.resumed_at = resumed_at
+        self.first_partial_at = None
+        self.final_at = None
+
+    def to_dict(self) -> dict:
+        result = {}
+        if self.first_partial_at is not None:
+            result["resume_to_first_partial"] = self.first_partial_at - self.resumed_at
+        if self.final_at is not None:
+            result["resume_to_final"] = self.final_at - self.resumed_at
+        return result
+
+
+class TranscriptionSession:
+    """One transcriber connection and microphone stream for the whole conversation.
+
+    ``pause`` mutes the microphone (audio is replaced by silence) and drops
+    any transcripts that still arrive; ``resume`` unmutes it instantly. The
+    session reconnects on its own if the stream ends unexpectedly.
+    """
+
+    def __init__(
+        self,
+        on_final: Callable[[str], None],
+        on_partial: Optional[Callable[[str], None]] = None,
+        sample_rate: int = 16000,
+        end_utterance_silence_threshold: int = 1000,
+        transcriber_factory: Callable = _assemblyai_transcriber,
+        microphone_factory: Callable = _assemblyai_microphone,
+        reconnect_delay: float = 1.0,
+    ):
+        self.on_final = on_final
+        self.on_partial = on_partial
+        self.sample_rate = sample_rate
+        self.end_utterance_silence_threshold = end_utterance_silence_threshold
+        self.transcriber_factory = transcriber_factory
+        self.microphone_factory = microphone_factory
+        self.reconnect_delay = reconnect_delay
+        self.connect_time = None
+        self.turn_timings = deque(maxlen=100)
+        self._gate = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        self._transcriber = None
+        self._microphone = None
+        self._current_turn = None
+
+    def start(self):
+        """Connect and start streaming in the background (muted until resumed)."""
+        if self._thread is not None:
+            return
+        self._closed.clear()
+        self._thread = threading.Thread(target=self._run, name="transcription", daemon=True)
+        self._thread.start()
+
+    def resume(self):
+        """Unmute the microphone, starting the session on first use."""
+        self.start()
+        self._current_turn = TurnTiming(time.monotonic())
+        self._gate.set()
+
+    def pause(self):
+        """Mute the microphone without closing the session."""
+        self._gate.clear()
+
+    @property
+    def listening(self) -> bool:
+        return self._gate.is_set()
+
+    def close(self):
+        self._closed.set()
+        self._gate.clear()
+        if self._microphone is not None:
+            self._microphone.close()
+        if self._transcriber is not None:
+            self._transcriber.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                started = time.monotonic()
+                self._transcriber = self.transcriber_factory(
+                    sample_rate=self.sample_rate,
+                    on_data=self._on_data,
+                    on_error=self._on_error,
+                    on_open=self._on_open,
+                    on_close=lambda: None,
+                    end_utterance_silence_threshold=self.end_utterance_silence_threshold,
+                )
+                self._transcriber.connect()
+                self.connect_time = time.monotonic() - started
+                logger.info(f"Transcription session connected in {self.connect_time:.2f}s")
+                self._microphone = GatedMicrophoneStream(self.microphone_factory(self.sample_rate), self._gate)
+                self._transcriber.stream(self._microphone)
+            except Exception as e:
+                logger.error(f"Transcription session failed: {e}")
+            finally:
+                if self._transcriber is not None:
+                    try:
+                        self._transcriber.close()
+                    except Exception:
+                        pass
+            if not self._closed.is_set():
+                logger.info("Transcription stream ended, reconnecting")
+                self._closed.wait(self.reconnect_delay)
+
+    def _on_open(self, session_opened):
+        logger.info(f"Transcription session ID: {session_opened.session_id}")
+
+    def _on_error(self, error):
+        logger.error(f"Transcription error: {error}")
+
+    def _on_data(self, transcript):
+        if not transcript.text or not self._gate.is_set():
+            return
+        turn = self._current_turn
+        if transcript.message_type == FINAL_TRANSCRIPT:
+            if turn is not None:
+                turn.final_at = time.monotonic()
+                self.turn_timings.append(turn)
+                logger.info(f"Listening latencies: {turn.to_dict()}")
+                self._current_turn = None
+            self.on_final(transcript.text)
+        else:
+            if turn is not None and turn.first_partial_at is None:
+                turn.first_partial_at = time.monotonic()
+            if self.on_partial is not None:
+                self.on_partial(transcript.text)
+
+
+class StubTranscript:
+    """Stand-in for ``aai.RealtimeTranscript``."""
+
+    def __init__(self, text: str, final: bool):
+        self.text = text
+        self.message_type = FINAL_TRANSCRIPT if final else PARTIAL_TRANSCRIPT
+
+
+class StubMicrophone:
+    """Produces non-silent audio chunks at a fixed rate."""
+
+    def __init__(self, sample_rate: int = 16000, chunk_seconds: float = 0.05):
+        self.chunk = b"\x01\x00" * int(sample_rate * chunk_seconds)
+        self.chunk_seconds = chunk_seconds
+        self.closed = False
+
+    def __iter__(self):
+        while not self.closed:
+            time.sleep(self.chunk_seconds)
+            yield self.chunk
+
+    def close(self):
+        self.closed = True
+
+
+class StubTranscriber:
+    """Offline stand-in for ``aai.RealtimeTranscriber``.
+
+    Speaks the phrases in ``script`` one word per ``chunks_per_word``
+    non-silent audio chunks, emitting partial transcripts as it goes. Like
+    the real transcriber, the final transcript of a phrase only comes after
+    ``end_utterance_silence_threshold`` ms of further audio, so a partial
+    with the whole phrase arrives first. Muted (silent) audio doesn't
+    advance a phrase, just like a real transcriber would hear nothing.
+    """
+
+    def __init__(
+        self,
+        on_data,
+        script: List[str],
+        chunks_per_word: int = 2,
+        sample_rate: int = 16000,
+        end_utterance_silence_threshold: int = 1000,
+        on_open=None,
+        on_error=None,
+        on_close=None,
+        **kwargs,
+    ):
+        self.on_data = on_data
+        self.on_open = on_open
+        self.on_close = on_close
+        self.script = deque(script)
+        self.chunks_per_word = chunks_per_word
+        self.sample_rate = sample_rate
+        self.end_utterance_silence = end_utterance_silence_threshold / 1000
+        self.closed = False
+
+    def connect(self):
+        if self.on_open is not None:
+            self.on_open(SimpleNamespace(session_id="stub"))
+
+    def stream(self, audio: Iterable[bytes]):
+        heard = []
+        chunks = 0
+        # Seconds of audio since the last word of the current phrase, or None
+        trailing = None
+        for chunk in audio:
+            if self.closed:
+                break
+            if not self.script:
+                continue
+            if trailing is not None:
+                # 16-bit mono samples
+                trailing += len(chunk) / (2 * self.sample_rate)
+                if trailing >= self.end_utterance_silence:
+                    self.on_data(StubTranscript(self.script.popleft(), final=True))
+                    heard = []
+                    trailing = None
+                continue
+            if not any(chunk):
+                continue
+            chunks += 1
+            if chunks % self.chunks_per_word:
+                continue
+            words = self.script[0].split()
+            heard.append(words[len(heard)])
+            self.on_data(StubTranscript(" ".join(heard), final=False))
+            if len(heard) == len(words):
+                trailing = 0.0
+
+    def close(self):
+        if not self.closed and self.on_close is not None:
+            self.on_close()
+        self.closed = True
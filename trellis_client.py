@@ -0,0 +1,213 @@
+"""Async client for the Trellis API server, for use inside the WebSocket server."""
+
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: the server is loading, overloaded or restarting
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class TrellisError(Exception):
+    """Raised when the Trellis server rejects or fails a generation request."""
+
+
+class TrellisClient:
+    """Generates models over a pooled, keep-alive HTTP connection.
+
+    Responses are streamed to disk in chunks and only renamed into place once
+    complete, so a partially downloaded GLB is never visible to browsers.
+    Up to ``max_connections`` generations can be in flight at once.
+    Requests are queued on the server under ``session_id`` (the server
+    takes turns between sessions) at ``priority`` ("interactive" or
+    "background"); a 429 is retried after the server's Retry-After.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8000,
+        max_connections: int = 4,
+        timeout: float = 600,
+        connect_timeout: float = 10,
+        retries: int = 3,
+        backoff: float = 1.0,
+        chunk_size: int = 64 * 1024,
+        session_id: Optional[str] = None,
+        priority: str = "interactive",
+    ):
+        self.base_url = f"http://{host}:{port}"
+        self.session_id = session_id
+        self.priority = priority
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created lazily so the client can be built outside a running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _text_request(self, prompt: str, seed: int, **fields) -> dict:
+        body = {"prompt": prompt, "seed": seed, "priority": self.priority, **fields}
+        if self.session_id is not None:
+            body["session"] = self.session_id
+        return body
+
+    async def generate_from_text(self, prompt: str, output, seed: int = 1) -> Path:
+        """Generate a model from a text prompt and save it to ``output``."""
+        path, _ = await self._download(
+            "POST", "/generate/text", Path(output), json=self._text_request(prompt, seed)
+        )
+        return path
+
+    async def generate_lods_from_text(self, prompt: str, output, seed: int = 1) -> List[Path]:
+        """Generate a model and download every LOD level the server advertises, finest first.
+
+        Level 0 is saved to ``output`` and level N next to it as ``<stem>.lodN.glb``.
+        """
+        paths, _ = await self._download_lods(
+            "POST", "/generate/text", Path(output), json=self._text_request(prompt, seed)
+        )
+        return paths
+
+    async def generate_preview_from_text(self, prompt: str, output, seed: int = 1) -> Tuple[List[Path], Optional[str]]:
+        """Generate a cheap preview of a model and return its LOD paths and the refine job id.
+
+        The job id is None if the server answered with the full-quality model
+        right away (e.g. from its cache); otherwise pass it to ``wait_for_job``.
+        """
+        paths, headers = await self._download_lods(
+            "POST", "/generate/text", Path(output), json=self._text_request(prompt, seed, preview=True)
+        )
+        return paths, headers.get("X-Refine-Job")
+
+    async def submit_text_job(self, prompt: str, seed: int = 1, preview: bool = False) -> dict:
+        """Queue a text job without waiting for it and return its status.
+
+        ``job_id`` is the job to pass to ``wait_for_job``; with ``preview``
+        it is a cheap preview and ``refine_job`` (if present) the full-quality
+        job. Either can be cancelled with ``cancel_job``.
+        """
+        return await self._request_json("POST", "/jobs/text", json=self._text_request(prompt, seed, preview=preview))
+
+    async def cancel_job(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued or running job; returns its status, or None if the server doesn't know it."""
+        url = f"{self.base_url}/jobs/{job_id}"
+        try:
+            async with self.session.delete(url) as response:
+                if response.status == 404:
+                    return None
+                response.raise_for_status()
+                return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TrellisError(f"Request to {url} failed: {e}") from e
+
+    async def wait_for_job(self, job_id: str, output) -> List[Path]:
+        """Wait for a queued job to finish and download its LOD levels."""
+        paths, _ = await self._download_lods("GET", f"/jobs/{job_id}/result?wait=true", Path(output))
+        return paths
+
+    async def check_health(self) -> dict:
+        async with self.session.get(f"{self.base_url}/health") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def _download_lods(self, method: str, path: str, output: Path, **kwargs):
+        path, headers = await self._download(method, path, output, **kwargs)
+        urls = [url for url in headers.get("X-LOD-Levels", "").split(",") if url]
+        lods = await asyncio.gather(*(
+            self._download("GET", url, output.with_name(f"{output.stem}.lod{level}{output.suffix}"))
+            for level, url in enumerate(urls, start=1)
+        ), return_exceptions=True)
+        paths = [path]
+        # Coarser levels are optional; keep the ones up to the first that couldn't be fetched
+        for level, lod in enumerate(lods, start=1):
+            if isinstance(lod, Exception):
+                logger.warning(f"Skipping LOD levels from {level} on: {lod}")
+                break
+            paths.append(lod[0])
+        return paths, headers
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        # Back off exponentially, but no sooner than the server asks
+        delay = self.backoff * 2 ** attempt
+        headers = getattr(error, "headers", None) or {}
+        try:
+            return max(delay, float(headers.get("Retry-After", 0)))
+        except ValueError:
+            return delay
+
+    async def _request_json(self, method: str, path: str, **kwargs) -> dict:
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status, headers=response.headers
+                        )
+                    if response.status != 200:
+                        detail = await response.text()
+                        raise TrellisError(f"{response.status}: {detail}")
+                    return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise TrellisError(f"Request to {url} failed: {e}") from e
+                delay = self._retry_delay(attempt, e)
+                logger.warning(f"Request to {url} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _download(self, method: str, path: str, output: Path, **kwargs):
+        url = f"{self.base_url}{path}"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output.with_name(output.name + ".part")
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status, headers=response.headers
+                        )
+                    if response.status != 200:
+                        detail = await response.text()
+                        raise TrellisError(f"{response.status}: {detail}")
+                    with open(tmp_path, "wb") as f:
+                        async for chunk in response.content.iter_chunked(self.chunk_size):
+                            f.write(chunk)
+                    headers = response.headers
+                os.replace(tmp_path, output)
+                return output, headers
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                tmp_path.unlink(missing_ok=True)
+                if attempt == self.retries:
+                    raise TrellisError(f"Request to {url} failed: {e}") from e
+                delay = self._retry_delay(attempt, e)
+                logger.warning(f"Request to {url} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
@@ -1,11 +1,15 @@
 #!/usr/bin/env python
 """Trellis API server for generating 3D models from text prompts."""
 
+import asyncio
+import functools
 import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 import tempfile
-import shutil
-import uuid
 import structlog
 
 # Configuration for the Trellis backends.
@@ -13,20 +17,30 @@ os.environ["ATTN_BACKEND"] = "flash-attn"  # Can be 'flash-attn' or 'xformers'.
 os.environ["SPCONV_ALGO"] = "native"  # Can be 'native' or 'auto', default is 'auto'.
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-import imageio
-from PIL import Image
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 import uvicorn
 
-# Import Trellis modules - adjust these paths as needed based on your setup
-from third_party.TRELLIS.trellis.pipelines import (
-    TrellisImageTo3DPipeline,
-    TrellisTextTo3DPipeline,
+from glb_cache import GLBCache, image_cache_key, lod_cache_key, text_cache_key
+from background_renderer import BackgroundRenderer
+from batching import MicroBatcher, run_text_batch
+from job_queue import PRIORITIES, JobCancelled, JobQueue, QueueFull
+from postprocess import (
+    MESH_COMPRESSIONS,
+    TEXTURE_COMPRESSIONS,
+    derive_lod,
+    lod_levels,
+    lod_paths,
+    lod_ratio,
+    make_postprocess_pool,
 )
-from third_party.TRELLIS.trellis.utils import postprocessing_utils, render_utils
+from staged_executor import Stage, StagedExecutor
+from startup import Startup
+from trellis_stub import parse_delays
+from trellis_worker import WARMUP_SIMPLIFY, WARMUP_TEXTURE_SIZE, GenerationWorker, load_pipeline, make_exporter, warm_up
+from worker_pool import WorkerPool, parse_devices
 
 # Initialize logger
 logger = structlog.get_logger(__name__)
@@ -42,182 +56,726 @@ image_pipeline = None
 OUTPUT_DIR = Path("./output")
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+# Default post-processing parameters
+DEFAULT_SIMPLIFY = 0.95
+DEFAULT_TEXTURE_SIZE = 1024
+
+# Cache of generated GLBs, keyed by request content
+CACHE_DIR = OUTPUT_DIR / "cache"
+CACHE_MAX_BYTES = int(os.environ.get("TRELLIS_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+glb_cache = GLBCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES)
+
+# Micro-batching of concurrent text prompts
+BATCH_WINDOW = float(os.environ.get("TRELLIS_BATCH_WINDOW_MS", 50)) / 1000
+MAX_BATCH_SIZE = int(os.environ.get("TRELLIS_MAX_BATCH_SIZE", 4))
+
+# Admission control: each priority class (interactive, background) queues at
+# most TRELLIS_MAX_QUEUED jobs and each session at most
+# TRELLIS_MAX_QUEUED_PER_SESSION (0 = unbounded); beyond that requests get a
+# 429 with Retry-After. Sessions take turns within a class.
+MAX_QUEUED = int(os.environ.get("TRELLIS_MAX_QUEUED", 64))
+MAX_QUEUED_PER_SESSION = int(os.environ.get("TRELLIS_MAX_QUEUED_PER_SESSION", 16))
+
+# Post-processing (simplify, texture baking, export) runs in its own pool of
+# threads, or of processes with TRELLIS_POSTPROCESS_EXECUTOR=process
+POSTPROCESS_EXECUTOR = os.environ.get("TRELLIS_POSTPROCESS_EXECUTOR", "thread")
+POSTPROCESS_WORKERS = int(os.environ.get("TRELLIS_POSTPROCESS_WORKERS", 2))
+postprocess_pool = None
+
+# Each GLB is also exported at coarser LOD levels, optionally compressed with
+# gltf-transform (meshopt/draco geometry, webp textures). A job finishes with
+# its full-detail GLB; the coarser levels are derived from it in the background.
+LOD_LEVELS = int(os.environ.get("TRELLIS_LOD_LEVELS", 3))
+lod_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lods")
+# Cache key -> future set once the key's coarser levels are exported
+pending_lods = {}
+MESH_COMPRESSION = os.environ.get("TRELLIS_MESH_COMPRESSION", "none")
+TEXTURE_COMPRESSION = os.environ.get("TRELLIS_TEXTURE_COMPRESSION", "none")
+
+# Preview mode: a cheap model (few sampler steps, aggressive simplification,
+# tiny texture) is returned first while the full-quality job keeps running
+PREVIEW_STEPS = int(os.environ.get("TRELLIS_PREVIEW_STEPS", 8))
+PREVIEW_SIMPLIFY = float(os.environ.get("TRELLIS_PREVIEW_SIMPLIFY", 0.99))
+PREVIEW_TEXTURE_SIZE = int(os.environ.get("TRELLIS_PREVIEW_TEXTURE_SIZE", 256))
+
+# TRELLIS_STUB=1 replaces the pipelines and GLB export with CPU stand-ins.
+# TRELLIS_STUB_DELAYS sets their costs in seconds, e.g.
+# "sparse_structure_step=0.05,slat_step=0.05,decode=0.5,export=2"
+USE_STUB = os.environ.get("TRELLIS_STUB") == "1"
+STUB_DELAYS = parse_delays(os.environ.get("TRELLIS_STUB_DELAYS", ""))
+
+# Worker-pool mode: TRELLIS_WORKER_DEVICES (e.g. "cuda:0,cuda:1", or "cpu*2"
+# with the stubs) starts one worker process per device that owns its own
+# pipelines and exports its own GLBs; jobs go to the least-loaded worker.
+# Empty runs everything in this process.
+WORKER_DEVICES = parse_devices(os.environ.get("TRELLIS_WORKER_DEVICES", ""))
+WORKER_CONCURRENCY = int(os.environ.get("TRELLIS_WORKER_CONCURRENCY", 2))
+WORKER_DRAIN_TIMEOUT = float(os.environ.get("TRELLIS_WORKER_DRAIN_TIMEOUT", 60))
+worker_pool = None
+
+# Pipelines loaded (concurrently, in the background or in every worker) and
+# warmed up with a TRELLIS_WARMUP_STEPS generation when the server starts;
+# /readyz fails until they are done. TRELLIS_WARMUP_STEPS=0 skips warm-up.
+PRELOAD_PIPELINES = tuple(kind for kind in os.environ.get("TRELLIS_PRELOAD", "").split(",") if kind)
+WARMUP_STEPS = int(os.environ.get("TRELLIS_WARMUP_STEPS", 2))
+startup = Startup()
+
+# Serializes pipeline calls so batches and image jobs never share the GPU
+gpu_lock = threading.Lock()
+# A request arriving while a pipeline is being preloaded waits for that load
+pipeline_locks = {"text": threading.Lock(), "image": threading.Lock()}
+
 # Request model for text input
 class TextPromptRequest(BaseModel):
     prompt: str
     seed: int = 1
     save_additional_files: bool = False
+    simplify: float = DEFAULT_SIMPLIFY
+    texture_size: int = DEFAULT_TEXTURE_SIZE
+    lod_levels: Optional[int] = None  # Defaults to LOD_LEVELS
+    steps: Optional[int] = None  # Sampler steps; None keeps the pipeline defaults
+    preview: bool = False
+    session: Optional[str] = None  # Defaults to the client address
+    priority: Literal["interactive", "background"] = "interactive"
 
 # Load text pipeline
 def load_text_pipeline():
     global text_pipeline
-    if text_pipeline is None:
-        logger.info("Loading text-to-3D pipeline...")
-        text_pipeline = TrellisTextTo3DPipeline.from_pretrained("JeffreyXiang/TRELLIS-text-xlarge")
-        text_pipeline.cuda()
-        logger.info("Text-to-3D pipeline loaded successfully")
+    with pipeline_locks["text"]:
+        if text_pipeline is None:
+            logger.info("Loading text-to-3D pipeline...")
+            text_pipeline = load_pipeline("text", STUB_DELAYS if USE_STUB else None)
+            logger.info("Text-to-3D pipeline loaded successfully")
 
 # Load image pipeline
 def load_image_pipeline():
     global image_pipeline
-    if image_pipeline is None:
-        logger.info("Loading image-to-3D pipeline...")
-        image_pipeline = TrellisImageTo3DPipeline.from_pretrained("JeffreyXiang/TRELLIS-image-large")
-        image_pipeline.cuda()
-        logger.info("Image-to-3D pipeline loaded successfully")
+    with pipeline_locks["image"]:
+        if image_pipeline is None:
+            logger.info("Loading image-to-3D pipeline...")
+            image_pipeline = load_pipeline("image", STUB_DELAYS if USE_STUB else None)
+            logger.info("Image-to-3D pipeline loaded successfully")
 
-# Define endpoints
-@app.post("/generate/text")
-async def generate_from_text(request: TextPromptRequest):
-    """Generate a 3D model from text prompt."""
-    # Load the pipeline on demand
-    load_text_pipeline()
+def warm_up_pipeline(kind):
+    """Run a short generation and export so the first request doesn't compile kernels."""
+    pipeline = text_pipeline if kind == "text" else image_pipeline
+    with gpu_lock:
+        outputs = warm_up(kind, pipeline, WARMUP_STEPS)
+    with tempfile.TemporaryDirectory() as tmp:
+        postprocess_pool.submit(
+            glb_exporter,
+            outputs["gaussian"][0],
+            outputs["mesh"][0],
+            Path(tmp) / "warmup.glb",
+            WARMUP_SIMPLIFY,
+            WARMUP_TEXTURE_SIZE,
+            MESH_COMPRESSION,
+            TEXTURE_COMPRESSION,
+        ).result()
+    logger.info("Warm-up complete", kind=kind)
+
+def preload_pipelines(kinds):
+    """Load and warm up pipelines in the background, each in its own thread."""
+    loaders = {"text": load_text_pipeline, "image": load_image_pipeline}
+    for kind in kinds:
+        phases = [("load", loaders[kind])]
+        if WARMUP_STEPS:
+            phases.append(("warmup", functools.partial(warm_up_pipeline, kind)))
+        startup.add(kind, phases)
+    startup.start()
+
+def additional_file_steps(outputs, output_path):
+    """Build the render steps for the preview videos and PLY file."""
+    import imageio
+    from third_party.TRELLIS.trellis.utils import render_utils
+    
+    def render(name, sample, channel):
+        def step():
+            with gpu_lock:
+                video = render_utils.render_video(sample)[channel]
+            imageio.mimsave(output_path / name, video, fps=30)
+        return name, step
     
-    if text_pipeline is None:
-        raise HTTPException(status_code=503, detail="Failed to load text-to-3D pipeline")
+    def save_ply():
+        outputs["gaussian"][0].save_ply(output_path / "model.ply")
     
-    # Create a unique ID for this request
-    request_id = str(uuid.uuid4())
-    output_path = OUTPUT_DIR / request_id
+    return [
+        render("gaussian.mp4", outputs["gaussian"][0], "color"),
+        render("radiance_field.mp4", outputs["radiance_field"][0], "color"),
+        render("mesh.mp4", outputs["mesh"][0], "normal"),
+        ("model.ply", save_ply),
+    ]
+
+def interactive_busy():
+    """Whether generation requests are waiting or running."""
+    stats = job_queue.stats()
+    return stats["queued"] + stats["running"] > 0
+
+# Additional files are rendered after the GLB is returned, when the GPU is free
+background_renderer = BackgroundRenderer(is_busy=interactive_busy)
+
+glb_exporter = make_exporter(STUB_DELAYS if USE_STUB else None)
+
+def compression_setting():
+    """Compression applied to exported GLBs, as part of their cache key."""
+    if MESH_COMPRESSION == TEXTURE_COMPRESSION == "none":
+        return "none"
+    return f"{MESH_COMPRESSION}+{TEXTURE_COMPRESSION}"
+
+def glb_response(result):
+    """Return a GLB file response tagged with its cache status and coarser LOD levels."""
+    headers = {"X-Cache": result["cache"]}
+    if result.get("artifacts"):
+        headers["X-Artifacts"] = result["artifacts"]
+    if result.get("lods"):
+        headers["X-LOD-Levels"] = ",".join(f"/lods/{result['cache_key']}/{level}" for level in range(1, result["lods"] + 1))
+    return FileResponse(
+        path=result["glb_path"],
+        filename="model.glb",
+        media_type="model/gltf-binary",
+        headers=headers,
+    )
+
+def worker_sample_stage(job, output_path):
+    """Worker-pool mode: a worker process samples the job and exports its GLBs."""
+    item = {key: value for key, value in job.params.items() if key != "cache_key"}
+    item["output_path"] = str(output_path)
+    if job.kind == "text":
+        # Batched with other prompts; the batch goes to one worker
+        exported = text_batcher.run(item)
+    else:
+        exported = worker_pool.run({"kind": "image", "items": [item]})[0]
+        job.params.pop("image_bytes", None)
+    return {
+        "job": job,
+        "output_path": output_path,
+        "glb_path": Path(exported["glb_path"]),
+        "lod_paths": lod_paths(output_path, job.params["lod_levels"])[1:],
+    }
+
+def sample_stage(job):
+    """GPU stage: run the pipeline for a job."""
+    params = job.params
+    output_path = OUTPUT_DIR / job.id
     output_path.mkdir(exist_ok=True)
     
-    try:
-        logger.info("Processing text prompt", 
-                   text_prompt=request.prompt, 
-                   seed=request.seed, 
-                   request_id=request_id)
+    if worker_pool is not None:
+        return worker_sample_stage(job, output_path)
+    
+    if job.kind == "text":
+        # Load the pipeline on demand
+        load_text_pipeline()
+        if text_pipeline is None:
+            raise RuntimeError("Failed to load text-to-3D pipeline")
         
-        # Run the pipeline
-        outputs = text_pipeline.run(
-            request.prompt,
-            seed=request.seed,
-        )
+        logger.info("Processing text prompt", 
+                   text_prompt=params["prompt"], 
+                   seed=params["seed"], 
+                   request_id=job.id)
         
-        # Process outputs
-        glb_path = output_path / "model.glb"
+        # Run the pipeline, batched with other prompts that arrive together
+        outputs = text_batcher.run({"prompt": params["prompt"], "seed": params["seed"], "steps": params["steps"]})
+    else:
+        # Load the pipeline on demand
+        load_image_pipeline()
+        if image_pipeline is None:
+            raise RuntimeError("Failed to load image-to-3D pipeline")
         
-        # Save GLB file
-        glb = postprocessing_utils.to_glb(
-            outputs["gaussian"][0],
-            outputs["mesh"][0],
-            simplify=0.95,
-            texture_size=1024,
-        )
-        glb.export(glb_path)
+        # Save uploaded image, dropping the bytes so finished jobs stay small
+        temp_file = output_path / params["filename"]
+        with open(temp_file, "wb") as buffer:
+            buffer.write(params.pop("image_bytes"))
         
-        # Optionally save additional files
-        if request.save_additional_files:
-            # Render and save videos
-            video = render_utils.render_video(outputs["gaussian"][0])["color"]
-            imageio.mimsave(output_path / "gaussian.mp4", video, fps=30)
-            
-            video = render_utils.render_video(outputs["radiance_field"][0])["color"]
-            imageio.mimsave(output_path / "radiance_field.mp4", video, fps=30)
-            
-            video = render_utils.render_video(outputs["mesh"][0])["normal"]
-            imageio.mimsave(output_path / "mesh.mp4", video, fps=30)
-            
-            # Save PLY file
-            outputs["gaussian"][0].save_ply(output_path / "model.ply")
+        logger.info("Processing image prompt", 
+                   image_file=params["filename"], 
+                   seed=params["seed"], 
+                   request_id=job.id)
         
-        logger.info("Processing complete", request_id=request_id)
+        # Load image
+        from PIL import Image
         
-        # Return the GLB file
-        return FileResponse(
-            path=glb_path,
-            filename="model.glb",
-            media_type="model/gltf-binary"
-        )
+        image = Image.open(temp_file)
         
+        # Run the pipeline
+        with gpu_lock:
+            outputs = image_pipeline.run(image, seed=params["seed"])
+    
+    return {"job": job, "outputs": outputs, "output_path": output_path}
+
+def postprocess_stage(item):
+    """CPU stage: export the full-detail GLB in the post-processing pool; coarser levels follow later."""
+    if "glb_path" in item:
+        # Already exported by a worker process
+        return item
+    params = item["job"].params
+    outputs = item["outputs"]
+    paths = lod_paths(item["output_path"], params["lod_levels"])
+    postprocess_pool.submit(
+        glb_exporter,
+        outputs["gaussian"][0],
+        outputs["mesh"][0],
+        paths[0],
+        params["simplify"],
+        params["texture_size"],
+        MESH_COMPRESSION,
+        TEXTURE_COMPRESSION,
+    ).result()
+    item["glb_path"] = paths[0]
+    item["lod_paths"] = paths[1:]
+    return item
+
+def export_lods(item):
+    """Write the coarser LOD levels of a finished job into the cache, coarsest last.
+
+    Each level is derived from the exported GLB with gltf-transform. Without
+    it, levels are exported from the generation outputs instead, which only
+    this process has (not the worker processes).
+    """
+    job = item["job"]
+    params = job.params
+    cache_key = params["cache_key"]
+    levels = lod_levels(params["simplify"], params["texture_size"], params["lod_levels"])
+    started = time.monotonic()
+    try:
+        for level, path in enumerate(item["lod_paths"], start=1):
+            simplify, texture_size = levels[level]
+            derived = derive_lod(
+                item["glb_path"], path, lod_ratio(levels, level), texture_size, MESH_COMPRESSION, TEXTURE_COMPRESSION
+            )
+            if not derived:
+                outputs = item.get("outputs")
+                if outputs is None:
+                    logger.warning("Skipping LOD levels: gltf-transform is not available", request_id=job.id)
+                    break
+                postprocess_pool.submit(
+                    glb_exporter,
+                    outputs["gaussian"][0],
+                    outputs["mesh"][0],
+                    path,
+                    simplify,
+                    texture_size,
+                    MESH_COMPRESSION,
+                    TEXTURE_COMPRESSION,
+                ).result()
+            glb_cache.put(lod_cache_key(cache_key, level), path)
+        logger.info("LOD levels exported", request_id=job.id, seconds=time.monotonic() - started)
+    except Exception as e:
+        logger.error("Failed to export LOD levels", request_id=job.id, error=str(e))
+    finally:
+        pending_lods.pop(cache_key).set_result(None)
+
+def schedule_lods(item):
+    """Export the coarser LOD levels in the background; /lods/ requests wait for them."""
+    cache_key = item["job"].params["cache_key"]
+    future = Future()
+    if pending_lods.setdefault(cache_key, future) is not future:
+        # An identical job is already exporting them
+        return
+    lod_pool.submit(export_lods, item)
+
+def finalize_stage(item):
+    """Cache the GLB and schedule any additional files in the background."""
+    job = item["job"]
+    cache_key = job.params["cache_key"]
+    glb_cache.put(cache_key, item["glb_path"])
+    if item["lod_paths"]:
+        schedule_lods(item)
+    result = {"glb_path": item["glb_path"], "cache": "MISS", "cache_key": cache_key, "lods": len(item["lod_paths"])}
+    
+    # Optionally save additional files without holding up the GLB
+    if job.params["save_additional_files"]:
+        background_renderer.submit(job.id, additional_file_steps(item["outputs"], item["output_path"]))
+        result["artifacts"] = f"/artifacts/{job.id}"
+    
+    logger.info("Processing complete", request_id=job.id, timings=job.timings)
+    return result
+
+def run_text_batch_items(items):
+    """Run a batch of text requests sharing one seed and step count through the pipeline."""
+    prompts = [item["prompt"] for item in items]
+    logger.info("Running text batch", batch_size=len(prompts), steps=items[0]["steps"])
+    if worker_pool is not None:
+        # Returns a future, so the next batch can go to another worker meanwhile
+        return worker_pool.submit({"kind": "text", "items": items})
+    with gpu_lock:
+        return run_text_batch(text_pipeline, prompts, items[0]["seed"], items[0]["steps"])
+
+# Prompts with the same seed and steps that arrive within the window share a pipeline call
+text_batcher = MicroBatcher(
+    run_text_batch_items,
+    max_batch_size=MAX_BATCH_SIZE,
+    window=BATCH_WINDOW,
+    key_fn=lambda item: (item["seed"], item["steps"]),
+)
+
+# Sampling, post-processing and finalization overlap across requests. The
+# sampling stage has enough workers to fill a batch; the batcher and gpu_lock
+# serialize the actual GPU use. Its queue is kept short so waiting jobs stay
+# in the job queue, where priorities and session fairness apply.
+generation_executor = StagedExecutor([
+    Stage("sample", sample_stage, workers=MAX_BATCH_SIZE, queue_size=1),
+    Stage("postprocess", postprocess_stage, workers=POSTPROCESS_WORKERS, queue_size=POSTPROCESS_WORKERS),
+    Stage("finalize", finalize_stage, workers=1, queue_size=4),
+])
+
+def run_generation(job):
+    """Hand a job to the staged executor, recording its per-stage timings.
+    
+    A job cancelled while running stops before its next stage.
+    """
+    return generation_executor.submit(job, timings=job.timings, check=job.check_cancelled)
+
+# A single feeder moves jobs from the queue into the (bounded) first stage
+job_queue = JobQueue(
+    run_generation,
+    num_workers=1,
+    max_queued=MAX_QUEUED or None,
+    max_queued_per_session=MAX_QUEUED_PER_SESSION or None,
+)
+
+def make_worker_pool(devices, preload=()):
+    """Worker processes that each load the pipelines on one device and export GLBs."""
+    handler_factory = functools.partial(
+        GenerationWorker,
+        stub_delays=STUB_DELAYS if USE_STUB else None,
+        mesh_compression=MESH_COMPRESSION,
+        texture_compression=TEXTURE_COMPRESSION,
+        export_workers=generation_executor.stages[1].workers,
+        preload=tuple(preload),
+        warmup_steps=WARMUP_STEPS,
+    )
+    return WorkerPool(devices, handler_factory, concurrency=WORKER_CONCURRENCY)
+
+@app.on_event("startup")
+def start_job_queue():
+    global postprocess_pool, worker_pool
+    if WORKER_DEVICES:
+        worker_pool = make_worker_pool(WORKER_DEVICES, preload=PRELOAD_PIPELINES)
+        worker_pool.start()
+        # Enough sampling threads to keep a full batch in flight per worker slot
+        generation_executor.stages[0].workers = text_batcher.max_batch_size * len(WORKER_DEVICES) * WORKER_CONCURRENCY
+    else:
+        postprocess_pool = make_postprocess_pool(POSTPROCESS_EXECUTOR, generation_executor.stages[1].workers)
+        preload_pipelines(PRELOAD_PIPELINES)
+    text_batcher.start()
+    generation_executor.start()
+    job_queue.start()
+    background_renderer.start()
+
+@app.on_event("shutdown")
+def stop_job_queue():
+    background_renderer.stop(timeout=5)
+    job_queue.stop(timeout=5)
+    if worker_pool is not None:
+        # Let jobs already handed to the workers finish
+        generation_executor.stop(timeout=WORKER_DRAIN_TIMEOUT)
+        text_batcher.stop(timeout=5)
+        worker_pool.drain(timeout=WORKER_DRAIN_TIMEOUT)
+    else:
+        generation_executor.stop(timeout=5)
+        text_batcher.stop(timeout=5)
+        postprocess_pool.shutdown(wait=False)
+
+def text_job_params(request: TextPromptRequest, steps=None, simplify=None, texture_size=None, lod_levels=None):
+    """Job parameters for a text request; keyword arguments override the request's."""
+    steps = steps or request.steps
+    simplify = simplify or request.simplify
+    texture_size = texture_size or request.texture_size
+    return {
+        "prompt": request.prompt,
+        "seed": request.seed,
+        "steps": steps,
+        "simplify": simplify,
+        "texture_size": texture_size,
+        "lod_levels": lod_levels or request.lod_levels or LOD_LEVELS,
+        "save_additional_files": request.save_additional_files,
+        "cache_key": text_cache_key(request.prompt, request.seed, simplify, texture_size, compression_setting(), steps),
+    }
+
+def preview_job_params(request: TextPromptRequest):
+    """Parameters of the cheap preview job for a text request."""
+    params = text_job_params(
+        request,
+        steps=PREVIEW_STEPS,
+        simplify=PREVIEW_SIMPLIFY,
+        texture_size=PREVIEW_TEXTURE_SIZE,
+        lod_levels=1,
+    )
+    params["save_additional_files"] = False
+    return params
+
+async def image_job_params(file, seed, save_additional_files, simplify, texture_size, lod_levels=None):
+    image_bytes = await file.read()
+    return {
+        "filename": Path(file.filename or "image.png").name,
+        "image_bytes": image_bytes,
+        "seed": seed,
+        "simplify": simplify,
+        "texture_size": texture_size,
+        "lod_levels": lod_levels or LOD_LEVELS,
+        "save_additional_files": save_additional_files,
+        "cache_key": image_cache_key(image_bytes, seed, simplify, texture_size, compression_setting()),
+    }
+
+def session_of(session, http_request: Request):
+    """The fairness session of a request: the one it names, or else the client address."""
+    if session:
+        return session
+    return http_request.client.host if http_request.client else None
+
+def submit_job(kind, params, session=None, priority="interactive"):
+    """Queue a generation job, completing it at once on a cache hit.
+    
+    Raises a 429 with Retry-After if the job's priority class or session
+    already has as many queued jobs as allowed.
+    """
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority {priority!r}")
+    if worker_pool is not None and params["save_additional_files"]:
+        # The pipeline outputs stay in the worker process
+        raise HTTPException(status_code=400, detail="Additional files are not available in worker-pool mode")
+    # Additional files are not cached, so requests for them always run the pipeline
+    if not params["save_additional_files"]:
+        cache_key = params["cache_key"]
+        cached_path = glb_cache.get(cache_key)
+        if cached_path is not None:
+            logger.info("Cache hit", kind=kind, seed=params["seed"], cache_key=cache_key)
+            params.pop("image_bytes", None)
+            # Advertise the LOD levels that are still cached, or all of them while they are being exported
+            lods = 0
+            if cache_key in pending_lods:
+                lods = params["lod_levels"] - 1
+            while lods + 1 < params["lod_levels"] and lod_cache_key(cache_key, lods + 1) in glb_cache:
+                lods += 1
+            result = {"glb_path": cached_path, "cache": "HIT", "cache_key": cache_key, "lods": lods}
+            return job_queue.add_completed(kind, params, result, session, priority)
+    try:
+        return job_queue.submit(kind, params, session, priority)
+    except QueueFull as e:
+        logger.warning("Rejected job", kind=kind, session=session, priority=priority, reason=str(e))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def submit_text_jobs(request: TextPromptRequest, session):
+    """Queue a text request's job, preceded by its preview job if it asks for one.
+    
+    Returns (job, preview job or None). The preview is skipped when the
+    full-quality model is already cached.
+    """
+    params = text_job_params(request)
+    if not request.preview or params["cache_key"] in glb_cache:
+        return submit_job("text", params, session, request.priority), None
+    # The preview is queued first so it is sampled first; its post-processing
+    # then overlaps with the full job's sampling
+    preview_job = submit_job("text", preview_job_params(request), session, request.priority)
+    try:
+        job = submit_job("text", params, session, request.priority)
+    except HTTPException:
+        job_queue.cancel(preview_job.id)
+        raise
+    return job, preview_job
+
+def job_status(job):
+    status = job.to_dict()
+    status["position"] = job_queue.position(job.id)
+    status["queue_depth"] = job_queue.depth()
+    return status
+
+async def wait_for_glb(job):
+    """Wait for a job without blocking the event loop and return its GLB."""
+    try:
+        result = await asyncio.wrap_future(job.future)
+    except JobCancelled as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
-        logger.error("Error processing request", error=str(e), request_id=request_id)
+        logger.error("Error processing request", error=str(e), request_id=job.id)
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    return glb_response(result)
+
+# Define endpoints
+@app.post("/generate/text")
+async def generate_from_text(request: TextPromptRequest, http_request: Request):
+    """Generate a 3D model from text prompt.
+    
+    With ``preview`` set, a cheap preview is returned as soon as it is ready
+    and the id of the full-quality job is sent in the X-Refine-Job header.
+    """
+    job, preview_job = submit_text_jobs(request, session_of(request.session, http_request))
+    if preview_job is None:
+        return await wait_for_glb(job)
+    response = await wait_for_glb(preview_job)
+    response.headers["X-Refine-Job"] = job.id
+    return response
 
 @app.post("/generate/image")
 async def generate_from_image(
+    http_request: Request,
     file: UploadFile = File(...),
     seed: int = Form(1),
-    save_additional_files: bool = Form(False)
+    save_additional_files: bool = Form(False),
+    simplify: float = Form(DEFAULT_SIMPLIFY),
+    texture_size: int = Form(DEFAULT_TEXTURE_SIZE),
+    lod_levels: Optional[int] = Form(None),
+    session: Optional[str] = Form(None),
+    priority: str = Form("interactive"),
 ):
     """Generate a 3D model from an image."""
-    # Load the pipeline on demand
-    load_image_pipeline()
-    
-    if image_pipeline is None:
-        raise HTTPException(status_code=503, detail="Failed to load image-to-3D pipeline")
-    
-    # Create a unique ID for this request
-    request_id = str(uuid.uuid4())
-    output_path = OUTPUT_DIR / request_id
-    output_path.mkdir(exist_ok=True)
-    
-    # Save uploaded image
-    temp_file = output_path / file.filename
-    with open(temp_file, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    params = await image_job_params(file, seed, save_additional_files, simplify, texture_size, lod_levels)
+    job = submit_job("image", params, session_of(session, http_request), priority)
+    return await wait_for_glb(job)
+
+# Job submission endpoints
+@app.post("/jobs/text")
+async def submit_text_job(request: TextPromptRequest, http_request: Request):
+    """Queue a text-to-3D job and return its id immediately.
     
-    try:
-        logger.info("Processing image prompt", 
-                   image_file=file.filename, 
-                   seed=seed, 
-                   request_id=request_id)
-        
-        # Load image
-        image = Image.open(temp_file)
-        
-        # Run the pipeline
-        outputs = image_pipeline.run(image, seed=seed)
-        
-        # Process outputs
-        glb_path = output_path / "model.glb"
-        
-        # Save GLB file
-        glb = postprocessing_utils.to_glb(
-            outputs["gaussian"][0],
-            outputs["mesh"][0],
-            simplify=0.95,
-            texture_size=1024,
-        )
-        glb.export(glb_path)
-        
-        # Optionally save additional files
-        if save_additional_files:
-            # Render and save videos
-            video = render_utils.render_video(outputs["gaussian"][0])["color"]
-            imageio.mimsave(output_path / "gaussian.mp4", video, fps=30)
-            
-            video = render_utils.render_video(outputs["radiance_field"][0])["color"]
-            imageio.mimsave(output_path / "radiance_field.mp4", video, fps=30)
-            
-            video = render_utils.render_video(outputs["mesh"][0])["normal"]
-            imageio.mimsave(output_path / "mesh.mp4", video, fps=30)
-            
-            # Save PLY file
-            outputs["gaussian"][0].save_ply(output_path / "model.ply")
-        
-        logger.info("Processing complete", request_id=request_id)
-        
-        # Return the GLB file
-        return FileResponse(
-            path=glb_path,
-            filename="model.glb",
-            media_type="model/gltf-binary"
-        )
-        
-    except Exception as e:
-        logger.error("Error processing request", error=str(e), request_id=request_id)
-        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    With ``preview`` set, the returned job is the preview and ``refine_job``
+    is the id of the full-quality job.
+    """
+    job, preview_job = submit_text_jobs(request, session_of(request.session, http_request))
+    if preview_job is None:
+        return job_status(job)
+    status = job_status(preview_job)
+    status["refine_job"] = job.id
+    return status
+
+@app.post("/jobs/image")
+async def submit_image_job(
+    http_request: Request,
+    file: UploadFile = File(...),
+    seed: int = Form(1),
+    save_additional_files: bool = Form(False),
+    simplify: float = Form(DEFAULT_SIMPLIFY),
+    texture_size: int = Form(DEFAULT_TEXTURE_SIZE),
+    lod_levels: Optional[int] = Form(None),
+    session: Optional[str] = Form(None),
+    priority: str = Form("interactive"),
+):
+    """Queue an image-to-3D job and return its id immediately."""
+    params = await image_job_params(file, seed, save_additional_files, simplify, texture_size, lod_levels)
+    return job_status(submit_job("image", params, session_of(session, http_request), priority))
+
+@app.get("/jobs")
+async def list_jobs():
+    """Report queue depth, worker usage, batching and per-stage timings."""
+    stats = job_queue.stats()
+    stats["batching"] = text_batcher.stats()
+    stats["stages"] = generation_executor.stats()
+    if worker_pool is not None:
+        stats["workers"] = worker_pool.stats()
+    return stats
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report the status and queue position of a job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job_status(job)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job: a queued one never runs, a running one stops at its next stage."""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    logger.info("Cancel requested", request_id=job_id, status=job.status)
+    return job_status(job)
+
+@app.delete("/sessions/{session}/jobs")
+async def cancel_session_jobs(session: str):
+    """Cancel every unfinished job of a session."""
+    return {"session": session, "cancelled": job_queue.cancel_session(session)}
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, wait: bool = False):
+    """Return the GLB produced by a finished job, optionally waiting for it."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if wait and job.status in ("queued", "running"):
+        return await wait_for_glb(job)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Error processing request: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return glb_response(job.result)
+
+# Additional file endpoints
+@app.get("/artifacts/{request_id}")
+async def get_artifacts(request_id: str):
+    """Report which additional files of a request have been rendered."""
+    task = background_renderer.get(request_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="No additional files scheduled for this request")
+    return task.to_dict()
+
+@app.get("/artifacts/{request_id}/{name}")
+async def get_artifact(request_id: str, name: str):
+    """Return one rendered additional file."""
+    task = background_renderer.get(request_id)
+    if task is None or name not in [artifact for artifact, _ in task.steps]:
+        raise HTTPException(status_code=404, detail="Unknown artifact")
+    if name not in task.completed:
+        raise HTTPException(status_code=409, detail=f"Artifact is not ready (render {task.status})")
+    return FileResponse(path=OUTPUT_DIR / request_id / name, filename=name)
+
+# LOD level endpoint
+@app.get("/lods/{cache_key}/{level}")
+async def get_lod(cache_key: str, level: int):
+    """Return a coarser LOD level of a generated GLB."""
+    if not re.fullmatch(r"[0-9a-f]{64}", cache_key) or level < 1:
+        raise HTTPException(status_code=404, detail="Unknown LOD level")
+    key = lod_cache_key(cache_key, level)
+    pending = pending_lods.get(cache_key)
+    if pending is not None and key not in glb_cache:
+        # Advertised with the model, but still being exported
+        await asyncio.wrap_future(pending)
+    path = glb_cache.get(key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown LOD level")
+    return FileResponse(path=path, filename=f"model.lod{level}.glb", media_type="model/gltf-binary")
+
+# Health check endpoints
+def readiness():
+    """Startup report; in worker-pool mode ready as soon as one worker has warmed up."""
+    if worker_pool is None:
+        return startup.to_dict()
+    workers = worker_pool.stats()["workers"]
+    return {
+        "ready": any(worker["ready"] and worker["alive"] and (worker["status"] or {}).get("ready", True) for worker in workers),
+        "uptime": time.time() - startup.started_at,
+        "workers": [{key: worker[key] for key in ("device", "alive", "ready", "status")} for worker in workers],
+    }
+
+@app.get("/livez")
+async def liveness():
+    """The process is up and serving requests, whether or not models are loaded."""
+    return {"status": "alive", "uptime": time.time() - startup.started_at}
+
+@app.get("/readyz")
+async def readiness_check():
+    """Whether preloaded pipelines are loaded and warmed up, with per-phase load times."""
+    report = readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
 
-# Health check endpoint
 @app.get("/health")
 async def health_check():
     """Check if the service is healthy."""
     return {
         "status": "healthy",
+        "ready": readiness()["ready"],
         "text_pipeline_loaded": text_pipeline is not None,
-        "image_pipeline_loaded": image_pipeline is not None
+        "image_pipeline_loaded": image_pipeline is not None,
+        "queue_depth": job_queue.depth(),
+        "workers": worker_pool.stats()["workers"] if worker_pool is not None else None,
     }
 
+# Cache statistics endpoint
+@app.get("/cache/stats")
+async def cache_stats():
+    """Report GLB cache hits, misses and usage."""
+    return glb_cache.stats()
+
 # Run the server
 if __name__ == "__main__":
     import argparse
@@ -225,14 +783,52 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the Trellis API server")
     parser.add_argument("--host", default="localhost", help="Host to bind to")
     parser.add_argument("--port", type=int, default=8000, help="Port to bind to")
-    parser.add_argument("--preload-models", action="store_true", help="Preload models at startup")
+    parser.add_argument("--preload-models", action="store_true", help="Load and warm up both pipelines at startup (TRELLIS_PRELOAD=text,image)")
+    parser.add_argument("--warmup-steps", type=int, default=None, help="Sampler steps of the warm-up generation (0 skips warm-up)")
+    parser.add_argument("--cache-size-mb", type=int, default=None, help="Maximum size of the GLB cache in MB")
+    parser.add_argument("--batch-window-ms", type=float, default=None, help="How long to collect text prompts into a batch")
+    parser.add_argument("--max-batch-size", type=int, default=None, help="Maximum number of text prompts per batch")
+    parser.add_argument("--postprocess-workers", type=int, default=None, help="Number of GLB post-processing workers")
+    parser.add_argument("--postprocess-executor", choices=["process", "thread"], default=POSTPROCESS_EXECUTOR, help="Run post-processing in worker processes or threads")
+    parser.add_argument("--lod-levels", type=int, default=None, help="Number of LOD levels exported per model (1 = no coarser levels)")
+    parser.add_argument("--mesh-compression", choices=MESH_COMPRESSIONS, default=MESH_COMPRESSION, help="Geometry compression applied with gltf-transform")
+    parser.add_argument("--texture-compression", choices=TEXTURE_COMPRESSIONS, default=TEXTURE_COMPRESSION, help="Texture compression applied with gltf-transform")
+    parser.add_argument("--max-queued", type=int, default=None, help="Jobs each priority class may queue before requests get a 429 (0 = unbounded)")
+    parser.add_argument("--max-queued-per-session", type=int, default=None, help="Jobs each session may queue before its requests get a 429 (0 = unbounded)")
+    parser.add_argument("--worker-devices", default=None, help='Run one worker process per device, e.g. "cuda:0,cuda:1" or "cpu*2"')
+    parser.add_argument("--worker-concurrency", type=int, default=None, help="Jobs each worker process overlaps (sampling one while exporting another)")
     
     args = parser.parse_args()
     
-    # Optionally preload models
+    if args.batch_window_ms is not None:
+        text_batcher.window = args.batch_window_ms / 1000
+    if args.max_batch_size is not None:
+        text_batcher.max_batch_size = args.max_batch_size
+        generation_executor.stages[0].workers = args.max_batch_size
+    if args.postprocess_workers is not None:
+        generation_executor.stages[1].workers = args.postprocess_workers
+    POSTPROCESS_EXECUTOR = args.postprocess_executor
+    MESH_COMPRESSION = args.mesh_compression
+    TEXTURE_COMPRESSION = args.texture_compression
+    if args.lod_levels is not None:
+        LOD_LEVELS = args.lod_levels
+    if args.max_queued is not None:
+        job_queue.max_queued = args.max_queued or None
+    if args.max_queued_per_session is not None:
+        job_queue.max_queued_per_session = args.max_queued_per_session or None
+    if args.worker_devices is not None:
+        WORKER_DEVICES = parse_devices(args.worker_devices)
+    if args.worker_concurrency is not None:
+        WORKER_CONCURRENCY = args.worker_concurrency
+    
+    if args.cache_size_mb is not None:
+        glb_cache.max_bytes = args.cache_size_mb * 1024 * 1024
+    
+    # Models are loaded once the server is up, so liveness probes answer meanwhile
     if args.preload_models:
-        load_text_pipeline()
-        # load_image_pipeline()
+        PRELOAD_PIPELINES = ("text", "image")
+    if args.warmup_steps is not None:
+        WARMUP_STEPS = args.warmup_steps
     
     print(f"Starting Trellis API server on {args.host}:{args.port}")
     uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,149 @@
+"""CPU stand-ins for the Trellis pipelines, for exercising the server without a GPU."""
+
+import json
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Sampler steps used when a request doesn't override them
+DEFAULT_STEPS = 25
+
+
+class StubSample:
+    """Placeholder for one generated gaussian, mesh or radiance field."""
+
+    def __init__(self, kind: str, prompt: str, seed: int):
+        self.kind = kind
+        self.prompt = prompt
+        self.seed = seed
+
+    def __repr__(self):
+        return f"StubSample({self.kind!r}, {self.prompt!r}, seed={self.seed})"
+
+
+class StubTextPipeline:
+    """Mimics ``TrellisTextTo3DPipeline`` with configurable per-stage delays.
+
+    A call sleeps ``call_delay + sample_delay * samples`` plus, like the real
+    pipeline, a cost per sampler step of each stage and a fixed decode cost,
+    so fewer steps make a call proportionally cheaper. Every call is recorded
+    in ``batch_sizes`` and ``calls`` so batching behaviour can be checked.
+    """
+
+    def __init__(
+        self,
+        call_delay: float = 0.0,
+        sample_delay: float = 0.0,
+        sparse_structure_step_delay: float = 0.0,
+        slat_step_delay: float = 0.0,
+        decode_delay: float = 0.0,
+    ):
+        self.call_delay = call_delay
+        self.sample_delay = sample_delay
+        self.sparse_structure_step_delay = sparse_structure_step_delay
+        self.slat_step_delay = slat_step_delay
+        self.decode_delay = decode_delay
+        self.batch_sizes = []
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _outputs(
+        self,
+        prompts: List[str],
+        seed: int,
+        sparse_structure_sampler_params: Optional[dict] = None,
+        slat_sampler_params: Optional[dict] = None,
+    ) -> dict:
+        sparse_steps = (sparse_structure_sampler_params or {}).get("steps", DEFAULT_STEPS)
+        slat_steps = (slat_sampler_params or {}).get("steps", DEFAULT_STEPS)
+        with self._lock:
+            self.batch_sizes.append(len(prompts))
+            self.calls.append({"batch_size": len(prompts), "sparse_structure_steps": sparse_steps, "slat_steps": slat_steps})
+        time.sleep(
+            self.call_delay
+            + self.sample_delay * len(prompts)
+            + self.sparse_structure_step_delay * sparse_steps
+            + self.slat_step_delay * slat_steps
+            + self.decode_delay
+        )
+        return {
+            kind: [StubSample(kind, prompt, seed) for prompt in prompts]
+            for kind in ("gaussian", "mesh", "radiance_field")
+        }
+
+    def run(self, prompt: str, seed: int = 42, sparse_structure_sampler_params=None, slat_sampler_params=None, **kwargs) -> dict:
+        return self._outputs([prompt], seed, sparse_structure_sampler_params, slat_sampler_params)
+
+    def run_batch(self, prompts: List[str], seed: int = 42, sparse_structure_sampler_params=None, slat_sampler_params=None) -> dict:
+        return self._outputs(list(prompts), seed, sparse_structure_sampler_params, slat_sampler_params)
+
+    def cuda(self):
+        return self
+
+
+class StubImagePipeline(StubTextPipeline):
+    """Mimics ``TrellisImageTo3DPipeline``; the image is described by its size."""
+
+    def run(self, image, seed: int = 42, sparse_structure_sampler_params=None, slat_sampler_params=None, **kwargs) -> dict:
+        return self._outputs([f"image {getattr(image, 'size', '')}"], seed, sparse_structure_sampler_params, slat_sampler_params)
+
+
+def parse_delays(spec: str) -> Dict[str, float]:
+    """Parse ``"name=seconds,..."`` (e.g. ``"slat_step=0.05,export=1"``) into a dict."""
+    delays = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, value = part.partition("=")
+            delays[name.strip()] = float(value)
+    return delays
+
+
+def _box_glb(extras: dict) -> bytes:
+    """A minimal valid GLB containing a unit box."""
+    positions = [(x, y, z) for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (-0.5, 0.5)]
+    indices = [
+        0, 1, 3, 0, 3, 2,  4, 6, 7, 4, 7, 5,  0, 4, 5, 0, 5, 1,
+        2, 3, 7, 2, 7, 6,  0, 2, 6, 0, 6, 4,  1, 5, 7, 1, 7, 3,
+    ]
+    vertex_bytes = b"".join(struct.pack("<3f", *position) for position in positions)
+    index_bytes = struct.pack(f"<{len(indices)}H", *indices)
+    binary = vertex_bytes + index_bytes
+    gltf = {
+        "asset": {"version": "2.0", "generator": "trellis_stub", "extras": extras},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}, "indices": 1}]}],
+        "buffers": [{"byteLength": len(binary)}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": len(vertex_bytes), "target": 34962},
+            {"buffer": 0, "byteOffset": len(vertex_bytes), "byteLength": len(index_bytes), "target": 34963},
+        ],
+        "accessors": [
+            {"bufferView": 0, "componentType": 5126, "count": len(positions), "type": "VEC3", "min": [-0.5] * 3, "max": [0.5] * 3},
+            {"bufferView": 1, "componentType": 5123, "count": len(indices), "type": "SCALAR"},
+        ],
+    }
+    json_chunk = json.dumps(gltf).encode()
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    binary += b"\0" * (-len(binary) % 4)
+    length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return (
+        struct.pack("<4sII", b"glTF", 2, length)
+        + struct.pack("<I4s", len(json_chunk), b"JSON") + json_chunk
+        + struct.pack("<I4s", len(binary), b"BIN\0") + binary
+    )
+
+
+def export_stub_glb(gaussian, mesh, glb_path, simplify, texture_size, mesh_compression="none", texture_compression="none", delay=0.0):
+    """Stand-in for ``postprocess.export_glb``: writes a box GLB.
+
+    Texture baking dominates the real export, so ``delay`` is the cost at a
+    1024 px texture and scales with the texture area.
+    """
+    time.sleep(delay * (texture_size / 1024) ** 2)
+    extras = {"prompt": getattr(mesh, "prompt", None), "simplify": simplify, "texture_size": texture_size}
+    with open(glb_path, "wb") as f:
+        f.write(_box_glb(extras))
+    return glb_path
@@ -0,0 +1,181 @@
+"""Trellis pipeline loading and the generation handler run by worker processes."""
+
+import functools
+import io
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from batching import run_text_batch
+from postprocess import export_glb, lod_paths
+from startup import Startup
+from trellis_stub import StubImagePipeline, StubTextPipeline, export_stub_glb
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_MODELS = {
+    "text": "JeffreyXiang/TRELLIS-text-xlarge",
+    "image": "JeffreyXiang/TRELLIS-image-large",
+}
+
+# Warm-up generations use a handful of sampler steps and a small texture
+WARMUP_PROMPT = "a wooden cube"
+WARMUP_SIMPLIFY = 0.99
+WARMUP_TEXTURE_SIZE = 256
+
+
+def load_pipeline(kind: str, stub_delays: Optional[dict] = None):
+    """Load the text or image pipeline onto the current CUDA device.
+
+    With ``stub_delays`` (a dict from ``trellis_stub.parse_delays``, possibly
+    empty) a CPU stand-in is returned instead and TRELLIS isn't imported.
+    """
+    if stub_delays is not None:
+        cls = StubTextPipeline if kind == "text" else StubImagePipeline
+        return cls(
+            sparse_structure_step_delay=stub_delays.get("sparse_structure_step", 0.0),
+            slat_step_delay=stub_delays.get("slat_step", 0.0),
+            decode_delay=stub_delays.get("decode", 0.0),
+        )
+    if kind == "text":
+        from third_party.TRELLIS.trellis.pipelines import TrellisTextTo3DPipeline as Pipeline
+    else:
+        from third_party.TRELLIS.trellis.pipelines import TrellisImageTo3DPipeline as Pipeline
+    pipeline = Pipeline.from_pretrained(PIPELINE_MODELS[kind])
+    pipeline.cuda()
+    return pipeline
+
+
+def make_exporter(stub_delays: Optional[dict] = None):
+    """``postprocess.export_glb``, or with ``stub_delays`` the stub export at their "export" cost.
+
+    Both are module-level functions, so the exporter can be sent to worker processes.
+    """
+    if stub_delays is None:
+        return export_glb
+    return functools.partial(export_stub_glb, delay=stub_delays.get("export", 0.0))
+
+
+def warm_up(kind: str, pipeline, steps: int = 2) -> dict:
+    """Run a tiny generation so kernels are compiled and allocator caches are filled.
+
+    Returns the outputs, which callers also export to warm up post-processing.
+    """
+    sampler_params = {"steps": steps}
+    if kind == "text":
+        source = WARMUP_PROMPT
+    else:
+        from PIL import Image
+
+        source = Image.new("RGB", (512, 512), "white")
+    return pipeline.run(source, seed=0, sparse_structure_sampler_params=sampler_params, slat_sampler_params=sampler_params)
+
+
+class GenerationWorker:
+    """Generates GLBs in a worker process that owns its own pipelines.
+
+    Created once per process by ``worker_pool.WorkerPool``. A task is
+    ``{"kind": "text" | "image", "items": [params, ...]}`` where each
+    item's params are a job's, plus the ``output_path`` to export to; text
+    items are sampled as one batch. Sampling is serialized on the device,
+    while exports run on ``export_workers`` threads, so one task's export
+    overlaps with the next task's sampling. Returns one ``{"glb_path"}``
+    per item; coarser LOD levels are derived from it by the server.
+
+    The ``preload`` pipelines are loaded concurrently and, unless
+    ``warmup_steps`` is 0, warmed up before the worker takes any task.
+    ``exporter`` defaults to ``make_exporter(stub_delays)``.
+    """
+
+    def __init__(
+        self,
+        device: str,
+        stub_delays: Optional[dict] = None,
+        exporter=None,
+        mesh_compression: str = "none",
+        texture_compression: str = "none",
+        export_workers: int = 2,
+        preload: tuple = (),
+        warmup_steps: int = 2,
+    ):
+        self.device = device
+        self.stub_delays = stub_delays
+        self.exporter = exporter or make_exporter(stub_delays)
+        self.mesh_compression = mesh_compression
+        self.texture_compression = texture_compression
+        self.pipelines = {}
+        self.gpu_lock = threading.Lock()
+        self._load_locks = {kind: threading.Lock() for kind in PIPELINE_MODELS}
+        self.export_pool = ThreadPoolExecutor(max_workers=export_workers, thread_name_prefix="export")
+        self.startup = Startup()
+        for kind in preload:
+            phases = [("load", functools.partial(self.pipeline, kind))]
+            if warmup_steps:
+                phases.append(("warmup", functools.partial(self.warm_up, kind, warmup_steps)))
+            self.startup.add(kind, phases)
+        self.startup.start()
+        self.startup.wait()
+
+    def status(self) -> dict:
+        """Startup report sent to the pool once the worker is up."""
+        return self.startup.to_dict()
+
+    def pipeline(self, kind: str):
+        with self._load_locks[kind]:
+            if kind not in self.pipelines:
+                logger.info(f"Loading {kind}-to-3D pipeline on {self.device}...")
+                self.pipelines[kind] = load_pipeline(kind, self.stub_delays)
+            return self.pipelines[kind]
+
+    def warm_up(self, kind: str, steps: int):
+        pipeline = self.pipeline(kind)
+        with self.gpu_lock:
+            outputs = warm_up(kind, pipeline, steps)
+        with tempfile.TemporaryDirectory() as tmp:
+            self.export_pool.submit(
+                self.exporter,
+                outputs["gaussian"][0],
+                outputs["mesh"][0],
+                Path(tmp) / "warmup.glb",
+                WARMUP_SIMPLIFY,
+                WARMUP_TEXTURE_SIZE,
+                self.mesh_compression,
+                self.texture_compression,
+            ).result()
+
+    def __call__(self, task: dict) -> List[dict]:
+        kind = task["kind"]
+        items = task["items"]
+        pipeline = self.pipeline(kind)
+        with self.gpu_lock:
+            if kind == "text":
+                first = items[0]
+                outputs = run_text_batch(pipeline, [item["prompt"] for item in items], first["seed"], first["steps"])
+            else:
+                from PIL import Image
+
+                outputs = [
+                    pipeline.run(Image.open(io.BytesIO(item["image_bytes"])), seed=item["seed"])
+                    for item in items
+                ]
+        return [self.export(item, output) for item, output in zip(items, outputs)]
+
+    def export(self, params: dict, outputs: dict) -> dict:
+        """Export the full-detail GLB of one model."""
+        output_path = Path(params["output_path"])
+        output_path.mkdir(parents=True, exist_ok=True)
+        path = lod_paths(output_path, 1)[0]
+        self.export_pool.submit(
+            self.exporter,
+            outputs["gaussian"][0],
+            outputs["mesh"][0],
+            path,
+            params["simplify"],
+            params["texture_size"],
+            self.mesh_compression,
+            self.texture_compression,
+        ).result()
+        return {"glb_path": str(path)}
@@ -0,0 +1,135 @@
+"""Sentence-chunked text-to-speech with an on-disk audio cache."""
+
+import hashlib
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from disk_cache import DiskLRUCache
+
+DEFAULT_VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"
+DEFAULT_MODEL_ID = "eleven_multilingual_v2"
+DEFAULT_OUTPUT_FORMAT = "mp3_44100_128"
+
+# A sentence ends at ., ! or ? followed by whitespace, or at a line break
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences for chunked synthesis."""
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+class ElevenLabsBackend:
+    """Synthesizes speech with the ElevenLabs API."""
+
+    def __init__(
+        self,
+        client,
+        voice_id: str = DEFAULT_VOICE_ID,
+        model_id: str = DEFAULT_MODEL_ID,
+        output_format: str = DEFAULT_OUTPUT_FORMAT,
+    ):
+        self.client = client
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.output_format = output_format
+
+    def synthesize(self, text: str) -> bytes:
+        audio = self.client.text_to_speech.convert(
+            text=text,
+            voice_id=self.voice_id,
+            model_id=self.model_id,
+            output_format=self.output_format,
+        )
+        return b"".join(audio)
+
+
+class FakeTTSBackend:
+    """Offline backend that returns the text itself as "audio" after a delay."""
+
+    def __init__(self, delay: float = 0.0, voice_id: str = "fake", model_id: str = "fake", output_format: str = "raw"):
+        self.delay = delay
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.output_format = output_format
+        self.calls = []
+
+    def synthesize(self, text: str) -> bytes:
+        self.calls.append(text)
+        time.sleep(self.delay)
+        return text.encode()
+
+
+class TTSCache(DiskLRUCache):
+    """LRU cache of synthesized audio, one file per (text, voice, model, format)."""
+
+    suffix = ".audio"
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 1024 ** 2):
+        super().__init__(cache_dir, max_bytes)
+
+    @staticmethod
+    def key(text: str, voice_id: str, model_id: str, output_format: str) -> str:
+        payload = [text, voice_id, model_id, output_format]
+        return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._lookup(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+
+    def put(self, key: str, audio: bytes):
+        self._store(key, lambda tmp_path: tmp_path.write_bytes(audio))
+
+
+class SpeechSynthesizer:
+    """Speaks text sentence by sentence.
+
+    Later sentences are synthesized (up to ``lookahead`` at a time) while the
+    first one is already playing. ``play`` receives the audio of a whole
+    reply as one stream of per-sentence chunks (e.g. ``elevenlabs.stream``),
+    so sentences play back to back without restarting the player.
+    Synthesized audio goes through ``cache``, so repeated phrases are played
+    without another API call.
+    """
+
+    def __init__(self, backend, play: Callable[[Iterator[bytes]], None], cache: Optional[TTSCache] = None, lookahead: int = 2):
+        self.backend = backend
+        self.play = play
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=lookahead, thread_name_prefix="tts")
+
+    def synthesize(self, text: str) -> bytes:
+        """Return audio for ``text``, from the cache when possible."""
+        if self.cache is None:
+            return self.backend.synthesize(text)
+        key = TTSCache.key(text, self.backend.voice_id, self.backend.model_id, self.backend.output_format)
+        audio = self.cache.get(key)
+        if audio is None:
+            audio = self.backend.synthesize(text)
+            self.cache.put(key, audio)
+        return audio
+
+    def speak(self, text: str):
+        """Synthesize and play ``text``, starting as soon as the first sentence is ready."""
+        self.speak_sentences(split_sentences(text))
+
+    def speak_sentences(self, sentences: Iterable[str]):
+        futures = [self._pool.submit(self.synthesize, sentence) for sentence in sentences]
+        if futures:
+            self.play(future.result() for future in futures)
+
+    def prewarm(self, phrases: Iterable[str]):
+        """Synthesize common phrases ahead of time so they play instantly."""
+        for phrase in phrases:
+            for sentence in split_sentences(phrase):
+                self.synthesize(sentence)
@@ -0,0 +1,446 @@
+"""Event-driven voice turn pipeline: transcript -> LLM reply -> speech + generation."""
+
+import asyncio
+import logging
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# "Let's create <description>" up to the end of the sentence
+CREATE_PATTERN = re.compile(r"let['’]?s create\s+(.+?)(?:[.!?](?:\s|$)|\n|$)", re.IGNORECASE | re.DOTALL)
+
+# Same, but only once the sentence has visibly ended. A terminator must be
+# followed by whitespace so "3.5 meters" isn't cut at the decimal point.
+COMPLETE_CREATE_PATTERN = re.compile(r"let['’]?s create\s+(.+?)(?:[.!?](?=\s)|\n)", re.IGNORECASE | re.DOTALL)
+
+
+# Most objects one reply may ask for
+MAX_OBJECTS_PER_REPLY = 8
+
+# "three small houses with red roofs": a count, then the description
+COUNT_WORDS = {"two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+COUNT_PATTERN = re.compile(r"^(\d+|" + "|".join(COUNT_WORDS) + r")\s+(.+)$", re.IGNORECASE | re.DOTALL)
+# Where the head noun of a description ends ("houses| with red roofs")
+QUALIFIER_PATTERN = re.compile(r"\s+(?:with|of|made|in|on|for|that)\s", re.IGNORECASE)
+
+
+def normalize_transcript(text: str) -> str:
+    """Lowercase words only, so a partial transcript can be compared with the punctuated final one."""
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+def _clean_prompt(text: str) -> Optional[str]:
+    prompt = text.strip().rstrip(".!?").strip()
+    return prompt or None
+
+
+def extract_object_prompt(text: str) -> Optional[str]:
+    """Return the object description following "Let's create", if the reply has one."""
+    match = CREATE_PATTERN.search(text)
+    return _clean_prompt(match.group(1)) if match else None
+
+
+# Plurals the suffix rules below get wrong
+IRREGULAR_PLURALS = {
+    "buses": "bus", "gases": "gas", "lenses": "lens", "atlases": "atlas", "canvases": "canvas",
+    "cactuses": "cactus", "octopuses": "octopus", "walruses": "walrus", "circuses": "circus", "irises": "iris",
+    "wolves": "wolf", "leaves": "leaf", "loaves": "loaf", "shelves": "shelf", "halves": "half", "elves": "elf",
+    "calves": "calf", "scarves": "scarf", "dwarves": "dwarf", "hooves": "hoof", "thieves": "thief",
+    "knives": "knife", "wives": "wife", "lives": "life",
+    "mice": "mouse", "geese": "goose", "teeth": "tooth", "feet": "foot", "children": "child",
+    "people": "person", "men": "man", "women": "woman", "oxen": "ox", "cacti": "cactus", "fungi": "fungus",
+}
+# Words ending in "oes" that only add an "s"
+OES_PLURALS = ("shoes", "canoes", "oboes")
+
+
+def _singular(word: str) -> str:
+    lower = word.lower()
+    if lower in IRREGULAR_PLURALS:
+        singular = IRREGULAR_PLURALS[lower]
+        return singular.capitalize() if word[0].isupper() else singular
+    # Already singular: "cactus", "iris", "glass"
+    if lower.endswith(("us", "is", "ss")):
+        return word
+    if lower.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if lower.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if lower.endswith("oes") and not lower.endswith(OES_PLURALS):
+        return word[:-2]
+    if lower.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def expand_count(prompt: str) -> List[str]:
+    """One description per object: "three small houses" becomes three "a small house".
+
+    The head noun is made singular with simple English rules plus a list of
+    irregular plurals, which covers the usual object names; descriptions
+    without a leading count are returned as they are.
+    """
+    match = COUNT_PATTERN.match(prompt)
+    if not match:
+        return [prompt]
+    count = match.group(1).lower()
+    count = int(count) if count.isdigit() else COUNT_WORDS[count]
+    description = match.group(2)
+    qualifier = QUALIFIER_PATTERN.search(description)
+    head, rest = (description[:qualifier.start()], description[qualifier.start():]) if qualifier else (description, "")
+    words = head.split()
+    words[-1] = _singular(words[-1])
+    description = " ".join(words) + rest
+    article = "an" if description[0].lower() in "aeiou" else "a"
+    return [f"{article} {description}"] * min(count, MAX_OBJECTS_PER_REPLY)
+
+
+class PromptStreamParser:
+    """Finds the "Let's create" descriptions in a reply as it streams in.
+
+    A reply may ask for several objects, one "Let's create" sentence each,
+    optionally starting with a count ("Let's create three small houses.
+    Let's create a stone well."). ``feed`` returns the new descriptions,
+    one per object, as soon as their sentence is complete; ``finish``
+    handles a reply that ends mid-sentence. At most
+    ``MAX_OBJECTS_PER_REPLY`` descriptions are returned per reply.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.prompts = []
+        # End of the last sentence already parsed
+        self._position = 0
+
+    def feed(self, delta: str) -> List[str]:
+        self.text += delta
+        prompts = []
+        for match in COMPLETE_CREATE_PATTERN.finditer(self.text, self._position):
+            self._position = match.end()
+            prompts.extend(self._add(match.group(1)))
+        return prompts
+
+    def finish(self) -> List[str]:
+        match = CREATE_PATTERN.search(self.text, self._position)
+        self._position = len(self.text)
+        return self._add(match.group(1)) if match else []
+
+    def _add(self, text: str) -> List[str]:
+        prompt = _clean_prompt(text)
+        if prompt is None:
+            return []
+        prompts = expand_count(prompt)[:MAX_OBJECTS_PER_REPLY - len(self.prompts)]
+        self.prompts.extend(prompts)
+        return prompts
+
+
+@dataclass
+class Turn:
+    """One user utterance and everything the assistant does in response."""
+
+    transcript: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    speech_ended_at: float = field(default_factory=time.monotonic)
+    response: Optional[str] = None
+    prompts: List[str] = field(default_factory=list)
+    responded_at: Optional[float] = None
+    generation_requested_at: Optional[float] = None
+    # Set when the turn was answered speculatively from a partial transcript
+    speculation: Optional["Speculation"] = field(default=None, repr=False)
+
+    def latencies(self) -> dict:
+        """Seconds from the end of speech to each later milestone.
+
+        Negative when a speculative turn got there before the final transcript.
+        """
+        result = {}
+        if self.responded_at is not None:
+            result["response"] = self.responded_at - self.speech_ended_at
+        if self.generation_requested_at is not None:
+            result["generation_request"] = self.generation_requested_at - self.speech_ended_at
+        return result
+
+
+class Speculation:
+    """A reply started from a stable partial transcript, before the final one arrived.
+
+    Generations it requests only change the world once ``committed`` is set;
+    an aborted speculation stops streaming its reply and its generations
+    are cancelled.
+    """
+
+    def __init__(self, turn: Turn):
+        self.turn = turn
+        self.key = normalize_transcript(turn.transcript)
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.committed = asyncio.Event()
+        self.aborted = False
+        self.task = None
+        self.generations = []
+
+
+class VoicePipeline:
+    """Runs voice turns as asyncio stages connected by queues.
+
+    ``respond``, ``speak``, ``listen`` and ``mute`` are blocking callables and
+    run in worker threads; ``generate(prompt, group, variant)`` is a coroutine
+    and is started as its own task for every object, so speech and the
+    generation of all objects of a reply overlap. ``group`` is the turn id,
+    shared by the objects of one reply, and ``variant`` counts the identical
+    prompts requested before in the same turn (so copies can differ).
+    ``respond`` may return the reply as a stream of text deltas, in which
+    case each generation starts as soon as its "Let's create" sentence is
+    complete, before the rest of the reply arrives. ``respond`` must not
+    change the conversation history; ``record(turn)`` is called on the
+    loop once a turn's reply is final (and for the greeting). Final and
+    partial transcripts may be submitted from any thread with
+    ``submit_transcript`` and ``submit_partial``.
+
+    With ``speculate`` set, a partial transcript that hasn't changed for
+    ``stable_delay`` seconds is answered right away, and the objects in the
+    reply start generating; ``generate`` is then passed a ``committed``
+    event that it must wait for before changing the world. If the final
+    transcript says the same, the speculative reply is used as the turn's
+    reply and the event is set; otherwise the speculation is aborted and
+    the turn is answered as usual. ``speculation_stats`` reports hits,
+    misses and the work wasted on misses.
+    """
+
+    def __init__(
+        self,
+        respond: Callable[[str], Union[str, Iterable[str]]],
+        speak: Callable[[str], None],
+        generate: Callable[..., Awaitable],
+        listen: Callable[[], object],
+        mute: Callable[[], object],
+        record: Optional[Callable[[Turn], None]] = None,
+        speculate: bool = False,
+        stable_delay: float = 0.3,
+        min_speculation_words: int = 2,
+    ):
+        self.respond = respond
+        self.speak = speak
+        self.generate = generate
+        self.listen = listen
+        self.mute = mute
+        self.record = record
+        self.speculate = speculate
+        self.stable_delay = stable_delay
+        self.min_speculation_words = min_speculation_words
+        self.loop = None
+        self.listening = False
+        self.transcripts = asyncio.Queue()
+        self.replies = asyncio.Queue()
+        self.generations = asyncio.Queue()
+        self.completed_turns = []
+        self._tasks = set()
+        self._speculation = None
+        self._stable_timer = None
+        self._stable_key = None
+        self.speculations = 0
+        self.speculation_hits = 0
+        self.speculation_misses = 0
+        self.wasted_generations = 0
+        # Trellis jobs of aborted speculations; counted by ``generate``
+        self.wasted_jobs = 0
+        self.wasted_response_time = 0.0
+        self.speculation_lead_time = 0.0
+
+    def submit_transcript(self, text: str):
+        """Hand a final transcript to the pipeline. Safe to call from any thread."""
+        turn = Turn(text)
+        self.loop.call_soon_threadsafe(self._accept_transcript, turn)
+
+    def submit_partial(self, text: str):
+        """Hand a partial transcript to the pipeline for speculation. Safe to call from any thread."""
+        if self.speculate and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._accept_partial, text)
+
+    def speculation_stats(self) -> dict:
+        """Hits and misses of speculative replies, the head start of hits and the work wasted on misses."""
+        decided = self.speculation_hits + self.speculation_misses
+        return {
+            "speculations": self.speculations,
+            "hits": self.speculation_hits,
+            "misses": self.speculation_misses,
+            "hit_rate": self.speculation_hits / decided if decided else 0.0,
+            "wasted_generations": self.wasted_generations,
+            "wasted_jobs": self.wasted_jobs,
+            "wasted_response_time": self.wasted_response_time,
+            "mean_lead_time": self.speculation_lead_time / self.speculation_hits if self.speculation_hits else 0.0,
+        }
+
+    def _accept_transcript(self, turn: Turn):
+        # Ignore anything transcribed after the turn was taken
+        if not self.listening:
+            logger.info(f"Dropping transcript received while not listening: {turn.transcript}")
+            return
+        self.listening = False
+        self._cancel_stable_timer()
+        speculation, self._speculation = self._speculation, None
+        if speculation is not None:
+            if speculation.key == normalize_transcript(turn.transcript):
+                turn = self._commit_speculation(speculation, turn)
+            else:
+                self._abort_speculation(speculation)
+            logger.info(f"Speculation: {self.speculation_stats()}")
+        self.transcripts.put_nowait(turn)
+
+    def _accept_partial(self, text: str):
+        if not self.listening:
+            return
+        key = normalize_transcript(text)
+        if self._speculation is not None:
+            if self._speculation.key == key:
+                return
+            # The user kept talking, so the speculative reply is stale
+            self._abort_speculation(self._speculation)
+            self._speculation = None
+        if key == self._stable_key:
+            return
+        self._cancel_stable_timer()
+        if len(key.split()) >= self.min_speculation_words:
+            self._stable_key = key
+            self._stable_timer = self.loop.call_later(self.stable_delay, self._start_speculation, text)
+
+    def _cancel_stable_timer(self):
+        if self._stable_timer is not None:
+            self._stable_timer.cancel()
+        self._stable_timer = None
+        self._stable_key = None
+
+    def _start_speculation(self, text: str):
+        self._stable_timer = None
+        self._stable_key = None
+        if not self.listening:
+            return
+        speculation = Speculation(Turn(text))
+        speculation.task = asyncio.ensure_future(asyncio.to_thread(self._stream_response, speculation.turn, speculation))
+        self._speculation = speculation
+        self.speculations += 1
+        logger.info(f"Speculating on partial transcript: {text}")
+
+    def _commit_speculation(self, speculation: Speculation, final: Turn) -> Turn:
+        # The final transcript says what was speculated on: keep the reply and its objects
+        turn = speculation.turn
+        turn.transcript = final.transcript
+        turn.speech_ended_at = final.speech_ended_at
+        turn.speculation = speculation
+        speculation.committed.set()
+        self.speculation_hits += 1
+        self.speculation_lead_time += final.speech_ended_at - speculation.started_at
+        return turn
+
+    def _abort_speculation(self, speculation: Speculation):
+        speculation.aborted = True
+        for task in speculation.generations:
+            task.cancel()
+        self.speculation_misses += 1
+        self.wasted_generations += len(speculation.generations)
+
+        def count_wasted(_):
+            self.wasted_response_time += (speculation.finished_at or time.monotonic()) - speculation.started_at
+
+        speculation.task.add_done_callback(count_wasted)
+
+    async def run(self, greeting: Optional[str] = None):
+        """Run the pipeline forever, optionally speaking a greeting first."""
+        self.loop = asyncio.get_running_loop()
+        stages = [
+            asyncio.create_task(self._respond_stage()),
+            asyncio.create_task(self._speech_stage()),
+            asyncio.create_task(self._generation_stage()),
+        ]
+        if greeting:
+            turn = Turn(transcript="", response=greeting)
+            if self.record is not None:
+                self.record(turn)
+            self.replies.put_nowait(turn)
+        else:
+            await self._resume_listening()
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for task in stages:
+                task.cancel()
+
+    async def _resume_listening(self):
+        self.listening = True
+        await asyncio.to_thread(self.listen)
+
+    async def _respond_stage(self):
+        while True:
+            turn = await self.transcripts.get()
+            await asyncio.to_thread(self.mute)
+            try:
+                if turn.speculation is not None:
+                    turn.response = await turn.speculation.task
+                else:
+                    turn.response = await asyncio.to_thread(self._stream_response, turn)
+            except Exception as e:
+                logger.error(f"Failed to get a response for turn {turn.id}: {e}")
+                await self._resume_listening()
+                continue
+            turn.responded_at = turn.speculation.finished_at if turn.speculation is not None else time.monotonic()
+            if self.record is not None:
+                self.record(turn)
+            self.replies.put_nowait(turn)
+            logger.info(f"Turn {turn.id} latencies: {turn.latencies()}")
+            self.completed_turns = (self.completed_turns + [turn])[-100:]
+
+    def _stream_response(self, turn: Turn, speculation: Optional[Speculation] = None) -> str:
+        # Runs in a worker thread; hands the prompts to the loop as soon as they are known
+        deltas = self.respond(turn.transcript)
+        if isinstance(deltas, str):
+            deltas = [deltas]
+        parser = PromptStreamParser()
+        for delta in deltas:
+            if speculation is not None and speculation.aborted:
+                # Stop paying for a reply nobody will hear
+                if hasattr(deltas, "close"):
+                    deltas.close()
+                break
+            for prompt in parser.feed(delta):
+                self.loop.call_soon_threadsafe(self._request_generation, turn, prompt, speculation)
+        else:
+            for prompt in parser.finish():
+                self.loop.call_soon_threadsafe(self._request_generation, turn, prompt, speculation)
+        if speculation is not None:
+            speculation.finished_at = time.monotonic()
+        return parser.text
+
+    def _request_generation(self, turn: Turn, prompt: str, speculation: Optional[Speculation] = None):
+        if speculation is not None and speculation.aborted:
+            return
+        variant = turn.prompts.count(prompt)
+        turn.prompts.append(prompt)
+        if turn.generation_requested_at is None:
+            turn.generation_requested_at = time.monotonic()
+        self.generations.put_nowait((turn, prompt, variant, speculation))
+
+    async def _speech_stage(self):
+        while True:
+            turn = await self.replies.get()
+            try:
+                await asyncio.to_thread(self.speak, turn.response)
+            except Exception as e:
+                logger.error(f"Failed to speak turn {turn.id}: {e}")
+            await self._resume_listening()
+
+    async def _generation_stage(self):
+        while True:
+            turn, prompt, variant, speculation = await self.generations.get()
+            if speculation is None:
+                task = asyncio.create_task(self.generate(prompt, turn.id, variant))
+            elif speculation.aborted:
+                continue
+            else:
+                task = asyncio.create_task(self.generate(prompt, turn.id, variant, committed=speculation.committed))
+                speculation.generations.append(task)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
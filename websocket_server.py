@@ -1,18 +1,25 @@
 #!/usr/bin/env python
 import asyncio
 import websockets
-import json
-import random
 import time
 import logging
 import uuid
-import threading
 from elevenlabs import stream
 from elevenlabs.client import ElevenLabs
 from dotenv import load_dotenv
 import anthropic
 import os
 import assemblyai as aai
+from trellis_client import TrellisClient, TrellisError
+from asset_server import AssetStore, start_asset_server
+from bus import make_bus
+from prompt_index import PromptIndex, conflicting_attributes, similarity
+from rooms import RoomManager, new_object_id
+from router import DEFAULT_ROOM, RoomRouter, redirect, request_path, room_from_path
+from transcription import StubMicrophone, StubTranscriber, TranscriptionSession
+from tts import ElevenLabsBackend, SpeechSynthesizer, TTSCache
+from voice_pipeline import VoicePipeline
+from world_sync import QUANTUM, decode_message, supported_encodings
 load_dotenv()
 
 aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
@@ -21,213 +28,467 @@ elevenlabs_client = ElevenLabs(
     api_key=os.getenv("ELEVENLABS_API_KEY"),
 )
 
-model_response = None
-transcriber = None
+GREETING = "Hello! What do you want to explore today?"
+
+# Phrases synthesized at startup so they play without waiting on the API: the
+# greeting and short sentences replies often consist of. More can be given in
+# COMMON_PHRASES, separated by '|'.
+COMMON_PHRASES = [
+    GREETING,
+    "Sure!",
+    "Great idea!",
+    "Sounds good!",
+    "Coming right up!",
+    "What else would you like to add?",
+] + [phrase for phrase in os.getenv("COMMON_PHRASES", "").split("|") if phrase.strip()]
+
 full_transcript = [
-    {"role": "user", "content": "The user is walking around in a blank 3d virtual world. You are a helpful assistant that can create 3D objects in the world by synthesizing a text prompt and calling an API for the user. Your goal is to respond to the user's ideas and help them add objects to the world. Listen to the user's thoughts. Then, create a prompt for the API describing the new object to add to the world. When it's time to give the API prompt, say, 'Let's create a <insert description of an object>.' Note that the object description should be brief but descriptive, and it should describe a standalone object that can be dropped into a 3d world (i.e. don't describe the background or surroundings of the object). Make the description short and concise. Don't say anything before 'let's create' since we want the object description to come out fast."},
+    {"role": "user", "content": "The user is walking around in a blank 3d virtual world. You are a helpful assistant that can create 3D objects in the world by synthesizing a text prompt and calling an API for the user. Your goal is to respond to the user's ideas and help them add objects to the world. Listen to the user's thoughts. Then, create a prompt for the API describing the new object to add to the world. When it's time to give the API prompt, say, 'Let's create a <insert description of an object>.' Note that the object description should be brief but descriptive, and it should describe a standalone object that can be dropped into a 3d world (i.e. don't describe the background or surroundings of the object). Make the description short and concise. If the user wants several objects, say 'Let's create' once for each kind of object, in its own sentence, with how many of it first (e.g. 'Let's create three small wooden houses. Let's create a stone well.'). Don't say anything before 'let's create' since we want the object description to come out fast."},
 ]
 
 
-def on_error(error: aai.RealtimeError):
-    print("An error occurred:", error)
-    return  
-
-def on_close():
-    pass
-
-def on_open(session_opened: aai.RealtimeSessionOpened):
-    print("Session ID:", session_opened.session_id)
-    return
-
-def start_transcription():
-    global transcriber
-    print("inside start transcription")
-    def transcription_thread():
-        global transcriber
-        transcriber = aai.RealtimeTranscriber(
-            sample_rate=16000,
-            on_data=on_data,
-            on_error=on_error,
-            on_open=on_open,
-            on_close=on_close,
-            end_utterance_silence_threshold=1000
-        )
-        transcriber.connect()
-        microphone_stream = aai.extras.MicrophoneStream(sample_rate=16000)
-        print('calling stream')
-        transcriber.stream(microphone_stream)
-        print('called stream')
-    
-    # Start transcription in a separate thread
-    thread = threading.Thread(target=transcription_thread)
-    thread.daemon = True  # Make thread terminate when main program exits
-    thread.start()
-    return thread
-
-def stop_transcription():
-    global transcriber
-    if transcriber:
-        transcriber.close()
-        transcriber = None
+def on_partial(text: str):
+    print(text, end="\r")
+    voice_pipeline.submit_partial(text)
+
+def on_final(text: str):
+    voice_pipeline.submit_transcript(text)
 
 def generate_audio(text: str):
-    global elevenlabs_client
-    global full_transcript
-    full_transcript.append({"role": "assistant", "content": text})
     print(f"\nAI: {text}", end="\n")
-    audio_stream = elevenlabs_client.text_to_speech.convert(
-        text=text,
-        voice_id="JBFqnCBsd6RMkjVDRZzb",
-        model_id="eleven_multilingual_v2",
-        output_format="mp3_44100_128",
-    )
-    stream(audio_stream)
+    speech.speak(text)
 
-def on_data(transcript: aai.RealtimeTranscript):
-    if not transcript.text:
-        return
-    if isinstance(transcript, aai.RealtimeFinalTranscript):
-        generate_ai_response(transcript.text)
-    else:
-        print(transcript.text, end="\r")
+def record_turn(turn):
+    """Add a turn to the conversation once its reply is final (speculative replies may be dropped)"""
+    if turn.transcript:
+        full_transcript.append({"role": "user", "content": turn.transcript})
+        print(f"\nUser: {turn.transcript}", end="\n")
+    full_transcript.append({"role": "assistant", "content": turn.response})
 
 def generate_ai_response(transcript: str):
-    global model_response
-    print("calling stop transcription")
-    stop_transcription()
-    print('calling anthropic')
-    global full_transcript
-    full_transcript.append({"role": "user", "content": transcript})
-    print(f"\nUser: {transcript}", end="\n")
-    
-    # USE CLAUDE HERE INSTEAD
-    response = anthropic_client.messages.create(
+    # Stream the reply so the object prompt can be used before it finishes
+    with anthropic_client.messages.stream(
         model="claude-3-7-sonnet-20250219",
         max_tokens=1024,
-        messages=full_transcript
-    )
-    
-    # MAKE SURE THIS IS THE RIGHT RESPONSE
-    ai_response = response.content[0].text
-    model_response = ai_response
-    generate_audio(ai_response)
-    # start_transcription()
+        messages=full_transcript + [{"role": "user", "content": transcript}]
+    ) as response:
+        for text in response.text_stream:
+            yield text
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# List to store active WebSocket connections
-CONNECTIONS = set()
+# Rooms hosted by this process, each with its own world (persisted in
+# WORLD_DIR), clients and placement index. A client whose outbound queue fills
+# up has its backlog of world updates replaced by a snapshot
+# (SLOW_CLIENT_POLICY can also be "drop" or "disconnect").
+rooms = RoomManager(
+    os.getenv("WORLD_DIR", "world"),
+    snapshot_every=int(os.getenv("WORLD_SNAPSHOT_EVERY", 1000)),
+    max_queue=int(os.getenv("BROADCAST_QUEUE_SIZE", 256)),
+    policy=os.getenv("SLOW_CLIENT_POLICY", "coalesce"),
+    # New models are scaled so their largest dimension is OBJECT_SIZE
+    object_size=float(os.getenv("OBJECT_SIZE", 4.0)),
+    # Clients get a full snapshot every WORLD_RESYNC_EVERY changes and every
+    # WORLD_RESYNC_INTERVAL seconds
+    resync_every=int(os.getenv("WORLD_RESYNC_EVERY", 100)),
+    resync_interval=float(os.getenv("WORLD_RESYNC_INTERVAL", 60)),
+)
+
+# Rooms are sharded across the server processes listed in SHARDS
+# (comma-separated URLs, this one being SHARD_URL); a client connecting to the
+# wrong shard is redirected. Events between processes go over BUS ("memory"
+# or "unix:<socket path>" of a broker, see bus.py / router.py).
+SERVER_HOST = os.getenv("WS_HOST", "localhost")
+SERVER_PORT = int(os.getenv("WS_PORT", 8080))
+SHARD_URL = os.getenv("SHARD_URL", f"ws://{SERVER_HOST}:{SERVER_PORT}")
+router = RoomRouter(os.getenv("SHARDS", SHARD_URL).split(","))
+bus = make_bus(os.getenv("BUS", "memory"))
+
+# The microphone drives the conversation for this room, wherever it is hosted
+VOICE_ROOM = os.getenv("VOICE_ROOM", DEFAULT_ROOM)
+# Clients in VOICE_ROOM, as last announced by the shard hosting it
+voice_room_clients = 0
+# The voice loop (microphone, Claude, speech and generation) runs in one
+# process only: the shard hosting VOICE_ROOM, or VOICE_SHARD if set. The other
+# shards just relay its objects to their rooms.
+VOICE_SHARD = os.getenv("VOICE_SHARD") or router.shard_for(VOICE_ROOM)
+RUNS_VOICE = VOICE_SHARD == SHARD_URL
 
-# Store the latest positions received from clients
-WORLD_STATE = {}
+if RUNS_VOICE:
+    # Speech is synthesized sentence by sentence and cached on disk
+    speech = SpeechSynthesizer(
+        ElevenLabsBackend(elevenlabs_client),
+        play=stream,
+        cache=TTSCache(os.getenv("TTS_CACHE_DIR", "tts_cache")),
+    )
+
+    # One transcription session for the whole conversation; it is muted while the
+    # assistant responds instead of being torn down every turn. Set
+    # TRANSCRIBER=stub to replay STUB_TRANSCRIPTS (separated by '|') offline.
+    if os.getenv("TRANSCRIBER") == "stub":
+        stub_script = os.getenv("STUB_TRANSCRIPTS", "I want a big oak tree").split("|")
+        transcription = TranscriptionSession(
+            on_final=on_final,
+            on_partial=on_partial,
+            transcriber_factory=lambda **kwargs: StubTranscriber(script=stub_script, **kwargs),
+            microphone_factory=lambda sample_rate: StubMicrophone(sample_rate),
+        )
+    else:
+        transcription = TranscriptionSession(on_final=on_final, on_partial=on_partial)
+else:
+    speech = transcription = None
 
-async def register(websocket):
+# Shared client for the Trellis server; keeps its connections open between
+# objects. Its jobs are queued as one interactive session per voice room.
+trellis_client = TrellisClient(
+    host=os.getenv("TRELLIS_HOST", "localhost"),
+    port=int(os.getenv("TRELLIS_PORT", 8000)),
+    session_id=os.getenv("TRELLIS_SESSION", f"voice-{VOICE_ROOM}"),
+)
+
+# Objects appear as a cheap preview first and are refined in place
+PREVIEW_MODELS = os.getenv("PREVIEW_MODELS", "1") == "1"
+
+# Generated models are stored under their content hash and served with strong
+# ETags and immutable cache headers, so browsers download each one only once.
+# Only the process running the voice loop generates models, so only it serves
+# them, on ASSET_PORT; clients of every shard load them from ASSET_BASE_URL.
+assets = AssetStore(os.getenv("ASSET_DIR", "assets"))
+ASSET_HOST = os.getenv("ASSET_HOST", SERVER_HOST)
+ASSET_PORT = int(os.getenv("ASSET_PORT", 8090))
+ASSET_BASE_URL = os.getenv("ASSET_BASE_URL", f"http://{ASSET_HOST}:{ASSET_PORT}")
+
+# Prompts close to one generated before (cosine similarity of hashed n-grams
+# at least PROMPT_REUSE_THRESHOLD, and the same colour, number and size words)
+# reuse its model: "standin" places it while a fresh model generates and then
+# swaps that in, "reuse" places it and skips generation, "off" always generates
+PROMPT_REUSE = os.getenv("PROMPT_REUSE", "standin")
+prompt_index = PromptIndex(
+    os.path.join(assets.root, "prompts.db"),
+    threshold=float(os.getenv("PROMPT_REUSE_THRESHOLD", 0.8)),
+)
+
+# A new object prompt close to one still generating (at least
+# SUPERSEDE_THRESHOLD similar, with the same colour, number and size words)
+# means the user changed their mind: the closest older generation is
+# cancelled on the Trellis server and the new one takes over its object.
+# SUPERSEDE=all does that for the closest generation in flight however
+# similar it is, "off" never.
+SUPERSEDE = os.getenv("SUPERSEDE", "similar")
+SUPERSEDE_THRESHOLD = float(os.getenv("SUPERSEDE_THRESHOLD", 0.75))
+# Generations in flight by object id: {"prompt", "group", "task", "submit", "jobs", "placed"}
+generations = {}
+
+# A reply may ask for several objects; at most MAX_GENERATIONS of them are
+# generated at once, and each is placed as soon as it is ready, at a position
+# reserved up front next to the others from the same reply
+generation_slots = asyncio.Semaphore(int(os.getenv("MAX_GENERATIONS", 3)))
+
+async def register(websocket, room):
     """Register a new client connection"""
-    CONNECTIONS.add(websocket)
-    logger.info(f"Client connected. Total connections: {len(CONNECTIONS)}")
+    room.add(websocket)
+    logger.info(f"Client connected to room {room.id}. Connections in room: {len(room.connections)}")
+    await bus.publish("presence", {"room": room.id, "clients": len(room.connections)})
 
-async def unregister(websocket):
+async def unregister(websocket, room):
     """Unregister a client connection"""
-    CONNECTIONS.remove(websocket)
-    logger.info(f"Client disconnected. Total connections: {len(CONNECTIONS)}")
+    room.remove(websocket)
+    logger.info(f"Client disconnected from room {room.id}. Connections in room: {len(room.connections)}")
+    await bus.publish("presence", {"room": room.id, "clients": len(room.connections)})
 
-async def send_object(path="models/tree.glb", interval=5):
-    """Send objects to all connected clients at specified interval
+def on_room_command(message):
+    """Handle a command published for a room; only the shard hosting the room acts on it
     
     Args:
-        path (str): Path to the 3D model file
-        interval (int): Seconds between object placements
+        message (dict): {"room": ..., "type": "place-object" | "refine-object" | "reserve-position"
+                         | "release-position" | "world-events", ...}
     """
-    greeting = "Hello! What do you want to explore today?"
-    
-    generate_audio(greeting)
+    room_id = message.get("room")
+    if room_id is None or router.shard_for(room_id) != SHARD_URL:
+        return
+    room = rooms.get(room_id)
+    if message.get("type") == "place-object":
+        room.place_object(message["path"], message["prompt"], message.get("lods"), message.get("id"), message.get("bounds"))
+    elif message.get("type") == "refine-object":
+        room.refine_object(message["id"], message["path"], message.get("lods"), message.get("bounds"))
+    elif message.get("type") == "reserve-position":
+        room.reserve_position(message["id"], message.get("group"))
+    elif message.get("type") == "release-position":
+        room.release_position(message["id"])
+    elif message.get("type") == "world-events":
+        delta = room.apply_events(message.get("events", []))
+        if delta is not None:
+            room.broadcast(delta, coalesce_key="world")
+
+def on_presence(message):
+    """Track how many clients are in the voice room"""
+    global voice_room_clients
+    if message.get("room") == VOICE_ROOM:
+        voice_room_clients = message.get("clients", 0)
+
+async def log_broadcast_metrics(interval=60):
+    """Periodically log outbound queue depths and send latencies for each room"""
+    while True:
+        await asyncio.sleep(interval)
+        for room in rooms:
+            if not room.broadcaster:
+                continue
+            metrics = room.broadcaster.metrics()
+            worst = max(metrics["per_client"].values(), key=lambda m: m["max_send_latency"])
+            logger.info(
+                f"Room {room.id} broadcast: {metrics['clients']} clients, {metrics['queued']} queued, "
+                f"{metrics['dropped']} dropped, {metrics['coalesced']} coalesced, "
+                f"worst send latency {worst['max_send_latency'] * 1000:.1f} ms"
+            )
+
+async def resync_rooms(interval=5):
+    """Periodically send each room's clients a full snapshot (see Room.resync_if_due)"""
     while True:
-        if CONNECTIONS:  # Only send if there are connections
-            # First, request current positions from the client
-            breakpoint()
-            # await request_positions()
-            # await asyncio.sleep(1)  # Wait a moment for positions to come back
-            
-            # Create an object based on user
-            global model_response
-            model_response = None
-            
-            # Start transcription in a separate thread
-            print("starting transcription")
-            transcription_thread = start_transcription()
-            print("started transcription")
-            
-            # Wait for the model response with timeout
-            timeout = 60  # 60 seconds timeout
-            start_time = time.time()
-            
-            while model_response is None:
-                print("Waiting for model response...")
-                await asyncio.sleep(2)
-                
-                # # Check if we've timed out
-                # if time.time() - start_time > timeout:
-                #     print("Timeout waiting for model response")
-                #     stop_transcription()
-                #     break
-            
-            # print(f"Model response: {model_response}")
-            
-            prompt = model_response
-            prompt = prompt.replace("Let's create", '')
-            clean_prompt = prompt.lower().replace(' ', '_').replace('/', '_').replace(',', '_').replace('.', '_').replace('\'', '_').replace('\"', '_').replace('(', '_').replace(')', '_')
-            path = f"models/{clean_prompt}.glb"
-            command = f"python test_model_generation_client.py text '{prompt}' -o '{path}'"
-            print(f"Running command: {command}")
-            os.system(command)
-            model_response = None
-            
-            # Get object type from filename (without extension)
-            object_type = path.split('/')[-1].split('.')[0]
-            
-            # Create a message with positioning for the object
-            object_position = generate_object_position()
-            
-            object_message = {
-                "type": "load-object",
-                "id": f"{object_type}_{int(time.time())}_{random.randint(1000, 9999)}",  # Unique ID
-                "path": path,
-                "position": object_position,
-                "rotation": {
-                    "x": 0,
-                    "y": random.uniform(0, 6.28),  # Random rotation around Y axis (0 to 2π)
-                    "z": 0
-                },
-                "scale": {
-                    # "x": random.uniform(2.5, 7.5),
-                    # "y": random.uniform(2.5, 7.5),
-                    # "z": random.uniform(2.5, 7.5)
-                    "x": 4,
-                    "y": 4,
-                    "z": 4
-                }
-            }
-
-            # Convert to JSON string
-            message = json.dumps(object_message)
-            
-            # Send to all connected clients
-            for websocket in CONNECTIONS.copy():
-                try:
-                    await websocket.send(message)
-                    logger.info(f"Sent {object_type} at position: {object_message['position']}")
-                except websockets.exceptions.ConnectionClosed:
-                    # Connection might have closed between iterations
-                    await unregister(websocket)
-        
-        # Wait for the specified interval
         await asyncio.sleep(interval)
+        for room in rooms:
+            room.resync_if_due()
+
+async def send_object(path="models/tree.glb", interval=5):
+    """Run the voice loop, placing an object whenever the assistant says "Let's create"
+    
+    Args:
+        path (str): Unused; objects are generated from the conversation
+        interval (int): Seconds between checks for a connected client
+    """
+    # Wait for a browser in the voice room before talking to the user
+    while not voice_room_clients:
+        await asyncio.sleep(interval)
+    
+    await voice_pipeline.run(greeting=GREETING)
+
+async def store_model(lod_paths):
+    """Store downloaded LOD levels under their content hashes; a URL never changes content
+    
+    Storing a level also inspects it once into the asset index.
+    
+    Returns:
+        tuple: (path of the finest level, list of LOD levels or None if there is only one,
+                model-space bounds of the finest level or None if unknown)
+    """
+    family = await asyncio.to_thread(assets.put_family, lod_paths)
+    lods = []
+    for level in family:
+        entry = {"level": level["level"], "path": f"{ASSET_BASE_URL}/assets/{level['name']}", "bytes": level["bytes"]}
+        if level["info"] is not None:
+            entry["triangles"] = level["info"]["triangles"]
+        lods.append(entry)
+    info = family[0]["info"]
+    return lods[0]["path"], lods if len(lods) > 1 else None, info and info["bounds"]
+
+def download_path():
+    return os.path.join(assets.root, "incoming", f"{uuid.uuid4().hex}.glb")
+
+async def publish_object(message_type, object_id, prompt, model):
+    """Ask the shard hosting the voice room to place or refine an object
+    
+    Args:
+        message_type (str): "place-object" or "refine-object"
+        object_id (str): Id of the object in the world
+        prompt (str): Description the model was generated from
+        model (dict): {"path", "lods", "bounds"} of the model
+    """
+    await bus.publish("rooms", {
+        "room": VOICE_ROOM,
+        "type": message_type,
+        "id": object_id,
+        "prompt": prompt,
+        **model,
+    })
+
+async def supersede(prompt, group=None):
+    """Cancel the generation in flight that a new prompt replaces
+    
+    Only the closest one is replaced, as the new prompt takes over a single
+    object. Objects asked for in the same reply never replace each other.
+    
+    Args:
+        prompt (str): Description of the new object
+        group (str): Reply the new object was asked for in
+    
+    Returns:
+        tuple: (object id, whether it has been placed) of the replaced
+               generation, which the new one takes over, or None
+    """
+    if SUPERSEDE == "off" or not generations:
+        return None
+    candidates = [
+        (similarity(prompt, generation["prompt"]), object_id, generation)
+        for object_id, generation in generations.items()
+        if group is None or generation["group"] != group
+    ]
+    if SUPERSEDE == "similar":
+        # Related prompts are often wanted side by side, e.g. a red and a blue chair
+        candidates = [
+            item for item in candidates
+            if item[0] >= SUPERSEDE_THRESHOLD and not conflicting_attributes(prompt, item[2]["prompt"])
+        ]
+    if not candidates:
+        return None
+    score, object_id, generation = max(candidates, key=lambda item: item[0])
+    logger.info(f"'{prompt}' supersedes '{generation['prompt']}' ({score:.2f}), cancelling it")
+    del generations[object_id]
+    generation["task"].cancel()
+    return object_id, generation["placed"]
+
+async def claim_object(generation):
+    """Give a generation the object it places, once it may change the world
+    
+    That is the object of the generation it supersedes, or else a new
+    object with a reserved position.
+    
+    Args:
+        generation (dict): Entry for ``generations``; gets its "object_id" and "placed"
+    """
+    if generation["committed"] is not None:
+        await generation["committed"].wait()
+    prompt = generation["prompt"]
+    object_id = new_object_id(prompt)
+    placed = False
+    taken_over = await supersede(prompt, generation["group"])
+    if taken_over is not None:
+        object_id, placed = taken_over
+    else:
+        await bus.publish("rooms", {"room": VOICE_ROOM, "type": "reserve-position", "id": object_id, "group": generation["group"]})
+    generation.update(object_id=object_id, placed=placed)
+    generations[object_id] = generation
+
+async def cancel_jobs(generation):
+    """Cancel a generation's jobs on the Trellis server
+    
+    Jobs still being submitted are cancelled once the server has
+    accepted them. Jobs of an aborted speculation count as wasted work.
+    """
+    submit = generation["submit"]
+    if submit is not None and not generation["jobs"]:
+        try:
+            job = await asyncio.shield(submit)
+        except TrellisError:
+            job = {}
+        generation["jobs"] = [job_id for job_id in (job.get("job_id"), job.get("refine_job")) if job_id]
+    committed = generation["committed"]
+    if committed is not None and not committed.is_set():
+        voice_pipeline.wasted_jobs += len(generation["jobs"])
+    for job_id in generation["jobs"]:
+        try:
+            await trellis_client.cancel_job(job_id)
+        except TrellisError as e:
+            logger.warning(f"Failed to cancel job {job_id}: {e}")
+
+async def place_object(prompt, group=None, variant=0, committed=None):
+    """Generate a model for the prompt and add it to the voice room
+    
+    With PREVIEW_MODELS enabled, a cheap preview is placed first and replaced
+    by the full-quality model under the same object id once it is ready.
+    A model generated for a near-duplicate prompt is reused instead, or
+    placed as the stand-in, depending on PROMPT_REUSE. A generation this
+    prompt supersedes (see SUPERSEDE) is cancelled and its object is reused.
+    
+    Args:
+        prompt (str): Description of the object to generate
+        group (str): Reply the object was asked for in; its objects are laid out together
+        variant (int): Number of identical prompts asked for before in the same reply
+        committed (asyncio.Event): For a speculative generation, set once the
+            reply it belongs to is confirmed; until then the model is generated
+            but nothing is placed or superseded
+    """
+    generation = {
+        "prompt": prompt,
+        "group": group,
+        "object_id": None,
+        "task": asyncio.current_task(),
+        "submit": None,
+        "jobs": [],
+        "placed": False,
+        "committed": committed,
+    }
+    generation["claimed"] = asyncio.ensure_future(claim_object(generation))
+    try:
+        if committed is None:
+            await generation["claimed"]
+        async with generation_slots:
+            await generate_object(prompt, generation, variant)
+    except asyncio.CancelledError:
+        # Superseded, or its speculative reply was dropped
+        await cancel_jobs(generation)
+        raise
+    finally:
+        generation["claimed"].cancel()
+        # A superseded generation leaves its object to the one replacing it
+        object_id = generation["object_id"]
+        if object_id is not None and generations.get(object_id) is generation:
+            del generations[object_id]
+            if not generation["placed"]:
+                await bus.publish("rooms", {"room": VOICE_ROOM, "type": "release-position", "id": object_id})
+
+async def generate_object(prompt, generation, variant=0):
+    """Generate, store and publish the models of one object
+    
+    Copies of an object asked for in the same reply use their own seeds and
+    skip prompt reuse, so they don't all look the same.
+    
+    Args:
+        prompt (str): Description of the object to generate
+        generation (dict): Entry in ``generations``; its "submit", "jobs" and "placed" are kept up to date
+        variant (int): Number of identical prompts asked for before in the same reply
+    """
+    async def publish(model):
+        # Placed the first time, refined in place after that
+        await generation["claimed"]
+        message_type = "refine-object" if generation["placed"] else "place-object"
+        await publish_object(message_type, generation["object_id"], prompt, model)
+        generation["placed"] = True
+    
+    if PROMPT_REUSE != "off" and not variant:
+        match = await asyncio.to_thread(prompt_index.lookup, prompt)
+        if match is not None:
+            logger.info(f"'{prompt}' matches '{match.prompt}' ({match.similarity:.2f}), reusing its model")
+            await publish(match.model)
+            if PROMPT_REUSE == "reuse":
+                return
+    
+    logger.info(f"Generating '{prompt}'")
+    try:
+        # A stand-in is already visible, so there's no point in a preview.
+        # The request is recorded before it is awaited, and shielded, so a
+        # generation cancelled mid-request can still cancel the jobs it queued.
+        generation["submit"] = asyncio.ensure_future(trellis_client.submit_text_job(
+            prompt, seed=1 + variant, preview=PREVIEW_MODELS and not generation["placed"]
+        ))
+        job = await asyncio.shield(generation["submit"])
+        refine_job = job.get("refine_job")
+        generation["jobs"] = [job_id for job_id in (job["job_id"], refine_job) if job_id]
+        lod_paths = await trellis_client.wait_for_job(job["job_id"], download_path())
+    except TrellisError as e:
+        logger.error(f"Failed to generate '{prompt}': {e}")
+        return
+    
+    path, lods, bounds = await store_model(lod_paths)
+    model = {"path": path, "lods": lods, "bounds": bounds}
+    await publish(model)
+    if refine_job is None:
+        await asyncio.to_thread(prompt_index.add, prompt, model)
+        return
+    
+    try:
+        lod_paths = await trellis_client.wait_for_job(refine_job, download_path())
+    except TrellisError as e:
+        logger.error(f"Failed to refine '{prompt}', keeping the preview: {e}")
+        return
+    path, lods, bounds = await store_model(lod_paths)
+    model = {"path": path, "lods": lods, "bounds": bounds}
+    await publish(model)
+    await asyncio.to_thread(prompt_index.add, prompt, model)
 
-async def request_positions():
-    """Request current object positions from clients"""
-    if not CONNECTIONS:
+async def request_positions(room):
+    """Request current object positions from the clients in a room"""
+    if not room.connections:
         return
         
     request_id = str(uuid.uuid4())
@@ -237,112 +498,145 @@ async def request_positions():
         "timestamp": int(time.time() * 1000)
     }
     
-    message = json.dumps(position_request)
-    
     # Send request to all connected clients
-    for websocket in CONNECTIONS.copy():
-        try:
-            await websocket.send(message)
-            logger.info("Sent position request to client")
-        except websockets.exceptions.ConnectionClosed:
-            await unregister(websocket)
-
-def generate_object_position():
-    """Generate a position for a new object, potentially using world state"""
-    if not WORLD_STATE or 'objects' not in WORLD_STATE:
-        # If we don't have world state yet, use random position
-        return {
-            "x": random.uniform(-10, 10),
-            "y": 0,  # Place on ground
-            "z": random.uniform(-10, 10)
-        }
-    
-    # Try to place objects in interesting patterns or away from existing objects
-    existing_positions = []
-    
-    # Extract positions of existing objects
-    for obj_id, obj_data in WORLD_STATE.get('objects', {}).items():
-        if 'position' in obj_data:
-            existing_positions.append((
-                obj_data['position'].get('x', 0),
-                obj_data['position'].get('z', 0)
-            ))
-    
-    # Try to place object at least 3 units away from any existing object
-    MIN_DISTANCE = 3.0
-    MAX_ATTEMPTS = 10
-    
-    for _ in range(MAX_ATTEMPTS):
-        x = random.uniform(-10, 10)
-        z = random.uniform(-10, 10)
-        
-        # Check distance from all existing objects
-        too_close = False
-        for pos_x, pos_z in existing_positions:
-            dist = ((x - pos_x) ** 2 + (z - pos_z) ** 2) ** 0.5
-            if dist < MIN_DISTANCE:
-                too_close = True
-                break
-                
-        if not too_close:
-            return {"x": x, "y": 0, "z": z}
-    
-    # If we couldn't find a good position after MAX_ATTEMPTS, just return random
-    return {
-        "x": random.uniform(-10, 10),
-        "y": 0,
-        "z": random.uniform(-10, 10)
-    }
+    room.broadcast(position_request)
+    logger.info(f"Sent position request to clients in room {room.id}")
+
+async def handle_message(websocket, room, data):
+    """Handle one decoded message from a client"""
+    message_type = data.get('type')
+    
+    # Negotiate the wire encoding
+    if message_type == 'hello':
+        encoding = data.get('encoding', 'json')
+        if encoding not in supported_encodings():
+            encoding = 'json'
+        room.broadcaster.set_encoding(websocket, encoding)
+        room.send(websocket, {
+            "type": "hello",
+            "encoding": encoding,
+            "encodings": list(supported_encodings()),
+            "quantum": QUANTUM,
+            "room": room.id,
+        })
+    
+    # Handle changes reported by a client
+    elif message_type == 'world-delta':
+        delta = room.apply_events(data.get('events', []))
+        if delta is not None:
+            room.broadcast(delta, coalesce_key="world")
+        logger.debug(f"Applied {len(data.get('events', []))} events, room {room.id} at seq {room.world.seq}")
+    
+    # Handle full position reports from older clients by diffing them
+    elif message_type == 'object-positions':
+        objects = data.get('objects', {})
+        delta = room.apply_events(room.world.diff(objects))
+        if delta is not None:
+            room.broadcast(delta, coalesce_key="world")
+        logger.info(f"Received object positions. Objects: {len(objects)}")
+    
+    # A client noticed a gap in the sequence numbers
+    elif message_type == 'resync':
+        last_seq = data.get('lastSeq')
+        missed = room.world.events_since(last_seq) if isinstance(last_seq, int) else None
+        if missed is None:
+            room.send(websocket, room.world.snapshot(), coalesce_key="world")
+        else:
+            for delta in missed:
+                room.send(websocket, delta, coalesce_key="world")
 
 async def handle_client(websocket):
-    """Handle a connection from a client"""
-    await register(websocket)
+    """Handle a connection from a client; the room is chosen with ?room=<id>"""
+    try:
+        room_id = room_from_path(request_path(websocket))
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    
+    # Send clients for rooms hosted elsewhere to the right shard
+    if router.shard_for(room_id) != SHARD_URL:
+        await redirect(websocket, router, room_id)
+        return
+    
+    room = rooms.get(room_id)
+    await register(websocket, room)
     
     try:
+        # Start the client from the current world in one batched message
+        room.send(websocket, room.world.snapshot(), coalesce_key="world")
+        
         # Keep the connection alive
         while True:
             # Process messages from client
             message = await websocket.recv()
             
             try:
-                data = json.loads(message)
-                
-                # Handle position data response
-                if data.get('type') == 'object-positions':
-                    global WORLD_STATE
-                    WORLD_STATE = data
-                    logger.info(f"Received object positions. Objects: {len(data.get('objects', {}))}")
-                    logger.debug(f"World state: {WORLD_STATE}")
-                
-                # Handle other message types
-                # ...
-                
-            except json.JSONDecodeError:
-                logger.error(f"Received invalid JSON: {message}")
+                data = decode_message(message)
+            except ValueError:
+                logger.error(f"Received invalid message: {message!r}")
+                continue
+            await handle_message(websocket, room, data)
                 
     except websockets.exceptions.ConnectionClosed:
         pass
     finally:
-        await unregister(websocket)
+        await unregister(websocket, room)
+
+# Transcription -> Claude -> speech and generation, one turn at a time. With
+# SPECULATE=1, a partial transcript unchanged for SPECULATION_STABLE_MS is
+# answered (and its objects generated) before the final transcript arrives
+# after the end-of-utterance silence; the work is kept if the final
+# transcript matches and dropped otherwise.
+voice_pipeline = VoicePipeline(
+    respond=generate_ai_response,
+    speak=generate_audio,
+    generate=place_object,
+    listen=transcription.resume,
+    mute=transcription.pause,
+    record=record_turn,
+    speculate=os.getenv("SPECULATE", "1") == "1",
+    stable_delay=float(os.getenv("SPECULATION_STABLE_MS", 300)) / 1000,
+) if RUNS_VOICE else None
 
 async def main():
-    # Start the WebSocket server
-    server_host = "localhost"
-    server_port = 8080
+    # Commands for rooms this process hosts, and client counts for the voice room
+    bus.subscribe("rooms", on_room_command)
+    bus.subscribe("presence", on_presence)
+    await bus.start()
     
-    # Start sending objects in the background
-    asyncio.create_task(send_object(path="models/tree.glb", interval=5))
+    asyncio.create_task(log_broadcast_metrics())
+    asyncio.create_task(resync_rooms())
+    
+    if RUNS_VOICE:
+        # Synthesize common phrases while we wait for the first client
+        asyncio.create_task(asyncio.to_thread(speech.prewarm, COMMON_PHRASES))
+        # Start sending objects in the background
+        asyncio.create_task(send_object(path="models/tree.glb", interval=5))
     # asyncio.create_task(send_object(path="models/cute_house.glb", interval=3))
     # Optional: Start sending other types of objects
     # asyncio.create_task(send_object(path="models/rock.glb", interval=8))
     # asyncio.create_task(send_object(path="models/flower.glb", interval=10))
     
+    asset_runner = await start_asset_server(assets, ASSET_HOST, ASSET_PORT) if RUNS_VOICE else None
+    
     # Start the server using the new API format
-    server = await websockets.serve(handle_client, server_host, server_port)
-    logger.info(f"WebSocket server started at ws://{server_host}:{server_port}")
+    server = await websockets.serve(handle_client, SERVER_HOST, SERVER_PORT)
+    logger.info(
+        f"WebSocket server started at {SHARD_URL} ({len(router.shards)} shards), "
+        f"voice loop {'here' if RUNS_VOICE else 'on ' + VOICE_SHARD}"
+    )
     
     # Keep the server running forever
-    await asyncio.Future()
+    try:
+        await asyncio.Future()
+    finally:
+        if transcription is not None:
+            transcription.close()
+        await trellis_client.close()
+        rooms.close()
+        await bus.close()
+        if asset_runner is not None:
+            await asset_runner.cleanup()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,346 @@
+"""Pool of worker processes, each bound to one device, with least-loaded dispatch."""
+
+import contextlib
+import logging
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sent by a worker in place of a task id once its handler is set up
+READY = "ready"
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process running a task exited before finishing it."""
+
+
+def parse_devices(spec: str) -> List[str]:
+    """Parse a device list such as ``"cuda:0,cuda:1"`` or ``"cpu*2"`` (two CPU workers)."""
+    devices = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, count = part.partition("*")
+        devices.extend([name.strip()] * (int(count) if count else 1))
+    return devices
+
+
+def device_env(device: str) -> Dict[str, str]:
+    """Environment that pins a worker process to ``device``.
+
+    ``cuda:N`` makes GPU N the only visible one, so code in the worker keeps
+    using the default CUDA device; ``cpu`` hides all GPUs. Anything else
+    is left to the worker's handler.
+    """
+    if device.startswith("cuda:"):
+        return {"CUDA_VISIBLE_DEVICES": device[len("cuda:"):]}
+    if device == "cpu":
+        return {"CUDA_VISIBLE_DEVICES": ""}
+    return {}
+
+
+def _worker_main(device: str, env: Dict[str, str], handler_factory, concurrency: int, tasks, results):
+    """Entry point of a worker process: run tasks from ``tasks`` until told to stop."""
+    import os
+
+    os.environ.update(env)
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - {device} - %(levelname)s - %(message)s")
+    handler = handler_factory(device)
+    status = handler.status() if hasattr(handler, "status") else None
+    results.put((READY, os.getpid(), status))
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="worker-task")
+
+    def run(task_id, payload):
+        try:
+            results.put((task_id, True, handler(payload)))
+        except Exception as e:
+            traceback.print_exc()
+            results.put((task_id, False, f"{type(e).__name__}: {e}"))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        executor.submit(run, *task)
+    executor.shutdown(wait=True)
+
+
+@contextlib.contextmanager
+def _main_module_hidden():
+    main = sys.modules.get("__main__")
+    if main is None:
+        yield
+        return
+    saved = {name: main.__dict__[name] for name in ("__spec__", "__file__") if name in main.__dict__}
+    main.__spec__ = None
+    main.__dict__.pop("__file__", None)
+    try:
+        yield
+    finally:
+        main.__dict__.update(saved)
+
+
+class _HiddenMainProcess(multiprocessing.context.SpawnProcess):
+    def start(self):
+        with _main_module_hidden():
+            super().start()
+
+
+class _HiddenMainContext(multiprocessing.context.SpawnContext):
+    Process = _HiddenMainProcess
+
+
+def spawn_context(keep_main: bool = False):
+    """The "spawn" start method, without re-running the parent's main module in children.
+
+    Spawned processes normally import the parent's ``__main__`` script as
+    ``__mp_main__``, i.e. re-run its module-level setup (for the server:
+    loading config, opening caches, creating executors). ``keep_main`` is
+    for code sent to the children that is defined in ``__main__`` and needs it.
+    """
+    if keep_main:
+        return multiprocessing.get_context("spawn")
+    return _HiddenMainContext()
+
+
+class _Worker:
+    def __init__(self, index: int, device: str):
+        self.index = index
+        self.device = device
+        self.process = None
+        self.tasks = None
+        self.outstanding: Dict[str, Future] = {}
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.started_at = None
+        self.restart_at = None
+        self.ready = False
+        self.status = None
+
+    def stats(self) -> dict:
+        return {
+            "device": self.device,
+            "pid": self.process.pid if self.process else None,
+            "alive": bool(self.process and self.process.is_alive()),
+            "ready": self.ready,
+            "status": self.status,
+            "outstanding": len(self.outstanding),
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+        }
+
+
+class WorkerPool:
+    """Runs tasks in one process per device, sending each to the least-loaded worker.
+
+    ``handler_factory(device)`` is called once in every worker process (it
+    must be picklable, e.g. a module-level class) and returns the handler
+    that turns a task payload into its result. Each worker runs up to
+    ``concurrency`` tasks at a time, so a handler can overlap e.g. one
+    task's post-processing with the next one's GPU work. A worker is ready
+    once its handler has been created; if the handler has a ``status()``
+    method, its result (e.g. model load times) is reported in ``stats()``.
+    Tasks go to ready workers while there are any.
+
+    A worker that exits is restarted and the tasks it was running fail
+    with ``WorkerCrashed``. ``drain()`` stops accepting tasks, waits for
+    the running ones and shuts the workers down.
+    """
+
+    def __init__(
+        self,
+        devices: List[str],
+        handler_factory: Callable[[str], Callable],
+        concurrency: int = 2,
+        poll_interval: float = 0.5,
+        restart_delay: float = 1.0,
+    ):
+        if not devices:
+            raise ValueError("A worker pool needs at least one device")
+        self.handler_factory = handler_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.restart_delay = restart_delay
+        self.workers = [_Worker(index, device) for index, device in enumerate(devices)]
+        factory = getattr(handler_factory, "func", handler_factory)
+        self._context = spawn_context(keep_main=getattr(factory, "__module__", None) == "__main__")
+        self._results = self._context.Queue()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._accepting = False
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._accepting = True
+            self._stopping = False
+            for worker in self.workers:
+                self._spawn(worker)
+        for target, name in ((self._result_loop, "worker-pool-results"), (self._monitor_loop, "worker-pool-monitor")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _spawn(self, worker: _Worker):
+        worker.tasks = self._context.Queue()
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(worker.device, device_env(worker.device), self.handler_factory, self.concurrency, worker.tasks, self._results),
+            name=f"pool-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.ready = False
+        worker.status = None
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        logger.info(f"Started worker {worker.index} on {worker.device} (pid {worker.process.pid})")
+
+    def submit(self, payload) -> Future:
+        """Send a task to the worker with the fewest outstanding tasks."""
+        future = Future()
+        task_id = uuid.uuid4().hex
+        with self._cond:
+            if not self._accepting:
+                raise RuntimeError("Worker pool is not accepting tasks")
+            alive = [worker for worker in self.workers if worker.process.is_alive()]
+            candidates = [worker for worker in alive if worker.ready] or alive or self.workers
+            worker = min(candidates, key=lambda w: len(w.outstanding))
+            worker.outstanding[task_id] = future
+            worker.tasks.put((task_id, payload))
+        return future
+
+    def run(self, payload):
+        """Submit a task and block until its result is ready."""
+        return self.submit(payload).result()
+
+    def load(self) -> int:
+        """Tasks sent to workers that haven't finished yet."""
+        with self._cond:
+            return sum(len(worker.outstanding) for worker in self.workers)
+
+    def ready_workers(self) -> int:
+        with self._cond:
+            return sum(1 for worker in self.workers if worker.ready and worker.process.is_alive())
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "accepting": self._accepting,
+                "workers": [worker.stats() for worker in self.workers],
+            }
+
+    def _result_loop(self):
+        while True:
+            try:
+                message = self._results.get(timeout=self.poll_interval)
+            except queue.Empty:
+                with self._cond:
+                    if self._stopping:
+                        return
+                continue
+            except (EOFError, OSError):
+                return
+            if message[0] == READY:
+                _, pid, status = message
+                self._mark_ready(pid, status)
+                continue
+            task_id, ok, value = message
+            with self._cond:
+                for worker in self.workers:
+                    future = worker.outstanding.pop(task_id, None)
+                    if future is not None:
+                        if ok:
+                            worker.completed += 1
+                        else:
+                            worker.failed += 1
+                        break
+                self._cond.notify_all()
+            # Results of tasks already failed by a crash are dropped
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+    def _mark_ready(self, pid: int, status):
+        with self._cond:
+            for worker in self.workers:
+                if worker.process.pid == pid:
+                    worker.ready = True
+                    worker.status = status
+                    logger.info(f"Worker {worker.index} on {worker.device} is ready")
+
+    def _monitor_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            lost = []
+            with self._cond:
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                for worker in self.workers:
+                    if worker.process.is_alive():
+                        continue
+                    exitcode = worker.process.exitcode
+                    if worker.restart_at is None:
+                        logger.error(f"Worker {worker.index} on {worker.device} exited with code {exitcode}; restarting")
+                        # Don't restart in a tight loop if the worker dies on startup
+                        worker.restart_at = max(now, worker.started_at + self.restart_delay)
+                    # Including tasks sent to it while it was down
+                    lost.extend((future, worker.device, exitcode) for future in worker.outstanding.values())
+                    worker.failed += len(worker.outstanding)
+                    worker.outstanding.clear()
+                    if now >= worker.restart_at:
+                        worker.restart_at = None
+                        worker.restarts += 1
+                        self._spawn(worker)
+                self._cond.notify_all()
+            for future, device, exitcode in lost:
+                future.set_exception(WorkerCrashed(f"Worker on {device} exited with code {exitcode}"))
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting tasks, let outstanding ones finish and stop the workers.
+
+        Returns False if tasks were still running after ``timeout`` seconds;
+        their workers are terminated.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._accepting = False
+            while any(worker.outstanding for worker in self.workers):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            drained = not any(worker.outstanding for worker in self.workers)
+            self._stopping = True
+            for worker in self.workers:
+                worker.tasks.put(None)
+        for worker in self.workers:
+            worker.process.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        with self._cond:
+            for worker in self.workers:
+                for future in worker.outstanding.values():
+                    future.set_exception(WorkerCrashed(f"Worker on {worker.device} was stopped while draining"))
+                worker.outstanding.clear()
+        return drained
@@ -0,0 +1,172 @@
+"""Durable world state: a compacted snapshot plus an append-only log of deltas in SQLite."""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from world_sync import WorldModel
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    seq INTEGER NOT NULL,
+    objects TEXT NOT NULL,
+    taken_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS log (
+    seq INTEGER PRIMARY KEY,
+    events TEXT NOT NULL
+);
+"""
+
+
+class WorldStore:
+    """Persists every applied world delta and periodically compacts them into a snapshot.
+
+    The database runs in WAL mode with ``synchronous=NORMAL``. Writes happen
+    on a background thread, so the event loop never waits on the disk:
+    ``append`` only queues the delta, and the writer commits everything
+    queued since its last write in one transaction. Every ``snapshot_every``
+    appends, a copy of the current objects is queued as well; the writer
+    serializes it as the snapshot row and deletes the log up to that
+    sequence number, so a restore reads one row plus a short tail of the
+    log. ``flush`` waits for the queued writes; ``close`` flushes first.
+    """
+
+    def __init__(self, path: str, snapshot_every: int = 1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.appended = 0
+        self.restore_time = None
+        self.batches = 0
+        self.write_time = 0.0
+        # ("log", seq, events) or ("snapshot", seq, objects), in order
+        self._pending = deque()
+        self._writing = False
+        self._cond = threading.Condition()
+        # Serializes use of the connection between the writer and readers
+        self._db_lock = threading.Lock()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._write_loop, name=f"world-store-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def load(self, world: WorldModel):
+        """Restore ``world`` from the latest snapshot and the log entries after it."""
+        started = time.monotonic()
+        with self._db_lock:
+            row = self.conn.execute("SELECT seq, objects FROM snapshot WHERE id = 1").fetchone()
+            snapshot_seq, objects = (row[0], json.loads(row[1])) if row else (0, {})
+            world.restore(snapshot_seq, objects)
+            replayed = 0
+            for seq, events in self.conn.execute("SELECT seq, events FROM log WHERE seq > ? ORDER BY seq", (snapshot_seq,)):
+                world.apply(json.loads(events))
+                world.seq = seq
+                replayed += 1
+        self.appended = replayed
+        self.restore_time = time.monotonic() - started
+        logger.info(
+            f"Restored {len(world.objects)} objects at seq {world.seq} "
+            f"(snapshot {snapshot_seq} + {replayed} log entries) in {self.restore_time * 1000:.1f} ms"
+        )
+
+    def append(self, delta: dict, world: WorldModel):
+        """Queue one applied delta for the log, and a snapshot when the log is long enough."""
+        self._enqueue(("log", delta["seq"], delta["events"]))
+        self.appended += 1
+        if self.appended >= self.snapshot_every:
+            self.compact(world)
+
+    def compact(self, world: WorldModel):
+        """Queue the current objects as the snapshot that replaces the log it covers."""
+        # WorldModel replaces an object's dict when it changes, so a shallow copy is a consistent snapshot
+        self._enqueue(("snapshot", world.seq, dict(world.objects)))
+        self.appended = 0
+
+    def _enqueue(self, write: tuple):
+        with self._cond:
+            self._pending.append(write)
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is written; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+                batch = list(self._pending)
+                self._pending.clear()
+                self._writing = True
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} world changes to {self.path}: {e}")
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+    def _write(self, batch: list):
+        started = time.monotonic()
+        logged = [(seq, json.dumps(events)) for kind, seq, events in batch if kind == "log"]
+        snapshots = [(seq, objects) for kind, seq, objects in batch if kind == "snapshot"]
+        # Only the latest snapshot of a batch matters
+        snapshot = (snapshots[-1][0], json.dumps(snapshots[-1][1])) if snapshots else None
+        with self._db_lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO log (seq, events) VALUES (?, ?)", logged)
+            if snapshot is not None:
+                seq, objects = snapshot
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO snapshot (id, seq, objects, taken_at) VALUES (1, ?, ?, ?)",
+                    (seq, objects, time.time()),
+                )
+                self.conn.execute("DELETE FROM log WHERE seq <= ?", (seq,))
+        elapsed = time.monotonic() - started
+        self.batches += 1
+        self.write_time += elapsed
+        if snapshot is not None:
+            logger.info(f"Compacted world state at seq {snapshot[0]} in {elapsed * 1000:.1f} ms")
+
+    def stats(self) -> dict:
+        with self._db_lock:
+            log_entries = self.conn.execute("SELECT COUNT(*) FROM log").fetchone()[0]
+            row = self.conn.execute("SELECT seq, taken_at FROM snapshot WHERE id = 1").fetchone()
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "path": self.path,
+            "log_entries": log_entries,
+            "snapshot_seq": row[0] if row else None,
+            "snapshot_taken_at": row[1] if row else None,
+            "restore_time": self.restore_time,
+            "pending_writes": pending,
+            "write_batches": self.batches,
+            "mean_write_time": self.write_time / self.batches if self.batches else 0.0,
+        }
+
+    def close(self, world: WorldModel = None):
+        """Write what is queued and close the database, with a final snapshot first if ``world`` is given."""
+        if world is not None and self.appended:
+            self.compact(world)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.conn.close()
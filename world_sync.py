@@ -0,0 +1,167 @@
+"""Authoritative world model and the versioned delta protocol used to sync it."""
+
+import json
+import struct
+from collections import deque
+from typing import List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # Binary encoding is optional
+    msgpack = None
+
+# Fields of an object that are sent to clients and kept in snapshots
+OBJECT_FIELDS = ("path", "prompt", "lods", "position", "rotation", "scale", "boundingBox", "groundOffset")
+
+# Vector components are sent as int32 multiples of this (1 mm / 1 mrad)
+QUANTUM = 1e-3
+VECTOR_EXT_TYPE = 1
+
+
+class WorldModel:
+    """Objects in the world plus a sequence number that increases with every change.
+
+    Changes are applied as delta events, each touching one object:
+    ``{"op": "add", "id", ...fields}``, ``{"op": "move", "id", ...fields}``
+    (a partial update) and ``{"op": "remove", "id"}``. Every applied batch
+    gets the next sequence number and is kept in a bounded log, so clients
+    that missed a few batches can catch up without a full snapshot.
+    """
+
+    def __init__(self, log_size: int = 1000):
+        self.objects = {}
+        self.seq = 0
+        self._log = deque(maxlen=log_size)
+
+    def apply(self, events: List[dict]) -> Optional[dict]:
+        """Apply a batch of events and return the delta message for clients.
+
+        Events that change nothing are dropped; returns None if none remain.
+        """
+        applied = [event for event in events if self._apply_event(event)]
+        if not applied:
+            return None
+        prev_seq = self.seq
+        self.seq += 1
+        self._log.append((prev_seq, self.seq, applied))
+        return {"type": "world-delta", "prevSeq": prev_seq, "seq": self.seq, "events": applied}
+
+    def _apply_event(self, event: dict) -> bool:
+        op = event.get("op")
+        obj_id = event.get("id")
+        if obj_id is None:
+            return False
+        fields = {key: event[key] for key in OBJECT_FIELDS if key in event}
+        if op == "remove":
+            return self.objects.pop(obj_id, None) is not None
+        if op == "add":
+            self.objects[obj_id] = fields
+            return True
+        if op == "move":
+            current = self.objects.get(obj_id, {})
+            changed = {key: value for key, value in fields.items() if current.get(key) != value}
+            if "position" in changed and "boundingBox" not in fields and current.get("boundingBox") and current.get("position"):
+                # Clients only resend the box when the scale changes; it moves with the object
+                changed["boundingBox"] = _translated_box(current["boundingBox"], current["position"], changed["position"])
+            if changed:
+                # A new dict rather than an update, so shallow copies of ``objects`` stay consistent
+                self.objects[obj_id] = {**current, **changed}
+            return bool(changed)
+        return False
+
+    def events_since(self, seq: int) -> Optional[List[dict]]:
+        """Delta messages after ``seq``, or None if the log no longer reaches back that far."""
+        if seq == self.seq:
+            return []
+        if seq > self.seq or not self._log or self._log[0][0] > seq:
+            return None
+        return [
+            {"type": "world-delta", "prevSeq": prev_seq, "seq": new_seq, "events": events}
+            for prev_seq, new_seq, events in self._log
+            if prev_seq >= seq
+        ]
+
+    def restore(self, seq: int, objects: dict):
+        """Replace the whole state, e.g. with one loaded from disk, and clear the log."""
+        self.objects = objects
+        self.seq = seq
+        self._log.clear()
+
+    def snapshot(self) -> dict:
+        return {"type": "world-snapshot", "seq": self.seq, "objects": self.objects}
+
+    def diff(self, objects: dict) -> List[dict]:
+        """Events turning the model into a full ``objects`` report from a legacy client."""
+        events = []
+        for obj_id, obj_data in objects.items():
+            fields = {key: obj_data[key] for key in OBJECT_FIELDS if key in obj_data}
+            current = self.objects.get(obj_id)
+            if current is None:
+                events.append({"op": "add", "id": obj_id, **fields})
+            elif any(current.get(key) != value for key, value in fields.items()):
+                events.append({"op": "move", "id": obj_id, **fields})
+        return events
+
+
+def _translated_box(box: dict, old: dict, new: dict) -> dict:
+    offset = {axis: new.get(axis, 0) - old.get(axis, 0) for axis in "xyz"}
+    moved = dict(box)
+    for end in ("min", "max"):
+        if end in box:
+            moved[end] = {axis: value + offset.get(axis, 0) for axis, value in box[end].items()}
+    return moved
+
+
+def _is_vector(value) -> bool:
+    return (
+        isinstance(value, dict)
+        and value
+        and set(value) <= {"x", "y", "z"}
+        and all(isinstance(v, (int, float)) for v in value.values())
+    )
+
+
+def _quantize(value):
+    # Vectors become a compact ext type: a presence mask plus int32 components
+    if _is_vector(value):
+        mask = 0
+        components = []
+        for bit, axis in enumerate("xyz"):
+            if axis in value:
+                mask |= 1 << bit
+                components.append(round(value[axis] / QUANTUM))
+        return msgpack.ExtType(VECTOR_EXT_TYPE, struct.pack(f"<B{len(components)}i", mask, *components))
+    if isinstance(value, dict):
+        return {key: _quantize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_quantize(item) for item in value]
+    return value
+
+
+def _ext_hook(code: int, data: bytes):
+    if code != VECTOR_EXT_TYPE:
+        return msgpack.ExtType(code, data)
+    mask = data[0]
+    axes = [axis for bit, axis in enumerate("xyz") if mask & (1 << bit)]
+    components = struct.unpack(f"<{len(axes)}i", data[1:])
+    return {axis: component * QUANTUM for axis, component in zip(axes, components)}
+
+
+def encode_message(message: dict, encoding: str = "json"):
+    """Serialize a message as JSON text or quantized MessagePack bytes."""
+    if encoding == "msgpack":
+        return msgpack.packb(_quantize(message))
+    return json.dumps(message)
+
+
+def decode_message(data) -> dict:
+    """Parse a JSON text frame or a MessagePack binary frame."""
+    if isinstance(data, (bytes, bytearray)):
+        if msgpack is None:
+            raise ValueError("Received a binary message but msgpack is not installed")
+        return msgpack.unpackb(data, ext_hook=_ext_hook)
+    return json.loads(data)
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    return ("json", "msgpack") if msgpack is not None else ("json",)